@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+import statistics
+from typing import Callable, Any
+
+import sqlalchemy
+
+from src.definitions.start_condition import start_condition
+from src.database.postgres import PostgresDatabase
+
+
+def connect() -> PostgresDatabase:
+    """Connects to the url given as first argument or in DATABASE_URL.
+
+    The benchmarks create their own guilds but never clean up, so point them at a scratch database.
+    """
+    url = sys.argv[1] if len(sys.argv) > 1 else os.environ["DATABASE_URL"]
+    engine = sqlalchemy.create_engine(url)
+    return PostgresDatabase(start_condition, engine)
+
+
+def fresh_guild_id() -> int:
+    return int(time.time() * 1000)
+
+
+def timed(f: Callable[[], Any], repeat: int = 5) -> float:
+    """Median wall time of `repeat` calls in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
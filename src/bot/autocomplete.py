@@ -0,0 +1,121 @@
+from typing import Optional, Any, List, Tuple, NamedTuple, Hashable, Callable, Awaitable
+
+import time
+import asyncio
+
+import discord
+
+from src.database.database import Database
+
+
+# entries older than this are still answered from, but reloaded in the background
+AUTOCOMPLETE_TTL = 30.0
+# discord drops the interaction after 3 seconds, answer with nothing rather than too late
+LOAD_TIMEOUT = 2.0
+MAX_CHOICES = 20
+
+CacheKey = Tuple[int, Optional[int], Hashable]
+
+
+class Option(NamedTuple):
+    name: str
+    value: int
+    key: str
+
+    def choice(self) -> discord.app_commands.Choice[int]:
+        return discord.app_commands.Choice(name=self.name, value=self.value)
+
+
+class HandOptions(NamedTuple):
+    creatures: dict[int, Database.Creature]
+    play: List[Option]
+    campaign: List[Option]
+
+
+def option(name: str, value: int, search_text: Optional[str] = None) -> Option:
+    return Option(name, value, (search_text if search_text is not None else name).lower())
+
+
+def match(options: List[Option], current: str, limit: int = MAX_CHOICES) -> List[Option]:
+    """Options whose search key starts with current, then those that only contain it."""
+    current = current.lower()
+    prefixed = [o for o in options if o.key.startswith(current)]
+    contained = [o for o in options if current in o.key and not o.key.startswith(current)]
+    return (prefixed + contained)[:limit]
+
+
+class AutocompleteCache:
+    """Data behind the autocompletes, per (guild, player, kind) and kept for a few seconds.
+
+    A guild wide entry uses None as player. Entries are dropped when events of their player
+    come in, expired entries are served while a reload runs in the background. Like the
+    config cache every drop bumps a generation, so a load that started before the drop
+    does not put its stale result back.
+    """
+
+    def __init__(self, ttl: float = AUTOCOMPLETE_TTL):
+        self.ttl = ttl
+        self.entries: dict[CacheKey, Tuple[float, Any]] = {}
+        self.guild_generations: dict[int, int] = {}
+        self.player_generations: dict[Tuple[int, Optional[int]], int] = {}
+        self.loads: dict[CacheKey, Tuple[Tuple[int, int], asyncio.Task[Any]]] = {}
+
+    def generation(self, key: CacheKey) -> Tuple[int, int]:
+        return (
+            self.guild_generations.get(key[0], 0),
+            self.player_generations.get((key[0], key[1]), 0),
+        )
+
+    def start_load(self, key: CacheKey, load: Callable[[], Awaitable[Any]]) -> asyncio.Task[Any]:
+        generation = self.generation(key)
+
+        # a load started before the last invalidation would hand out the old data
+        running = self.loads.get(key)
+        if running is not None and running[0] == generation and not running[1].done():
+            return running[1]
+
+        async def run() -> Any:
+            try:
+                value = await load()
+                if self.generation(key) == generation:
+                    self.entries[key] = (time.monotonic(), value)
+                return value
+            finally:
+                if self.loads.get(key, (None, None))[1] is task:
+                    del self.loads[key]
+
+        task = asyncio.create_task(run())
+        # background reloads are never awaited, mark their errors as retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.loads[key] = (generation, task)
+        return task
+
+    async def get(
+        self, key: CacheKey, load: Callable[[], Awaitable[Any]], default: Any = None
+    ) -> Any:
+        """The cached value for key, or default if it could not be loaded in time."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            loaded_at, value = entry
+            if time.monotonic() - loaded_at > self.ttl:
+                self.start_load(key, load)
+            return value
+
+        task = self.start_load(key, load)
+        try:
+            # shielded, a slow load still fills the cache for the next keystroke
+            return await asyncio.wait_for(asyncio.shield(task), LOAD_TIMEOUT)
+        except asyncio.TimeoutError:
+            return default
+
+    def invalidate(self, guild_id: int, player_id: Optional[int] = None) -> None:
+        """Drops the entries of a player, or of the whole guild if no player is given."""
+        for key in list(self.entries):
+            if key[0] == guild_id and (player_id is None or key[1] == player_id):
+                del self.entries[key]
+
+        if player_id is None:
+            self.guild_generations[guild_id] = self.guild_generations.get(guild_id, 0) + 1
+        else:
+            player_key = (guild_id, player_id)
+            self.player_generations[player_key] = self.player_generations.get(player_key, 0) + 1
@@ -1,4 +1,4 @@
-from typing import Optional, Any, List, cast, TYPE_CHECKING, Sequence
+from typing import Optional, Any, List, Tuple, cast, TYPE_CHECKING, Sequence
 
 import os
 import time
@@ -32,10 +32,23 @@ from src.bot.util import (
     free_creature_protected_embed,
     format_embed,
 )
-from src.bot.checks import guild_exists, player_exists, is_admin_or_owner
+from src.bot.autocomplete import Option, HandOptions, option, match
+from src.bot.checks import (
+    guild_exists,
+    player_exists,
+    is_admin_or_owner,
+    get_guild_db,
+    get_player_db,
+)
+from src.database.database import Database
 from src.database.postgres import PostgresDatabase
-from src.core.exceptions import GuildNotFound, PlayerNotFound, CreatureNotFound
-from src.core.base_types import Resource, Price, Selected
+from src.core.exceptions import (
+    GuildNotFound,
+    PlayerNotFound,
+    CreatureNotFound,
+    NotEnoughResourcesException,
+)
+from src.core.base_types import Resource, Price, Selected, RegionCategory
 from src.definitions.start_condition import start_condition
 from src.definitions.creatures import creatures
 from src.definitions.extra_data import (
@@ -61,20 +74,22 @@ class GuildAdmin(commands.Cog):
     async def init_guild(self, ctxt: commands.Context["Bot"]) -> None:
         """Initialises the guild to play 5eCommander. Needs administator permissions."""
         assert ctxt.guild is not None
+        guild_id = ctxt.guild.id
+        channel_id = ctxt.channel.id
 
-        try:
-            with self.bot.db.transaction() as con:
-                guild_db = self.bot.db.add_guild(ctxt.guild.id, con=con)
-                config = guild_db.get_config(con=con)
-                config["channel_id"] = ctxt.channel.id
-                guild_db.set_config(config, con=con)
+        def init(con: Database.TransactionManager) -> dict[Any, Any]:
+            guild_db = self.bot.db.add_guild(guild_id, con=con)
+            config = guild_db.get_config(con=con)
+            config["channel_id"] = channel_id
+            guild_db.set_config(config, con=con)
+            return config
 
+        try:
+            config = await self.bot.offload.transact(init)
         except sqlalchemy.exc.IntegrityError as e:
             raise commands.UserInputError("Guild already exists")
 
-        await ctxt.send(
-            embed=success_embed("Guild initialised", f"Config loaded: {guild_db.get_config()}")
-        )
+        await ctxt.send(embed=success_embed("Guild initialised", f"Config loaded: {config}"))
 
     @commands.hybrid_command()  # type: ignore
     @commands.check(is_admin_or_owner)
@@ -95,8 +110,8 @@ class GuildAdmin(commands.Cog):
             )
             return
 
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
-        self.bot.db.remove_guild(guild_db)
+        guild_db = await get_guild_db(ctxt)
+        await self.bot.offload.run(self.bot.db.remove_guild, guild_db.sync())
 
         await ctxt.send(
             embed=success_embed("Guild Removed", "All data relating to this guild removed")
@@ -110,12 +125,12 @@ class GuildAdmin(commands.Cog):
         """Gives you the guild configuration"""
         assert ctxt.guild is not None
 
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
+        guild_db = await get_guild_db(ctxt)
 
         await ctxt.send(
             embed=success_embed(
                 "Guild initialised",
-                f"Guild config: ``{guild_db.get_config()}``",
+                f"Guild config: ``{await guild_db.get_config()}``",
             )
         )
 
@@ -128,20 +143,24 @@ class GuildAdmin(commands.Cog):
     ) -> None:
         """Changes a single guild config option"""
         assert ctxt.guild is not None
+        guild_id = ctxt.guild.id
 
-        with self.bot.db.transaction() as con:
-            guild_db = self.bot.db.get_guild(ctxt.guild.id)
+        def change(con: Database.TransactionManager) -> dict[Any, Any]:
+            guild_db = self.bot.db.get_guild(guild_id, con=con)
             config = guild_db.get_config(con=con)
 
             if option in config:
                 config[option] = new_value
 
             guild_db.set_config(config, con=con)
+            return config
+
+        config = await self.bot.offload.transact(change)
 
         await ctxt.send(
             embed=success_embed(
                 "Guild Options changed",
-                f"Server config: ``{guild_db.get_config()}``",
+                f"Server config: ``{config}``",
             )
         )
 
@@ -151,9 +170,8 @@ class GuildAdmin(commands.Cog):
     ) -> List[discord.app_commands.Choice[int]]:
         assert interaction.guild is not None
 
-        with self.bot.db.transaction() as con:
-            guild_db = self.bot.db.get_guild(interaction.guild.id)
-            config = guild_db.get_config(con=con)
+        guild_db = await self.bot.async_db.get_guild(interaction.guild.id)
+        config = await guild_db.get_config()
 
         return [
             discord.app_commands.Choice(
@@ -170,9 +188,9 @@ class GuildAdmin(commands.Cog):
     async def map(self, ctxt: commands.Context["Bot"]) -> None:
         """Gives you info about the locations in the game"""
         assert ctxt.guild is not None
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
+        guild_db = await get_guild_db(ctxt)
 
-        await ctxt.send(embed=regions_embed(guild_db))
+        await ctxt.send(embed=await self.bot.offload.run(regions_embed, guild_db.sync()))
 
     @commands.hybrid_command()  # type: ignore
     @commands.guild_only()
@@ -180,9 +198,11 @@ class GuildAdmin(commands.Cog):
     async def conflict(self, ctxt: commands.Context["Bot"]) -> None:
         """Gives you info about the current conflict in the guild"""
         assert ctxt.guild is not None
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
+        guild_db = await get_guild_db(ctxt)
 
-        await ctxt.send(embed=conflict_embed(ctxt.guild, guild_db))
+        await ctxt.send(
+            embed=await self.bot.offload.run(conflict_embed, ctxt.guild, guild_db.sync())
+        )
 
 
 class PlayerAdmin(commands.Cog):
@@ -203,10 +223,10 @@ class PlayerAdmin(commands.Cog):
             await ctxt.send(embed=error_embed("User Error", "You are not currently in a guild."))
             return
 
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
+        guild_db = await self.bot.async_db.get_guild(ctxt.guild.id)
 
         try:
-            player_db = guild_db.add_player(ctxt.author.id)
+            await self.bot.offload.run(guild_db.sync().add_player, ctxt.author.id)
         except sqlalchemy.exc.IntegrityError as e:
             await ctxt.send(embed=error_embed("User Error", "You already joined"))
             return
@@ -219,15 +239,17 @@ class PlayerAdmin(commands.Cog):
     async def player_info(self, ctxt: commands.Context["Bot"], *, member: discord.Member) -> None:
         """Gives you the info about a player"""
         assert ctxt.guild is not None
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
+        guild_db = await get_guild_db(ctxt)
 
         try:
-            player_db = guild_db.get_player(member.id)
+            player_db = await guild_db.get_player(member.id)
         except PlayerNotFound as e:
             await ctxt.send(embed=error_embed("User Error", "No player of this name found"))
             return
 
-        await ctxt.send(embed=player_embed(member, player_db, private=True))
+        await ctxt.send(
+            embed=await self.bot.offload.run(player_embed, member, player_db.sync(), private=True)
+        )
 
     @commands.hybrid_command()  # type: ignore
     @commands.guild_only()
@@ -238,41 +260,49 @@ class PlayerAdmin(commands.Cog):
             raise commands.CheckFailure("This command can only be called as a slash command")
 
         assert ctxt.guild is not None
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
-        player_db = guild_db.get_player(ctxt.author.id)
+        guild_db = await get_guild_db(ctxt)
+        player_db = await get_player_db(ctxt)
 
         assert isinstance(ctxt.author, discord.Member)
 
-        await ctxt.send(embed=player_embed(ctxt.author, player_db, private=False), ephemeral=True)
+        embed = await self.bot.offload.run(
+            player_embed, ctxt.author, player_db.sync(), private=False
+        )
+        await ctxt.send(embed=embed, ephemeral=True)
 
     async def _play(
         self, ctxt: commands.Context["Bot"], card: int, region: int, extra_data: EXTRA_DATA
     ) -> None:
         assert ctxt.guild is not None
+        guild_id = ctxt.guild.id
+        author_id = ctxt.author.id
 
-        try:
-            with self.bot.db.transaction() as con:
-                guild_db = self.bot.db.get_guild(ctxt.guild.id, con=con)
-                player_db = guild_db.get_player(ctxt.author.id, con=con)
+        def play(con: Database.TransactionManager) -> Tuple[Database.Creature, Database.Region]:
+            guild_db = self.bot.db.get_guild(guild_id, con=con)
+            player_db = guild_db.get_player(author_id, con=con)
 
-                creatures = player_db.get_hand(con=con)
-                creature_db = [c for c in creatures if c.id == card][0]
+            creatures = player_db.get_hand(con=con)
+            creature_db = [c for c in creatures if c.id == card][0]
 
-                regions = guild_db.get_regions(con=con)
-                region_db = [r for r in regions if r.id == region][0]
+            regions = guild_db.get_regions(con=con)
+            region_db = [r for r in regions if r.id == region][0]
 
-                player_db.play_creature_to_region(
-                    creature_db, region_db, con=con, extra_data=copy.copy(extra_data)
-                )
+            player_db.play_creature_to_region(
+                creature_db, region_db, con=con, extra_data=copy.copy(extra_data)
+            )
+            return creature_db, region_db
 
-                clear_pending_choice(ctxt.guild.id, ctxt.author.id, self.bot.pending_choices)
+        try:
+            creature_db, region_db = await self.bot.offload.transact(play)
+
+            clear_pending_choice(guild_id, author_id, self.bot.pending_choices)
 
-                await ctxt.send(
-                    embed=success_embed(
-                        "Creature Played",
-                        f"Successfully played {creature_db.text()} to {region_db.text()}",
-                    )
+            await ctxt.send(
+                embed=success_embed(
+                    "Creature Played",
+                    f"Successfully played {creature_db.text()} to {region_db.text()}",
                 )
+            )
 
         except MissingExtraData as e:
 
@@ -309,40 +339,68 @@ class PlayerAdmin(commands.Cog):
         """Uses a order to play a card to a region, but region is chosen first"""
         await self._play(ctxt, card, region, [])
 
+    async def hand_options(self, guild_id: int, player_id: int) -> HandOptions:
+        async def load() -> HandOptions:
+            async with self.bot.async_db.transaction() as con:
+                guild_db = await self.bot.async_db.get_guild(guild_id, con=con)
+                player_db = await guild_db.get_player(player_id, con=con)
+                creatures = await player_db.get_hand(con=con)
+
+            def creature_option(c: Database.Creature, effect_text: str) -> Option:
+                full_text = f"{c.text()}: {effect_text}"
+                return option(full_text if effect_text else c.text(), c.id, full_text)
+
+            return HandOptions(
+                {c.id: c for c in creatures},
+                [
+                    creature_option(c, c.creature.quest_ability_effect_full_text())
+                    for c in creatures
+                ],
+                [
+                    creature_option(c, c.creature.campaign_ability_effect_full_text())
+                    for c in creatures
+                ],
+            )
+
+        return cast(
+            HandOptions,
+            await self.bot.autocomplete.get(
+                (guild_id, player_id, "hand"), load, HandOptions({}, [], [])
+            ),
+        )
+
+    async def region_categories(self, guild_id: int) -> dict[int, Optional[RegionCategory]]:
+        async def load() -> dict[int, Optional[RegionCategory]]:
+            guild_db = await self.bot.async_db.get_guild(guild_id)
+            return {r.id: r.region.category for r in await guild_db.get_regions()}
+
+        return cast(
+            dict[int, Optional[RegionCategory]],
+            await self.bot.autocomplete.get((guild_id, None, "regions"), load, {}),
+        )
+
     @play.autocomplete("card")
     @play_to.autocomplete("card")
     async def play_card_in_hand_autocomplete(
         self, interaction: discord.Interaction, current: str
     ) -> List[discord.app_commands.Choice[int]]:
         assert interaction.guild is not None
-        guild_db = self.bot.db.get_guild(interaction.guild.id)
-        player_db = guild_db.get_player(interaction.user.id)
-        creatures = player_db.get_hand()
 
-        print("namespace", interaction.namespace)
+        hand = await self.hand_options(interaction.guild.id, interaction.user.id)
 
+        options = hand.play
         if "region" in interaction.namespace and cast(int, interaction.namespace["region"]) != 0:
+            categories = await self.region_categories(interaction.guild.id)
             region_id = cast(int, interaction.namespace["region"])
-            region = guild_db.get_region(region_id)
-            filtered_creatures = [
-                c for c in creatures if region.region.category in c.creature.quest_region_categories
-            ]
-        else:
-            filtered_creatures = creatures
+            if region_id in categories:
+                category = categories[region_id]
+                options = [
+                    o
+                    for o in options
+                    if category in hand.creatures[o.value].creature.quest_region_categories
+                ]
 
-        return [
-            discord.app_commands.Choice(
-                name=(
-                    f"{c.text()}: {c.creature.quest_ability_effect_full_text()}"
-                    if c.creature.quest_ability_effect_full_text()
-                    else c.text()
-                ),
-                value=c.id,
-            )
-            for c in filtered_creatures
-            if current.lower()
-            in f"{c.text()}: {c.creature.quest_ability_effect_full_text()}".lower()
-        ][:20]
+        return [o.choice() for o in match(options, current)]
 
     @play.autocomplete("region")
     @play_to.autocomplete("region")
@@ -351,14 +409,22 @@ class PlayerAdmin(commands.Cog):
     ) -> List[discord.app_commands.Choice[int]]:
         assert interaction.guild is not None
 
-        guild_db = self.bot.db.get_guild(interaction.guild.id)
-        regions = guild_db.get_regions()
-        regions = [r for r in regions if r.occupied() == (None, None)]
+        async with self.bot.async_db.transaction() as con:
+            guild_db = await self.bot.async_db.get_guild(interaction.guild.id, con=con)
+            regions = [
+                state.region
+                for state in await guild_db.get_region_states(con=con)
+                if state.occupant is None
+            ]
 
-        if "card" in interaction.namespace and cast(int, interaction.namespace["card"]) != 0:
+            if "card" in interaction.namespace and cast(int, interaction.namespace["card"]) != 0:
+                player_db = await guild_db.get_player(interaction.user.id, con=con)
+                creatures = await player_db.get_hand(con=con)
+            else:
+                creatures = None
+
+        if creatures is not None:
             creature_id = cast(int, interaction.namespace["card"])
-            player_db = guild_db.get_player(interaction.user.id)
-            creatures = player_db.get_hand()
             creatures_filtered = [c for c in creatures if c.id == creature_id]
             if len(creatures_filtered) < 1:
                 filtered_regions = regions
@@ -384,23 +450,28 @@ class PlayerAdmin(commands.Cog):
         self, ctxt: commands.Context["Bot"], card: int, extra_data: EXTRA_DATA
     ) -> None:
         assert ctxt.guild is not None
+        guild_id = ctxt.guild.id
+        author_id = ctxt.author.id
 
-        try:
-            with self.bot.db.transaction() as con:
-                guild_db = self.bot.db.get_guild(ctxt.guild.id, con=con)
-                player_db = guild_db.get_player(ctxt.author.id, con=con)
+        def campaign(con: Database.TransactionManager) -> Database.Creature:
+            guild_db = self.bot.db.get_guild(guild_id, con=con)
+            player_db = guild_db.get_player(author_id, con=con)
 
-                creatures = player_db.get_hand(con=con)
-                creature_db = [c for c in creatures if c.id == card][0]
+            creatures = player_db.get_hand(con=con)
+            creature_db = [c for c in creatures if c.id == card][0]
 
-                player_db.play_creature_to_campaign(creature_db, con=con, extra_data=extra_data)
+            player_db.play_creature_to_campaign(creature_db, con=con, extra_data=extra_data)
+            return creature_db
 
-                await ctxt.send(
-                    embed=success_embed(
-                        "Creature Campaigned",
-                        f"Successfully sent {creature_db.text()} to campaign",
-                    )
+        try:
+            creature_db = await self.bot.offload.transact(campaign)
+
+            await ctxt.send(
+                embed=success_embed(
+                    "Creature Campaigned",
+                    f"Successfully sent {creature_db.text()} to campaign",
                 )
+            )
         except MissingExtraData as e:
 
             async def callback(ctxt: commands.Context["Bot"], extra_data: EXTRA_DATA) -> None:
@@ -434,23 +505,10 @@ class PlayerAdmin(commands.Cog):
         self, interaction: discord.Interaction, current: str
     ) -> List[discord.app_commands.Choice[int]]:
         assert interaction.guild is not None
-        guild_db = self.bot.db.get_guild(interaction.guild.id)
-        player_db = guild_db.get_player(interaction.user.id)
-        creatures = player_db.get_hand()
 
-        return [
-            discord.app_commands.Choice(
-                name=(
-                    f"{c.text()}: {c.creature.campaign_ability_effect_full_text()}"
-                    if c.creature.campaign_ability_effect_full_text()
-                    else c.text()
-                ),
-                value=c.id,
-            )
-            for c in creatures
-            if current.lower()
-            in f"{c.text()}: {c.creature.campaign_ability_effect_full_text()}".lower()
-        ][:20]
+        hand = await self.hand_options(interaction.guild.id, interaction.user.id)
+
+        return [o.choice() for o in match(hand.campaign, current)]
 
     @commands.hybrid_command()  # type: ignore
     @commands.guild_only()
@@ -470,18 +528,21 @@ class PlayerAdmin(commands.Cog):
             )
             return
 
-        with self.bot.db.transaction() as con:
-            guild_db = self.bot.db.get_guild(ctxt.guild.id, con=con)
-            player_db = guild_db.get_player(ctxt.author.id, con=con)
+        guild_id = ctxt.guild.id
+        author_id = ctxt.author.id
+        choice_obj, callback, extra_data = pending
 
-            choice_obj, callback, extra_data = pending
+        def select(con: Database.TransactionManager) -> Selected:
+            guild_db = self.bot.db.get_guild(guild_id, con=con)
+            player_db = guild_db.get_player(author_id, con=con)
+            return choice_obj.select_option(player_db, choice_obj, choice, con)
 
-            new_selected = choice_obj.select_option(player_db, choice_obj, choice, con)
-            extra_data.append(new_selected)
+        new_selected = await self.bot.offload.transact(select)
+        extra_data.append(new_selected)
 
-            extra_data = [copy.copy(e) for e in extra_data]
+        extra_data = [copy.copy(e) for e in extra_data]
 
-            await callback(ctxt, extra_data)
+        await callback(ctxt, extra_data)
 
     @choose.autocomplete("choice")
     async def choice_autocomplete(
@@ -496,20 +557,21 @@ class PlayerAdmin(commands.Cog):
             return []
 
         choice, _, _ = pending
+        guild_id = interaction.guild.id
+        player_id = interaction.user.id
+
+        async def load() -> List[Option]:
+            guild_db = await self.bot.async_db.get_guild(guild_id)
+            player_db = await guild_db.get_player(player_id)
+            options = await self.bot.offload.run(choice.get_options, player_db.sync(), None)
+            return [option(o.text(), o.value()) for o in options]
+
+        # every pending choice has its own options
+        options = await self.bot.autocomplete.get(
+            (guild_id, player_id, ("choice", id(choice))), load, []
+        )
 
-        guild_db = self.bot.db.get_guild(interaction.guild.id)
-        player_db = guild_db.get_player(interaction.user.id)
-
-        options = choice.get_options(player_db, None)
-
-        return [
-            discord.app_commands.Choice(
-                name=(o.text()),
-                value=o.value(),
-            )
-            for o in options
-            if current.lower() in o.text().lower()
-        ][:20]
+        return [o.choice() for o in match(options, current)]
 
     @commands.hybrid_command()  # type: ignore
     @commands.guild_only()
@@ -517,34 +579,34 @@ class PlayerAdmin(commands.Cog):
     async def card(self, ctxt: commands.Context["Bot"], card: int) -> None:
         """Shows the info about a card"""
         assert ctxt.guild is not None
-        guild_db = self.bot.db.get_guild(ctxt.guild.id)
+        guild_db = await get_guild_db(ctxt)
 
-        with self.bot.db.transaction() as con:
-            basecreature = creatures.get(card)
-            if (
-                basecreature is None
-                or basecreature not in guild_db.get_all_obtainable_basecreatures(con=con)
-            ):
-                raise CreatureNotFound(message="Creature not found")
+        basecreature = creatures.get(card)
+        if (
+            basecreature is None
+            or basecreature not in await guild_db.get_all_obtainable_basecreatures()
+        ):
+            raise CreatureNotFound(message="Creature not found")
 
-            await ctxt.send(embed=creature_embed(basecreature))
+        await ctxt.send(embed=creature_embed(basecreature))
 
     @card.autocomplete("card")
     async def card_in_guild_autocomplete(
         self, interaction: discord.Interaction, current: str
     ) -> List[discord.app_commands.Choice[int]]:
         assert interaction.guild is not None
-        guild_db = self.bot.db.get_guild(interaction.guild.id)
-        basecreatures = guild_db.get_all_obtainable_basecreatures()
 
-        return [
-            discord.app_commands.Choice(
-                name=(f"{c.text()}"),
-                value=c.id,
-            )
-            for c in basecreatures
-            if current.lower() in c.text().lower()
-        ][:20]
+        guild_id = interaction.guild.id
+
+        async def load() -> List[Option]:
+            guild_db = await self.bot.async_db.get_guild(guild_id)
+            return [
+                option(c.text(), c.id) for c in await guild_db.get_all_obtainable_basecreatures()
+            ]
+
+        options = await self.bot.autocomplete.get((guild_id, None, "obtainable"), load, [])
+
+        return [o.choice() for o in match(options, current)]
 
     @commands.hybrid_command()  # type: ignore
     @commands.guild_only()
@@ -552,30 +614,42 @@ class PlayerAdmin(commands.Cog):
     async def roll(self, ctxt: commands.Context["Bot"], amount: int = 1) -> None:
         """Roll for new creatures"""
         assert ctxt.guild is not None
+        guild_db = await get_guild_db(ctxt)
+        player_db = await get_player_db(ctxt)
 
-        with self.bot.db.transaction() as con:
-            guild_db = self.bot.db.get_guild(ctxt.guild.id, con=con)
-            player_db = guild_db.get_player(ctxt.author.id, con=con)
-            creatures = [guild_db.roll_creature(con=con) for i in range(amount)]
+        def roll(con: Database.TransactionManager) -> List[Database.BaseCreature]:
+            return [guild_db.sync().roll_creature(con=con) for i in range(amount)]
+
+        creatures = await self.bot.offload.transact(roll)
 
         for c in creatures:
-            with self.bot.db.transaction() as con:
-                player_db.pay_price([Price(resource=Resource.MAGIC, amount=1)], con=con)
+            if not await player_db.has(Resource.MAGIC, 1):
+                raise NotEnoughResourcesException("Not enough magic to roll")
+
+            embed = free_creature_embed(c, cast(discord.Member, ctxt.author))
+            message = await ctxt.send(embed=embed)
 
-                embed = free_creature_embed(c, cast(discord.Member, ctxt.author))
-                message = await ctxt.send(embed=embed)
-                free_creature = guild_db.add_free_creature(
-                    c, ctxt.channel.id, message.id, player_db, con=con
+            def add(con: Database.TransactionManager) -> Tuple[Database.FreeCreature, int]:
+                player = player_db.sync()
+                player.pay_price([Price(resource=Resource.MAGIC, amount=1)], con=con)
+
+                free_creature = guild_db.sync().add_free_creature(
+                    c, ctxt.channel.id, message.id, player, con=con
                 )
                 free_creature.create_events(con=con)
+                return free_creature, free_creature.get_protected_timestamp(con=con)
 
-                embed, view = free_creature_protected_embed(
-                    free_creature,
-                    cast(discord.Member, ctxt.author),
-                    free_creature.get_protected_timestamp(con=con),
-                )
+            try:
+                free_creature, protected_timestamp = await self.bot.offload.transact(add)
+            except Exception:
+                await message.delete()
+                raise
+
+            embed, view = free_creature_protected_embed(
+                free_creature, cast(discord.Member, ctxt.author), protected_timestamp
+            )
 
-                await message.edit(embed=embed, view=view)
+            await message.edit(embed=embed, view=view)
 
             await asyncio.sleep(0.5)
 
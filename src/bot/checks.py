@@ -8,6 +8,7 @@ from discord.ext import commands
 from discord.app_commands.commands import T
 
 from src.database.postgres import PostgresDatabase
+from src.database.async_postgres import AsyncPostgresDatabase
 from src.core.exceptions import GuildNotFound, PlayerNotFound
 
 
@@ -30,17 +31,67 @@ async def is_admin_or_owner(ctxt: commands.Context["Bot"]) -> bool:
     return value
 
 
-async def guild_exists(ctxt: commands.Context["Bot"]) -> bool:
-    db = ctxt.bot.db
+class GameContext(commands.Context["Bot"]):
+    """Context that keeps the guild and player the checks resolved for the command body."""
+
+    guild_db: Optional[AsyncPostgresDatabase.Guild] = None
+    player_db: Optional[AsyncPostgresDatabase.Player] = None
+
+
+async def get_guild_db(ctxt: commands.Context["Bot"]) -> AsyncPostgresDatabase.Guild:
+    """The guild of the command, looked up at most once per invocation."""
+    if isinstance(ctxt, GameContext) and ctxt.guild_db is not None:
+        return ctxt.guild_db
+
+    db = ctxt.bot.async_db
+    cache = db.db.existence_cache
 
     assert ctxt.guild is not None
 
-    try:
-        db.get_guild(ctxt.guild.id)
-    except GuildNotFound as e:
-        raise GuildNotInitialised(
-            "Guild has not been initialised. Ask an administrator to initialise the guild."
-        )
+    if cache.has_guild(ctxt.guild.id):
+        guild_db = AsyncPostgresDatabase.Guild(db, ctxt.guild.id)
+    else:
+        generation = cache.generation()
+        try:
+            guild_db = await db.get_guild(ctxt.guild.id)
+        except GuildNotFound as e:
+            raise GuildNotInitialised(
+                "Guild has not been initialised. Ask an administrator to initialise the guild."
+            )
+        cache.put_guild(guild_db.id, generation)
+
+    if isinstance(ctxt, GameContext):
+        ctxt.guild_db = guild_db
+    return guild_db
+
+
+async def get_player_db(ctxt: commands.Context["Bot"]) -> AsyncPostgresDatabase.Player:
+    """The player who invoked the command, looked up at most once per invocation."""
+    if isinstance(ctxt, GameContext) and ctxt.player_db is not None:
+        return ctxt.player_db
+
+    guild_db = await get_guild_db(ctxt)
+    cache = ctxt.bot.async_db.db.existence_cache
+
+    if cache.has_player(guild_db.id, ctxt.author.id):
+        player_db = AsyncPostgresDatabase.Player(guild_db.parent, ctxt.author.id, guild_db)
+    else:
+        generation = cache.generation()
+        try:
+            player_db = await guild_db.get_player(ctxt.author.id)
+        except PlayerNotFound as e:
+            raise PlayerNotJoined(
+                "Command can only be used by people who have joined the game. Use the join command."
+            )
+        cache.put_player(guild_db.id, player_db.id, generation)
+
+    if isinstance(ctxt, GameContext):
+        ctxt.player_db = player_db
+    return player_db
+
+
+async def guild_exists(ctxt: commands.Context["Bot"]) -> bool:
+    await get_guild_db(ctxt)
 
     ctxt.bot.channel_cache[ctxt.channel.id] = cast(discord.PartialMessageable, ctxt.channel)
 
@@ -48,23 +99,7 @@ async def guild_exists(ctxt: commands.Context["Bot"]) -> bool:
 
 
 async def player_exists(ctxt: commands.Context["Bot"]) -> bool:
-    db = ctxt.bot.db
-
-    assert ctxt.guild is not None
-
-    try:
-        guild_db = db.get_guild(ctxt.guild.id)
-    except GuildNotFound as e:
-        raise GuildNotInitialised(
-            "Guild has not been initialised. Ask an administrator to initialise the guild."
-        )
-
-    try:
-        guild_db.get_player(ctxt.author.id)
-    except PlayerNotFound as e:
-        raise PlayerNotJoined(
-            "Command can only be used by people who have joined the game. Use the join command."
-        )
+    await get_player_db(ctxt)
 
     return True
 
@@ -0,0 +1,188 @@
+from typing import Optional, Any, List, Deque, NamedTuple, Union
+
+import time
+import asyncio
+import logging
+from collections import deque
+
+import discord
+
+
+# documented discord limits, (requests, seconds), the real buckets can only be stricter
+CHANNEL_ROUTE_LIMITS: dict[str, tuple[int, float]] = {
+    "send": (5, 5.0),
+    "edit": (5, 5.0),
+}
+GLOBAL_LIMIT: tuple[int, float] = (50, 1.0)
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS = 6000
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, period: float, now: Optional[float] = None):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic() if now is None else now
+        self.blocked_until = 0.0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(float(self.capacity), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self.refill(now)
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self.refill(now)
+        self.tokens -= 1
+
+    def block(self, now: float, retry_after: float) -> None:
+        # discord told us the bucket is empty, trust it over our own count
+        self.refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class SendJob(NamedTuple):
+    embeds: List[discord.Embed]
+
+
+class EditJob(NamedTuple):
+    message: discord.Message
+    kwargs: dict[str, Any]
+
+
+Job = Union[SendJob, EditJob]
+
+
+class ChannelQueue:
+    def __init__(self, channel: discord.abc.Messageable):
+        self.channel = channel
+        self.jobs: Deque[Job] = deque()
+        self.buckets = {
+            route: TokenBucket(capacity, period)
+            for route, (capacity, period) in CHANNEL_ROUTE_LIMITS.items()
+        }
+        self.task: Optional[asyncio.Task[None]] = None
+
+
+def job_route(job: Job) -> str:
+    return "send" if isinstance(job, SendJob) else "edit"
+
+
+def job_size(job: Job) -> int:
+    return len(job.embeds) if isinstance(job, SendJob) else 1
+
+
+def retry_after(error: discord.HTTPException) -> float:
+    for header in ("X-RateLimit-Reset-After", "Retry-After"):
+        value = error.response.headers.get(header)
+        if value is not None:
+            return float(value)
+    return 1.0
+
+
+class MessageQueue:
+    """Outbound messages of the bot, sent as fast as discord's rate limits allow.
+
+    Every channel gets its own queue with a token bucket per route, all channels share the
+    global bucket. Embeds sent to the same channel are coalesced into messages of up to ten
+    embeds while they wait. send() and edit() only block once max_pending items are waiting.
+    """
+
+    def __init__(self, logger: logging.Logger, max_pending: int = 500):
+        self.logger = logger
+        self.channels: dict[int, ChannelQueue] = {}
+        self.global_bucket = TokenBucket(*GLOBAL_LIMIT)
+        self.pending = asyncio.Semaphore(max_pending)
+
+    def channel_queue(self, channel_id: int, channel: discord.abc.Messageable) -> ChannelQueue:
+        queue = self.channels.get(channel_id)
+        if queue is None:
+            queue = ChannelQueue(channel)
+            self.channels[channel_id] = queue
+        return queue
+
+    def start(self, queue: ChannelQueue) -> None:
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self.drain(queue))
+
+    async def send(self, channel: discord.PartialMessageable, embed: discord.Embed) -> None:
+        await self.pending.acquire()
+
+        queue = self.channel_queue(channel.id, channel)
+        last = queue.jobs[-1] if queue.jobs else None
+        if (
+            isinstance(last, SendJob)
+            and len(last.embeds) < MAX_EMBEDS_PER_MESSAGE
+            and sum(len(e) for e in last.embeds) + len(embed) <= MAX_EMBED_CHARACTERS
+        ):
+            last.embeds.append(embed)
+        else:
+            queue.jobs.append(SendJob([embed]))
+
+        self.start(queue)
+
+    async def edit(self, message: discord.Message, **kwargs: Any) -> None:
+        await self.pending.acquire()
+
+        queue = self.channel_queue(message.channel.id, message.channel)
+        queue.jobs.append(EditJob(message, kwargs))
+
+        self.start(queue)
+
+    async def perform(self, queue: ChannelQueue, job: Job) -> None:
+        if isinstance(job, SendJob):
+            await queue.channel.send(embeds=job.embeds)
+        else:
+            await job.message.edit(**job.kwargs)
+
+    async def drain(self, queue: ChannelQueue) -> None:
+        while queue.jobs:
+            job = queue.jobs[0]
+            bucket = queue.buckets[job_route(job)]
+
+            now = time.monotonic()
+            wait = max(bucket.wait_time(now), self.global_bucket.wait_time(now))
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            # from here on the job can no longer take more embeds
+            queue.jobs.popleft()
+            bucket.take(now)
+            self.global_bucket.take(now)
+
+            try:
+                await self.perform(queue, job)
+            except discord.RateLimited as error:
+                bucket.block(time.monotonic(), error.retry_after)
+                queue.jobs.appendleft(job)
+                continue
+            except discord.HTTPException as error:
+                if error.status == 429:
+                    bucket.block(time.monotonic(), retry_after(error))
+                    queue.jobs.appendleft(job)
+                    continue
+                self.logger.error(f"failed to {job_route(job)} in channel {queue.channel}: {error}")
+            except Exception as error:
+                self.logger.error(f"failed to {job_route(job)} in channel {queue.channel}: {error}")
+
+            for _ in range(job_size(job)):
+                self.pending.release()
+
+    def queued(self) -> int:
+        return sum(job_size(job) for queue in self.channels.values() for job in queue.jobs)
+
+    async def close(self) -> None:
+        for queue in self.channels.values():
+            if queue.task is not None:
+                queue.task.cancel()
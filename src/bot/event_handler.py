@@ -1,12 +1,24 @@
-from typing import Optional, Any, List, cast, TYPE_CHECKING, Tuple, Type
+from typing import (
+    Optional,
+    Any,
+    List,
+    cast,
+    TYPE_CHECKING,
+    Tuple,
+    Type,
+    Set,
+    NamedTuple,
+    Callable,
+    Awaitable,
+)
 
 import os
 import sys
 import asyncio
 import time
 import logging
-import random
 import traceback
+from collections import defaultdict
 
 import sqlalchemy
 import sqlalchemy.exc
@@ -22,8 +34,9 @@ from src.bot.util import (
     free_creature_unprotected_embed,
     free_creature_expired_embed,
     free_creature_claimed_embed,
-    format_embed,
+    EmbedFormatter,
 )
+from src.database.database import Database
 from src.database.postgres import PostgresDatabase
 from src.core.base_types import Event
 from src.core.exceptions import GuildNotFound, PlayerNotFound, CreatureNotFound
@@ -33,14 +46,18 @@ from src.event_resolver.resolver import (
     listen_to_notifications,
     add_notification_function,
 )
+from src.event_resolver.scheduler import EventScheduler
 
 
 if TYPE_CHECKING:
     from src.bot.main import Bot
 
 
-handler_lock = asyncio.Lock()
-waiting_lock = asyncio.Lock()
+# seconds between full reloads of the schedule from the database
+RESYNC_INTERVAL = 60
+
+# guilds resolved in parallel, each one still holds a pooled connection while it resolves
+RESOLVE_WORKERS = 4
 
 
 banned_events: List[Type[Event]] = [
@@ -94,16 +111,193 @@ async def get_channel_exhaustively(
     return channel
 
 
+class FreeCreatureUpdate(NamedTuple):
+    event: PostgresDatabase.FreeCreature.FreeCreatureEvent
+    free_creature: Database.FreeCreature
+    # read along with the resolution, delivering must not query the database on the loop
+    expires_timestamp: int
+
+
+class GuildResolution(NamedTuple):
+    guild_id: int
+    channel_id: int
+    embeds: List[discord.Embed]
+    free_creature_updates: List[FreeCreatureUpdate]
+
+
+def resolve_guild_events(
+    db: PostgresDatabase, guild: discord.Guild, logger: logging.Logger
+) -> Optional[GuildResolution]:
+    """Resolves everything that is due in one guild and returns what has to be posted about it.
+
+    Only touches the database, so it can run on the offload pool while earlier results are
+    still being delivered to discord.
+    """
+    guild_db = PostgresDatabase.Guild(db, guild.id)
+
+    with db.transaction() as con:
+        events = sorted(
+            guild_db.get_events(0, time.time(), also_resolved=False, con=con),
+            key=lambda x: x.id,
+        )
+
+        if events == []:
+            return None
+
+        event_cache = {event.id: event for event in events}
+        event_children: dict[int, List[Event]] = {event.id: [] for event in events}
+        valid_events: List[Event] = []
+        root_events: List[Event] = []
+
+        for event in events:
+            if event.parent_event_id is not None:
+                if event.parent_event_id in event_children:
+                    event_children[event.parent_event_id].append(event)
+                    valid_events.append(event)
+
+                if event.timestamp + 5 < time.time():
+                    # this is a sanity check where basically we count something as a root event if it should've happened 5 seconds ago
+                    # we assume the parent isnt arriving
+                    valid_events.append(event)
+                    root_events.append(event)
+
+            else:
+                valid_events.append(event)
+                root_events.append(event)
+
+        def build_tree(
+            event: Event,
+            depth: int,
+            parent_tree: List[Tuple[Event, List[Any]]],
+            max_depth: int = 3,
+        ) -> None:
+            if depth > max_depth:
+                parent_tree.append((event, []))
+                return
+
+            for child in event_children[event.id]:
+                child_tree: List[Tuple[Event, List[Any]]] = []
+                parent_tree.append((child, child_tree))
+                build_tree(child, depth + 1, child_tree)
+
+        flat_event_tree: dict[int, List[Tuple[Event, Any]]] = {
+            event.id: [] for event in root_events
+        }
+        for root_event in root_events:
+            build_tree(root_event, 1, flat_event_tree[root_event.id])
+
+        channel_id = guild_db.get_typed_config(con=con).channel_id
+        assert channel_id != 0
+
+        embeds: List[discord.Embed] = []
+        for root_event_id, children in flat_event_tree.items():
+            root_event = event_cache[root_event_id]
+
+            allowed = True
+            for banned_event_type in banned_events:
+                if root_event.event_type == banned_event_type.event_type:
+                    allowed = False
+                    break
+
+            if not allowed:
+                continue
+
+            event_text = root_event.text() + "\n"
+
+            fields: List[Tuple[str, str]] = []
+            for child, grandchildren in children:
+                child_title = child.text()
+                child_text = ""
+                for grandchild, _ in grandchildren:
+                    child_text += f"- {cast(Event, grandchild).text()}\n"
+
+                if child_text == "":
+                    event_text += f"- {child.text()}\n"
+                else:
+                    fields.append((child_title, child_text))
+
+            embed = standard_embed(f"Event Triggered #{root_event.id}", event_text)
+            for name, value in fields:
+                embed.add_field(name=name, value=value)
+
+            embeds.append(embed)
+
+        # format before resolving, the texts describe the state the events were triggered in
+        embeds = EmbedFormatter(guild, guild_db, con=con).format_embeds(embeds)
+
+        for event in valid_events:
+            try:
+                event.resolve(con=con)
+                cast(PostgresDatabase.Guild, event.guild).mark_event_as_resolved(event, con=con)
+
+            except Exception as error:
+                error_string = "".join(
+                    traceback.format_exception(type(error), error, error.__traceback__)
+                )
+                logger.error(error_string)
+
+    free_creature_updates: List[FreeCreatureUpdate] = []
+    for event in valid_events:
+        if isinstance(event, PostgresDatabase.FreeCreature.FreeCreatureEvent):
+            try:
+                free_creature = guild_db.get_free_creature(event.channel_id, event.message_id)
+            except CreatureNotFound:
+                continue
+            free_creature_updates.append(
+                FreeCreatureUpdate(event, free_creature, free_creature.get_expires_timestamp())
+            )
+
+    return GuildResolution(guild.id, channel_id, embeds, free_creature_updates)
+
+
+async def deliver_resolutions(
+    deliveries: asyncio.Queue[Tuple[discord.Guild, GuildResolution]],
+    deliver: Callable[[discord.Guild, GuildResolution], Awaitable[None]],
+    logger: logging.Logger,
+) -> None:
+    """Delivers resolutions one after another, a failing one is logged and skipped."""
+    while True:
+        guild, resolution = await deliveries.get()
+        try:
+            await deliver(guild, resolution)
+        except Exception as error:
+            error_string = "".join(
+                traceback.format_exception(type(error), error, error.__traceback__)
+            )
+            logger.error(f"failed to deliver events of guild {guild.id}:\n{error_string}")
+        finally:
+            deliveries.task_done()
+
+
 class EventHandler(commands.Cog):
     def __init__(self, bot: "Bot"):
         self.bot = bot
         self.keep_alive = KeepAlive()
+        self.scheduler = EventScheduler()
+        # (guild_id, event_id), event ids are only unique within a guild
+        self.inserted_event_keys: List[Tuple[int, int]] = []
+        self.schedule_inserted_task: Optional[asyncio.Task[None]] = None
+        self.guild_locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.queued_guilds: Set[int] = set()
+        self.resolve_queue: asyncio.Queue[int] = asyncio.Queue(maxsize=RESOLVE_WORKERS * 4)
+        self.deliveries: asyncio.Queue[Tuple[discord.Guild, GuildResolution]] = asyncio.Queue()
+        self.resolve_workers: List[asyncio.Task[None]] = []
         self.event_handler_listener.start()
-        self.event_handler_loop.start()
+        self.scheduler_loop.start()
+        self.delivery_loop.start()
         self.refresh_free_creature_views.start()
 
+    async def cog_load(self) -> None:
+        self.resolve_workers = [
+            asyncio.create_task(self.resolve_worker()) for _ in range(RESOLVE_WORKERS)
+        ]
+
     async def cog_unload(self) -> None:
-        self.event_handler_loop.cancel()
+        self.scheduler_loop.cancel()
+        self.delivery_loop.cancel()
+        for worker in self.resolve_workers:
+            worker.cancel()
+        self.keep_alive.stop()
 
     @tasks.loop(seconds=0, count=1)
     async def refresh_free_creature_views(self) -> None:
@@ -139,226 +333,171 @@ class EventHandler(commands.Cog):
                             roller,
                             fc.get_protected_timestamp(),
                         )
-                        await message.edit(embed=embed, view=view)
+                        await self.bot.messages.edit(message, embed=embed, view=view)
                     else:
                         embed, view = free_creature_unprotected_embed(
                             fc,
                             roller,
                             fc.get_expires_timestamp(),
                         )
-                        await message.edit(embed=embed, view=view)
-
-                await asyncio.sleep(4)
+                        await self.bot.messages.edit(message, embed=embed, view=view)
 
-    async def event_handler(self, connection: Any, pid: Any, channel: Any, payload: str) -> None:
-        embeds_to_send: List[Tuple[discord.Embed, discord.PartialMessageable]] = []
+    async def resolve_worker(self) -> None:
+        while True:
+            guild_id = await self.resolve_queue.get()
+            self.queued_guilds.discard(guild_id)
 
-        if waiting_lock.locked():
+            try:
+                await self.resolve_guild(guild_id)
+            except Exception as error:
+                error_string = "".join(
+                    traceback.format_exception(type(error), error, error.__traceback__)
+                )
+                self.bot.logger.error(error_string)
+            finally:
+                self.resolve_queue.task_done()
+
+    async def resolve_guild(self, guild_id: int) -> None:
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            try:
+                guild = await self.bot.fetch_guild(guild_id)
+            except discord.NotFound:
+                return
+
+        # two workers may pick up the same guild when it is scheduled again while resolving
+        async with self.guild_locks[guild_id]:
+            resolution = await self.bot.offload.run(
+                resolve_guild_events, self.bot.db, guild, self.bot.logger
+            )
+            next_timestamps = await self.bot.offload.run(
+                self.bot.db.get_next_event_timestamps, [guild_id]
+            )
+
+        if resolution is not None:
+            # resolved events can touch any player of the guild
+            self.bot.autocomplete.invalidate(guild_id)
+            self.deliveries.put_nowait((guild, resolution))
+
+        # whatever could not be resolved yet is retried a second later at the earliest
+        for next_guild_id, timestamp in next_timestamps.items():
+            self.scheduler.schedule(next_guild_id, max(timestamp, time.time() + 1))
+
+    async def deliver(self, guild: discord.Guild, resolution: GuildResolution) -> None:
+        for update in resolution.free_creature_updates:
+            await self.update_free_creature_message(guild, update)
+
+        channel = await get_channel_exhaustively(self.bot, guild, resolution.channel_id)
+        if channel is None:
             return
 
-        async with waiting_lock:
-            pass
-
-        identifier = random.randint(1, 10000)
-
-        async with handler_lock:
-            for guild_db in self.bot.db.get_guilds():
-                with self.bot.db.transaction() as con:
-                    events = sorted(
-                        guild_db.get_events(0, time.time(), also_resolved=False, con=con),
-                        key=lambda x: x.id,
-                    )
-
-                    print("events", events)
+        for embed in resolution.embeds:
+            await self.bot.messages.send(channel, embed)
 
-                    if events == []:
-                        continue
+    async def update_free_creature_message(
+        self, guild: discord.Guild, update: FreeCreatureUpdate
+    ) -> None:
+        event, free_creature, expires_timestamp = update
 
-                    event_cache = {event.id: event for event in events}
-                    event_children: dict[int, List[Event]] = {event.id: [] for event in events}
-                    valid_events: List[Event] = []
-                    root_events: List[Event] = []
-
-                    for event in events:
-                        if event.parent_event_id is not None:
-                            if event.parent_event_id in event_children:
-                                event_children[event.parent_event_id].append(event)
-                                valid_events.append(event)
-
-                            if event.timestamp + 5 < time.time():
-                                # this is a sanity check where basically we count something as a root event if it should've happened 5 seconds ago
-                                # we assume the parent isnt arriving
-                                valid_events.append(event)
-                                root_events.append(event)
-
-                        else:
-                            valid_events.append(event)
-                            root_events.append(event)
-
-                    def build_tree(
-                        event: Event,
-                        depth: int,
-                        parent_tree: List[Tuple[Event, List[Any]]],
-                        max_depth: int = 3,
-                    ) -> None:
-                        if depth > max_depth:
-                            parent_tree.append((event, []))
-                            return
-
-                        for child in event_children[event.id]:
-                            child_tree: List[Tuple[Event, List[Any]]] = []
-                            parent_tree.append((child, child_tree))
-                            build_tree(child, depth + 1, child_tree)
-
-                    flat_event_tree: dict[int, List[Tuple[Event, Any]]] = {
-                        event.id: [] for event in root_events
-                    }
-                    for root_event in root_events:
-                        build_tree(root_event, 1, flat_event_tree[root_event.id])
-
-                    channel_id = guild_db.get_config(con=con)["channel_id"]
-                    assert channel_id != 0
-
-                    try:
-                        guild = await self.bot.fetch_guild(guild_db.id)
-                    except discord.NotFound:
-                        continue
+        channel = await get_channel_exhaustively(self.bot, guild, event.channel_id)
+        roller = await guild.fetch_member(free_creature.roller_id)
+        if channel is None:
+            return
 
-                    t = time.time()
-                    channel = await get_channel_exhaustively(self.bot, guild, channel_id)
-
-                    for root_event_id, children in flat_event_tree.items():
-                        root_event = event_cache[root_event_id]
-
-                        allowed = True
-                        for banned_event_type in banned_events:
-                            if root_event.event_type == banned_event_type.event_type:
-                                allowed = False
-                                break
-
-                        if not allowed:
-                            continue
-
-                        event_text = root_event.text() + "\n"
-
-                        fields: List[Tuple[str, str]] = []
-                        for child, grandchildren in children:
-                            child_title = child.text()
-                            child_text = ""
-                            for grandchild, _ in grandchildren:
-                                child_text += f"- {cast(Event, grandchild).text()}\n"
-
-                            if child_text == "":
-                                event_text += f"- {child.text()}\n"
-                            else:
-                                fields.append((child_title, child_text))
-
-                        embed = standard_embed(f"Event Triggered #{root_event.id}", event_text)
-                        for name, value in fields:
-                            embed.add_field(name=name, value=value)
-
-                        embeds_to_send.append((format_embed(embed, guild, guild_db), channel))
-
-                    for event in valid_events:
-                        try:
-                            event.resolve(con=con)
-                            cast(PostgresDatabase.Guild, event.guild).mark_event_as_resolved(
-                                event, con=con
-                            )
-
-                        except Exception as error:
-                            error_string = "".join(
-                                traceback.format_exception(type(error), error, error.__traceback__)
-                            )
-                            self.bot.logger.error(error_string)
-
-                for event in valid_events:
-                    if isinstance(event, PostgresDatabase.FreeCreature.FreeCreatureEvent):
-                        try:
-                            free_creature = guild_db.get_free_creature(
-                                event.channel_id, event.message_id
-                            )
-                            channel = await get_channel_exhaustively(
-                                self.bot, guild, event.channel_id
-                            )
-                            roller = await guild.fetch_member(free_creature.roller_id)
-                            if channel is not None:
-                                message = await cast(
-                                    discord.PartialMessageable, channel
-                                ).fetch_message(event.message_id)
-
-                                if isinstance(
-                                    event,
-                                    PostgresDatabase.FreeCreature.FreeCreatureProtectedEvent,
-                                ):
-                                    if any(
-                                        e.description and "Claimed by" in e.description
-                                        for e in message.embeds
-                                    ):
-                                        continue
-                                    embed, view = free_creature_unprotected_embed(
-                                        free_creature,
-                                        roller,
-                                        free_creature.get_expires_timestamp(),
-                                    )
-                                    await message.edit(embed=embed, view=view)
-                                elif isinstance(
-                                    event,
-                                    PostgresDatabase.FreeCreature.FreeCreatureClaimedEvent,
-                                ):
-                                    claimer = await guild.fetch_member(event.player_id)
-                                    if claimer is not None:
-                                        await message.edit(
-                                            embed=free_creature_claimed_embed(
-                                                free_creature, roller, claimer
-                                            ),
-                                            view=None,
-                                        )
-                                elif isinstance(
-                                    event,
-                                    PostgresDatabase.FreeCreature.FreeCreatureExpiresEvent,
-                                ):
-                                    if any(
-                                        e.description and "Claimed by" in e.description
-                                        for e in message.embeds
-                                    ):
-                                        continue
-                                    await message.edit(
-                                        embed=free_creature_expired_embed(free_creature, roller),
-                                        view=None,
-                                    )
-
-                            await asyncio.sleep(4)
-
-                        except CreatureNotFound:
-                            pass
-
-            for embed, channel in embeds_to_send:
-                cast_channel = cast(discord.PartialMessageable, channel)
-
-                await cast_channel.send(embed=embed)
-                await asyncio.sleep(4)  # rate limit
+        message = await channel.fetch_message(event.message_id)
+        claimed = any(e.description and "Claimed by" in e.description for e in message.embeds)
+
+        if isinstance(event, PostgresDatabase.FreeCreature.FreeCreatureProtectedEvent):
+            if claimed:
+                return
+            embed, view = free_creature_unprotected_embed(
+                free_creature,
+                roller,
+                expires_timestamp,
+            )
+            await self.bot.messages.edit(message, embed=embed, view=view)
+        elif isinstance(event, PostgresDatabase.FreeCreature.FreeCreatureClaimedEvent):
+            claimer = await guild.fetch_member(event.player_id)
+            if claimer is not None:
+                await self.bot.messages.edit(
+                    message,
+                    embed=free_creature_claimed_embed(free_creature, roller, claimer),
+                    view=None,
+                )
+        elif isinstance(event, PostgresDatabase.FreeCreature.FreeCreatureExpiresEvent):
+            if claimed:
+                return
+            await self.bot.messages.edit(
+                message,
+                embed=free_creature_expired_embed(free_creature, roller),
+                view=None,
+            )
+
+    async def event_inserted(self, connection: Any, pid: Any, channel: Any, payload: str) -> None:
+        guild_id, event_id = (int(i) for i in payload.split(":"))
+        self.inserted_event_keys.append((guild_id, event_id))
+
+        if self.schedule_inserted_task is None or self.schedule_inserted_task.done():
+            self.schedule_inserted_task = asyncio.create_task(self.schedule_inserted())
+
+    async def schedule_inserted(self) -> None:
+        # a transaction commits all its events at once, look them up together
+        await asyncio.sleep(0.1)
+
+        event_keys, self.inserted_event_keys = self.inserted_event_keys, []
+        for guild_id, timestamp in await self.bot.offload.run(
+            self.bot.db.get_event_timestamps, event_keys
+        ):
+            self.scheduler.schedule(guild_id, timestamp)
+
+        for guild_id, player_id in await self.bot.offload.run(
+            self.bot.db.get_event_players, event_keys
+        ):
+            self.bot.autocomplete.invalidate(guild_id, player_id)
 
     @tasks.loop(seconds=0, count=1, reconnect=True)
     async def event_handler_listener(self) -> None:
         await self.bot.wait_until_ready()
 
-        await self.event_handler(None, None, None, "0")
-
         try:
             add_notification_function(self.bot.db)
         except sqlalchemy.exc.ProgrammingError:
             pass
 
         listener_task = asyncio.create_task(
-            listen_to_notifications(self.bot.db, self.event_handler, keep_alive=self.keep_alive)
+            listen_to_notifications(self.bot.db, self.event_inserted, keep_alive=self.keep_alive)
         )
         await listener_task
 
-    @tasks.loop(seconds=3, reconnect=True)
-    async def event_handler_loop(self) -> None:
+    @tasks.loop(seconds=0, count=1, reconnect=True)
+    async def scheduler_loop(self) -> None:
+        await self.bot.wait_until_ready()
+
+        last_sync = 0.0
+        while True:
+            # also catches events whose notification got lost, e.g. while reconnecting
+            if time.time() - last_sync > RESYNC_INTERVAL:
+                next_timestamps = await self.bot.offload.run(self.bot.db.get_next_event_timestamps)
+                for guild_id, timestamp in next_timestamps.items():
+                    self.scheduler.schedule(guild_id, timestamp)
+                last_sync = time.time()
+
+            due = self.scheduler.pop_due(time.time())
+            if due != []:
+                for guild_id in due:
+                    if guild_id in self.queued_guilds:
+                        continue
+                    self.queued_guilds.add(guild_id)
+                    # blocks while all workers are busy and the queue is full
+                    await self.resolve_queue.put(guild_id)
+            else:
+                await self.scheduler.wait(max(0.0, last_sync + RESYNC_INTERVAL - time.time()))
+
+    @tasks.loop(seconds=0, count=1, reconnect=True)
+    async def delivery_loop(self) -> None:
         await self.bot.wait_until_ready()
-        await self.event_handler(None, None, None, "0")
+
+        await deliver_resolutions(self.deliveries, self.deliver, self.bot.logger)
 
 
 async def setup(bot: "Bot") -> None:
@@ -1,7 +1,8 @@
-from typing import Optional, Any, List, cast, Tuple, Coroutine, Callable
+from typing import Optional, Any, List, cast, Tuple, Coroutine, Callable, Union, Type
 
 import os
 import sys
+import asyncio
 import logging
 import traceback
 
@@ -20,8 +21,18 @@ from src.bot.util import (
     success_embed,
     error_embed,
 )
-from src.bot.checks import guild_exists, player_exists, always_fails
+from src.bot.checks import GameContext, guild_exists, player_exists, always_fails
+from src.bot.delivery import MessageQueue
+from src.bot.autocomplete import AutocompleteCache
 from src.database.postgres import PostgresDatabase
+from src.database.async_postgres import AsyncPostgresDatabase
+from src.database.offload import OffloadDatabase
+from src.event_resolver.resolver import (
+    get_db_url,
+    listen_to_notifications,
+    add_config_notification_function,
+    add_player_notification_function,
+)
 from src.core.exceptions import GuildNotFound, PlayerNotFound
 from src.definitions.start_condition import start_condition
 from src.definitions.extra_data import Choice, EXTRA_DATA
@@ -41,7 +52,9 @@ def connect_to_db() -> PostgresDatabase:
     )
 
     engine = sqlalchemy.create_engine(url)
-    return PostgresDatabase(start_condition, engine)
+    return PostgresDatabase(
+        start_condition, engine, wide_resources=os.environ.get("WIDE_RESOURCES", "0") == "1"
+    )
 
 
 class Bot(commands.Bot):
@@ -53,7 +66,11 @@ class Bot(commands.Bot):
 
         self.initial_extensions = initial_extensions
         self.db = connect_to_db()
+        self.offload = OffloadDatabase(self.db)
+        self.async_db: AsyncPostgresDatabase = cast(AsyncPostgresDatabase, None)
         self.logger = logger
+        self.messages = MessageQueue(logger)
+        self.autocomplete = AutocompleteCache()
         self.channel_cache: dict[int, discord.PartialMessageable] = {}
         self.owner_id = int(os.environ["OWNER_ID"])
 
@@ -63,7 +80,51 @@ class Bot(commands.Bot):
         ] = {}
 
     async def setup_hook(self) -> None:
-        pass
+        self.async_db = await AsyncPostgresDatabase.connect(self.db, get_db_url(self.db))
+
+        if self.db.wide_resources:
+            # players are also copied on first access, this catches up with everyone else
+            self.resource_migration = asyncio.create_task(
+                self.offload.run(self.db.migrate_resources)
+            )
+
+        # other bot processes announce their config changes, drop them from our cache
+        add_config_notification_function(self.db)
+        self.config_listener = asyncio.create_task(
+            listen_to_notifications(self.db, self.config_changed, channel="guild_config")
+        )
+        # the same for players that left through another process
+        add_player_notification_function(self.db)
+        self.player_listener = asyncio.create_task(
+            listen_to_notifications(self.db, self.player_removed, channel="player_remove")
+        )
+
+    def config_changed(self, connection: Any, pid: Any, channel: Any, payload: str) -> None:
+        self.db.config_cache.invalidate(int(payload))
+        # this also covers a guild removed by another process
+        self.db.existence_cache.invalidate(int(payload))
+
+    def player_removed(self, connection: Any, pid: Any, channel: Any, payload: str) -> None:
+        guild_id, player_id = (int(i) for i in payload.split(":"))
+        self.db.existence_cache.invalidate(guild_id, [player_id])
+        self.autocomplete.invalidate(guild_id, player_id)
+
+    async def get_context(
+        self,
+        origin: Union[discord.Message, discord.Interaction],
+        /,
+        *,
+        cls: Type[commands.Context[Any]] = GameContext,
+    ) -> Any:
+        # the checks hand the guild and player they resolved to the command through it
+        return await super().get_context(origin, cls=cls)
+
+    async def close(self) -> None:
+        await super().close()
+        await self.messages.close()
+        if self.async_db is not None:
+            await self.async_db.close()
+        self.offload.shutdown()
 
 
 bot = Bot(["src.bot.basic", "src.bot.cheats", "src.bot.event_handler"])
@@ -78,7 +139,7 @@ async def on_ready() -> None:
 
     logger.info(f"Logged in as {bot.user} (ID: {bot.user.id})")
     logger.info("------")
-    logger.info(f"connected to database with {len(bot.db.get_guilds())} guilds")
+    logger.info(f"connected to database with {len(await bot.async_db.get_guilds())} guilds")
 
 
 @bot.event
@@ -122,4 +183,23 @@ async def test_sync(ctxt: commands.Context[Bot]) -> None:
     await ctxt.send(embed=success_embed("Sync", f"Synced {len(synced)} commands to test guild"))
 
 
+@bot.command()
+@commands.is_owner()
+async def db_stats(ctxt: commands.Context[Bot], reset: bool = False) -> None:
+    """Shows how busy the database threads are"""
+    stats = bot.offload.stats()
+    if reset:
+        bot.offload.reset_stats()
+
+    await ctxt.send(
+        embed=standard_embed(
+            "Database",
+            f"Workers: {stats.workers}, running: {stats.running}\n"
+            f"Queued: {stats.queued} (max {stats.max_queued})\n"
+            f"Completed: {stats.completed}\n"
+            f"Wait: {stats.mean_wait * 1000:.1f}ms mean, {stats.max_wait * 1000:.1f}ms max",
+        )
+    )
+
+
 bot.run(os.environ["DISCORD_TOKEN"])
@@ -120,13 +120,14 @@ async def delete_message(message: discord.Message, seconds: int) -> None:
 def player_embed(
     member: discord.Member, player_db: Database.Player, private: bool = True
 ) -> discord.Embed:
-    guild_config = player_db.guild.get_config()
-    max_orders = int(guild_config["max_orders"])
-    max_magic = int(guild_config["max_magic"])
-    max_cards = int(guild_config["max_cards"])
+    snapshot = player_db.snapshot()
+    guild_config = snapshot.config
+    max_orders = int(guild_config.max_orders)
+    max_magic = int(guild_config.max_magic)
+    max_cards = int(guild_config.max_cards)
 
-    resources = player_db.get_resources()
-    recharges = player_db.get_recharges()
+    resources = snapshot.resources
+    recharges = snapshot.recharges
 
     resources_text = {
         r: "``"
@@ -139,27 +140,27 @@ def player_embed(
     resources_text[Resource.ORDERS] += f"/{max_orders}"
     if resources[Resource.ORDERS] < max_orders:
         resources_text[Resource.ORDERS] += (
-            f" (+1 in {get_relative_timestamp(recharges[Database.Player.PlayerOrderRechargeEvent.event_type].timestamp)})"
+            f" (+1 in {get_relative_timestamp(recharges[Database.Player.PlayerOrderRechargeEvent.event_type])})"
         )
 
     resources_text[Resource.MAGIC] += f"/{max_magic}"
     if resources[Resource.MAGIC] < max_magic:
         resources_text[Resource.MAGIC] += (
-            f" (+1 in {get_relative_timestamp(recharges[Database.Player.PlayerMagicRechargeEvent.event_type].timestamp)})"
+            f" (+1 in {get_relative_timestamp(recharges[Database.Player.PlayerMagicRechargeEvent.event_type])})"
         )
 
     resources_text_joined = "\n".join([f"{resources_text[r]}" for r in BaseResources])
 
-    hand = player_db.get_hand()
+    hand = snapshot.hand
 
     hand_recharge_text = ""
-    if len(hand) < guild_config["max_cards"]:
-        hand_recharge_text = f" (+1 in {get_relative_timestamp(recharges[Database.Player.PlayerCardRechargeEvent.event_type].timestamp)})"
+    if len(hand) < guild_config.max_cards:
+        hand_recharge_text = f" (+1 in {get_relative_timestamp(recharges[Database.Player.PlayerCardRechargeEvent.event_type])})"
 
-    deck = player_db.get_deck()
+    deck = snapshot.deck
 
-    hand_text = f"{len(player_db.get_hand())}/{max_cards} cards"
-    deck_text = f"{len(player_db.get_deck())} cards"
+    hand_text = f"{len(hand)}/{max_cards} cards"
+    deck_text = f"{len(deck)} cards"
     if private:
         hand_text += " 👁️"
         deck_text += " 👁️"
@@ -170,15 +171,15 @@ def player_embed(
     if hand_recharge_text != "":
         hand_text += f"\n {hand_recharge_text}"
 
-    discard_text = "\n".join([d.text() for d in player_db.get_discard()])
+    discard_text = "\n".join([d.text() for d in snapshot.discard])
     played_text = "\n".join(
         [
             f"{c.text()} (goes to discard in {get_relative_timestamp(timestamp)})"
-            for c, timestamp in player_db.get_played()
+            for c, timestamp in snapshot.played
         ]
     )
 
-    campaign = sorted(player_db.get_campaign(), key=lambda x: x[1], reverse=True)
+    campaign = sorted(snapshot.campaign, key=lambda x: x[1], reverse=True)
     campaign_total = sum([x for _, x in campaign])
 
     campaign_text = (
@@ -206,9 +207,12 @@ def player_embed(
 
 
 def regions_embed(guild_db: Database.Guild) -> discord.Embed:
-    regions = sorted(guild_db.get_regions(), key=lambda x: x.id)
+    region_states = guild_db.get_region_states()
+    regions = [state.region for state in region_states]
     regions_cache = {r.id: r for r in regions}
-    regions_occupied = {r.id: r.occupied() for r in regions}
+    regions_occupied = {
+        state.region.id: (state.occupant, state.timestamp) for state in region_states
+    }
 
     region_ids_by_region_categories: defaultdict[RegionCategory, List[int]] = defaultdict(
         lambda: []
@@ -397,27 +401,12 @@ def free_creature_expired_embed(
 def conflict_embed(guild: discord.Guild, guild_db: Database.Guild) -> discord.Embed:
     conflict_text = ""
 
-    end_events = guild_db.get_events(
-        time.time(), time.time() * 2, Database.Guild.ConflictEndEvent, also_resolved=False
-    )
-    if end_events != []:
-        end_event = end_events[0]
-        conflict_text += f"Ends in {get_relative_timestamp(end_event.timestamp)}\n"
-
-    player_scores: dict[int, int] = {}
-    players = guild_db.get_players()
-    player_cache = {p.id: p for p in players}
-
-    if len(players) > 0:
-        for player_db in guild_db.get_players():
-            player_strength = 0
-            for c, s in player_db.get_campaign():
-                player_strength += s
+    leaderboard = guild_db.get_leaderboard()
+    if leaderboard.end_timestamp is not None:
+        conflict_text += f"Ends in {get_relative_timestamp(leaderboard.end_timestamp)}\n"
 
-            player_scores[player_db.id] = player_strength
-
-        sorted_scores = sorted(player_scores.items(), key=lambda x: x[1], reverse=True)
-        for i, (p_id, strength) in enumerate(sorted_scores, 1):
+    if len(leaderboard.scores) > 0:
+        for i, (p_id, strength) in enumerate(leaderboard.scores, 1):
             conflict_text += (
                 f"#{i} <player:{p_id}>: {strength} {resource_to_emoji(Resource.STRENGTH)}\n"
             )
@@ -431,77 +420,110 @@ def conflict_embed(guild: discord.Guild, guild_db: Database.Guild) -> discord.Em
     return embed
 
 
-def format_player(id: int, guild: discord.Guild, guild_db: Database.Guild) -> str:
-    return f"<@{id}>"
-
-
-def format_creature(id: int, guild: discord.Guild, guild_db: Database.Guild) -> str:
-    try:
-        return guild_db.get_creature(id).text()
-    except CreatureNotFound:
-        return f"<creature:{id}>"
-
-
-def format_region(id: int, guild: discord.Guild, guild_db: Database.Guild) -> str:
-    try:
-        return guild_db.get_region(id).text()
-    except RegionNotFound:
-        return f"<region:{id}>"
-
-
-def format_free_creature(id: str, guild: discord.Guild, guild_db: Database.Guild) -> str:
-    m = re.match(r"\((\d+),\s*(\d+)\)", id)
-
-    if m:
-        try:
-            free_creature_db = guild_db.get_free_creature(int(m.group(1)), int(m.group(2)))
-            return f"[{free_creature_db.creature.text()}](https://discord.com/channels/{guild.id}/{m.group(1)}/{m.group(2)})"
-        except CreatureNotFound:
-            return f"<free_creature:{id}>"
-    else:
-        return f"<free_creature:{id}>"
-
-
-format_lookup: dict[str, Callable[[Any, discord.Guild, Database.Guild], str]] = {
-    "player": format_player,
-    "creature": format_creature,
-    "region": format_region,
-    "free_creature": format_free_creature,
-}
+# <player:1>, <creature:2>, <region:3> or <free_creature:(channel_id, message_id)>
+TOKEN_PATTERN = re.compile(r"<(player|creature|region|free_creature):(\d+|\((\d+),\s*(\d+)\))>")
+
+
+class EmbedFormatter:
+    """Replaces the entity tokens in texts with what they refer to.
+
+    Everything referenced across a batch of texts is looked up with one query per entity type
+    and kept for the lifetime of the formatter, so use one formatter per handler tick.
+    """
+
+    def __init__(
+        self,
+        guild: discord.Guild,
+        guild_db: Database.Guild,
+        con: Optional[Database.TransactionManager] = None,
+    ):
+        self.guild = guild
+        self.guild_db = guild_db
+        self.con = con
+        self.creatures: dict[int, Optional[Database.Creature]] = {}
+        self.regions: dict[int, Optional[Database.Region]] = {}
+        self.free_creatures: dict[Tuple[int, int], Optional[Database.FreeCreature]] = {}
+
+    def prefetch(self, texts: List[str]) -> None:
+        creature_ids: set[int] = set()
+        region_ids: set[int] = set()
+        free_creature_keys: set[Tuple[int, int]] = set()
+
+        for text in texts:
+            for t, id, channel_id, message_id in TOKEN_PATTERN.findall(text):
+                if t == "creature" and int(id) not in self.creatures:
+                    creature_ids.add(int(id))
+                elif t == "region" and int(id) not in self.regions:
+                    region_ids.add(int(id))
+                elif t == "free_creature" and channel_id != "":
+                    key = (int(channel_id), int(message_id))
+                    if key not in self.free_creatures:
+                        free_creature_keys.add(key)
+
+        if creature_ids:
+            found_creatures = self.guild_db.get_creatures_by_ids(list(creature_ids), con=self.con)
+            for creature_id in creature_ids:
+                self.creatures[creature_id] = found_creatures.get(creature_id)
+
+        if region_ids:
+            found_regions = self.guild_db.get_regions_by_ids(list(region_ids), con=self.con)
+            for region_id in region_ids:
+                self.regions[region_id] = found_regions.get(region_id)
+
+        if free_creature_keys:
+            found_free_creatures = self.guild_db.get_free_creatures_by_keys(
+                list(free_creature_keys), con=self.con
+            )
+            for key in free_creature_keys:
+                self.free_creatures[key] = found_free_creatures.get(key)
+
+    def replace(self, match: re.Match[str]) -> str:
+        t, id, channel_id, message_id = match.groups()
+
+        if t == "player":
+            return f"<@{id}>"
+        if t == "creature":
+            creature = self.creatures.get(int(id))
+            return creature.text() if creature is not None else match.group(0)
+        if t == "region":
+            region = self.regions.get(int(id))
+            return region.text() if region is not None else match.group(0)
+
+        if channel_id is not None:
+            free_creature = self.free_creatures.get((int(channel_id), int(message_id)))
+            if free_creature is not None:
+                return f"[{free_creature.creature.text()}](https://discord.com/channels/{self.guild.id}/{channel_id}/{message_id})"
+        return match.group(0)
+
+    def format_str(self, s: str) -> str:
+        self.prefetch([s])
+        return TOKEN_PATTERN.sub(self.replace, s)
+
+    def format_embeds(self, embeds: List[discord.Embed]) -> List[discord.Embed]:
+        texts: List[str] = []
+        for embed in embeds:
+            assert embed.title is not None
+            assert embed.description is not None
+            texts += [embed.title, embed.description]
+            for f in getattr(embed, "_fields", []):
+                texts += [str(f["name"]), str(f["value"])]
+        self.prefetch(texts)
+
+        for embed in embeds:
+            embed.title = self.format_str(cast(str, embed.title))
+            embed.description = self.format_str(cast(str, embed.description))
+            for f in getattr(embed, "_fields", []):
+                f["name"] = self.format_str(str(f["name"]))
+                f["value"] = self.format_str(str(f["value"]))
+
+        return embeds
 
 
 def format_str(s: str, guild: discord.Guild, guild_db: Database.Guild) -> str:
-    matches = list(re.findall(r"<([^:]+):(\d+)>", s)) + list(
-        re.findall(r"<([^:]+):(\(\d+,\d+\))>", s)
-    )
-
-    new_s = s
-
-    for t, id in matches:
-        old = f"<{t}:{id}>"
-
-        formatter = format_lookup.get(t)
-
-        if formatter is not None:
-            new_s = new_s.replace(old, formatter(id, guild, guild_db))
-
-    return new_s
+    return EmbedFormatter(guild, guild_db).format_str(s)
 
 
 def format_embed(
     embed: discord.Embed, guild: discord.Guild, guild_db: Database.Guild
 ) -> discord.Embed:
-    assert embed.title is not None
-    assert embed.description is not None
-
-    embed.title = format_str(embed.title, guild, guild_db)
-    embed.description = format_str(embed.description, guild, guild_db)
-
-    try:
-        for f in embed._fields:
-            f["name"] = format_str(str(f["name"]), guild, guild_db)
-            f["value"] = format_str(str(f["value"]), guild, guild_db)
-
-        return embed
-    except AttributeError:
-        return embed
+    return EmbedFormatter(guild, guild_db).format_embeds([embed])[0]
@@ -182,9 +182,20 @@ RegionCategory = namedtuple(
 )
 
 
+event_registry: dict[str, type[Event]] = {}
+
+
 class Event:
     event_type = "base_event"
 
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+
+        # subclasses that do not set their own event_type are not stored events
+        if "event_type" in cls.__dict__:
+            assert cls.event_type not in event_registry, f"duplicate event type {cls.event_type}"
+            event_registry[cls.event_type] = cls
+
     def __init__(
         self,
         parent: Any,
@@ -0,0 +1,622 @@
+from __future__ import annotations
+
+import json
+from typing import List, Tuple, Type, Optional, Any, cast
+
+import asyncpg  # type: ignore
+
+from src.core.base_types import Resource, Event
+from src.core.exceptions import (
+    GuildNotFound,
+    PlayerNotFound,
+    CreatureNotFound,
+    RegionNotFound,
+)
+from src.database.database import Database
+from src.database.postgres import PostgresDatabase, RESOURCE_COLUMNS, timestamp_bounds
+from src.definitions.regions import regions
+from src.definitions.creatures import creatures
+
+
+async def init_connection(con: asyncpg.Connection) -> None:
+    await con.set_type_codec("json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+class AsyncPostgresDatabase:
+    """Non-blocking read access to the tables of a PostgresDatabase through an asyncpg pool.
+
+    Game actions still go through the synchronous database, every object here can hand out its
+    synchronous counterpart with sync().
+    """
+
+    def __init__(self, db: PostgresDatabase, pool: asyncpg.Pool):
+        self.db = db
+        self.pool = pool
+
+    @classmethod
+    async def connect(
+        cls, db: PostgresDatabase, url: str, min_size: int = 2, max_size: int = 10
+    ) -> AsyncPostgresDatabase:
+        pool = await asyncpg.create_pool(
+            url, min_size=min_size, max_size=max_size, init=init_connection
+        )
+        return cls(db, pool)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    class TransactionManager:
+        def __init__(
+            self,
+            parent: AsyncPostgresDatabase,
+            parent_manager: Optional[AsyncPostgresDatabase.TransactionManager],
+        ):
+            self.parent = parent
+            self.parent_manager = parent_manager
+
+            self.con: asyncpg.Connection = None
+            self.trans: asyncpg.transaction.Transaction = None
+
+        async def __aenter__(self) -> AsyncPostgresDatabase.TransactionManager:
+            if self.parent_manager is None:
+                self.con = await self.parent.pool.acquire()
+                self.trans = self.con.transaction()
+                await self.trans.start()
+            else:
+                assert self.parent_manager.con is not None
+                self.con = self.parent_manager.con
+                self.trans = self.parent_manager.trans
+
+            return self
+
+        async def __aexit__(
+            self,
+            exc_type: Optional[Type[Exception]],
+            exc_value: Optional[Exception],
+            traceback: Any,
+        ) -> None:
+            if self.parent_manager is not None:
+                return
+
+            try:
+                if exc_value is not None:
+                    await self.trans.rollback()
+                else:
+                    await self.trans.commit()
+            finally:
+                await self.parent.pool.release(self.con)
+
+        async def fetch(self, sql: str, *args: Any) -> List[Any]:
+            return cast(List[Any], await self.con.fetch(sql, *args))
+
+        async def fetchrow(self, sql: str, *args: Any) -> Any:
+            return await self.con.fetchrow(sql, *args)
+
+        async def fetchval(self, sql: str, *args: Any) -> Any:
+            return await self.con.fetchval(sql, *args)
+
+        async def execute(self, sql: str, *args: Any) -> str:
+            return cast(str, await self.con.execute(sql, *args))
+
+    def transaction(
+        self, parent: Optional[AsyncPostgresDatabase.TransactionManager] = None
+    ) -> AsyncPostgresDatabase.TransactionManager:
+        return self.TransactionManager(self, parent)
+
+    async def get_guilds(
+        self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+    ) -> List[AsyncPostgresDatabase.Guild]:
+        async with self.transaction(parent=con) as sub_con:
+            results = await sub_con.fetch("SELECT id FROM guilds")
+            return [AsyncPostgresDatabase.Guild(self, row[0]) for row in results]
+
+    async def get_guild(
+        self,
+        guild_id: int,
+        con: Optional[AsyncPostgresDatabase.TransactionManager] = None,
+    ) -> AsyncPostgresDatabase.Guild:
+        async with self.transaction(parent=con) as sub_con:
+            result = await sub_con.fetchval("SELECT id FROM guilds WHERE id = $1", guild_id)
+
+            if result is None:
+                raise GuildNotFound("No guilds with this guild_id")
+
+            return AsyncPostgresDatabase.Guild(self, result)
+
+    class Guild:
+        def __init__(self, parent: AsyncPostgresDatabase, guild_id: int):
+            self.parent = parent
+            self.id = guild_id
+
+        def __eq__(self, other: Any) -> bool:
+            if isinstance(other, AsyncPostgresDatabase.Guild):
+                return self.id == other.id
+            return False
+
+        def __repr__(self) -> str:
+            return f"<AsyncDatabaseGuild: {self.id}>"
+
+        def sync(self) -> Database.Guild:
+            return PostgresDatabase.Guild(self.parent.db, self.id)
+
+        async def get_events(
+            self,
+            timestamp_start: float,
+            timestamp_end: float,
+            event_type: Optional[Type[Event]] = None,
+            also_resolved: Optional[bool] = True,
+            con: Optional[AsyncPostgresDatabase.TransactionManager] = None,
+        ) -> List[Event]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                resolved_string = "" if also_resolved else "AND NOT resolved"
+                start, end = timestamp_bounds(timestamp_start, timestamp_end)
+                type_string = "" if event_type is None else "AND event_type = $4"
+                args: List[Any] = [self.id, start, end]
+                if event_type is not None:
+                    args.append(event_type.event_type)
+
+                results = await sub_con.fetch(
+                    f"""
+                    SELECT id, timestamp, parent_event_id, event_type, extra_data FROM events
+                    WHERE guild_id = $1
+                    AND timestamp BETWEEN $2::bigint AND $3::bigint
+                    {type_string}
+                    {resolved_string}
+                    ORDER BY timestamp
+                    """,
+                    *args,
+                )
+                return self.parent.db.decode_rows(self.sync(), results)
+
+        async def get_config(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> dict[Any, Any]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                result = await sub_con.fetchval("SELECT config FROM guilds WHERE id = $1", self.id)
+                return cast(dict[Any, Any], result)
+
+        async def get_regions(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[AsyncPostgresDatabase.Region]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    "SELECT id, base_region_id FROM regions WHERE guild_id = $1", self.id
+                )
+                return [
+                    AsyncPostgresDatabase.Region(self.parent, row[0], regions[row[1]], self)
+                    for row in results
+                ]
+
+        async def get_region_states(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.RegionState]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    """
+                    SELECT r.id, r.base_region_id, c.id, c.base_creature_id, c.owner_id,
+                        o.timestamp_occupied
+                    FROM regions r
+                    LEFT JOIN occupies o ON o.guild_id = r.guild_id AND o.region_id = r.id
+                    LEFT JOIN creatures c ON c.guild_id = o.guild_id AND c.id = o.creature_id
+                    WHERE r.guild_id = $1
+                    ORDER BY r.id
+                    """,
+                    self.id,
+                )
+                guild = self.sync()
+                return [
+                    Database.RegionState(
+                        PostgresDatabase.Region(self.parent.db, row[0], regions[row[1]], guild),
+                        (
+                            None
+                            if row[2] is None
+                            else PostgresDatabase.Creature(
+                                self.parent.db,
+                                row[2],
+                                creatures[row[3]],
+                                guild,
+                                PostgresDatabase.Player(self.parent.db, row[4], guild),
+                            )
+                        ),
+                        row[5],
+                    )
+                    for row in results
+                ]
+
+        async def get_region(
+            self,
+            region_id: int,
+            con: Optional[AsyncPostgresDatabase.TransactionManager] = None,
+        ) -> AsyncPostgresDatabase.Region:
+            async with self.parent.transaction(parent=con) as sub_con:
+                result = await sub_con.fetchrow(
+                    "SELECT id, base_region_id FROM regions WHERE id = $1 AND guild_id = $2",
+                    region_id,
+                    self.id,
+                )
+                if result is None:
+                    raise RegionNotFound("No regions with this id")
+                return AsyncPostgresDatabase.Region(
+                    self.parent, result[0], regions[result[1]], self
+                )
+
+        async def get_players(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[AsyncPostgresDatabase.Player]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch("SELECT id FROM players WHERE guild_id = $1", self.id)
+                return [AsyncPostgresDatabase.Player(self.parent, row[0], self) for row in results]
+
+        async def get_player(
+            self,
+            player_id: int,
+            con: Optional[AsyncPostgresDatabase.TransactionManager] = None,
+        ) -> AsyncPostgresDatabase.Player:
+            async with self.parent.transaction(parent=con) as sub_con:
+                result = await sub_con.fetchval(
+                    "SELECT id FROM players WHERE guild_id = $1 AND id = $2", self.id, player_id
+                )
+                if result is None:
+                    raise PlayerNotFound("No players with this player_id")
+                return AsyncPostgresDatabase.Player(self.parent, result, self)
+
+        async def get_creatures(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    "SELECT id, base_creature_id, owner_id FROM creatures WHERE guild_id = $1",
+                    self.id,
+                )
+                guild = self.sync()
+                return [
+                    PostgresDatabase.Creature(
+                        self.parent.db,
+                        row[0],
+                        creatures[row[1]],
+                        guild,
+                        PostgresDatabase.Player(self.parent.db, row[2], guild),
+                    )
+                    for row in results
+                ]
+
+        async def get_creature(
+            self,
+            creature_id: int,
+            con: Optional[AsyncPostgresDatabase.TransactionManager] = None,
+        ) -> Database.Creature:
+            async with self.parent.transaction(parent=con) as sub_con:
+                result = await sub_con.fetchrow(
+                    """
+                    SELECT id, base_creature_id, owner_id FROM creatures
+                    WHERE id = $1 AND guild_id = $2
+                    """,
+                    creature_id,
+                    self.id,
+                )
+                if result is None:
+                    raise CreatureNotFound("No creatures with this id")
+                guild = self.sync()
+                return PostgresDatabase.Creature(
+                    self.parent.db,
+                    result[0],
+                    creatures[result[1]],
+                    guild,
+                    PostgresDatabase.Player(self.parent.db, result[2], guild),
+                )
+
+        async def get_basecreatures(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.BaseCreature]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    """
+                    SELECT DISTINCT base_creature_id FROM creatures WHERE guild_id = $1
+                    UNION
+                    SELECT id FROM base_creatures WHERE guild_id = $1
+                    """,
+                    self.id,
+                )
+                return [creatures[row[0]] for row in results]
+
+        async def get_all_obtainable_basecreatures(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.BaseCreature]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                basecreatures = await self.get_basecreatures(con=sub_con)
+                all_creatures = list(basecreatures)
+
+                for c in basecreatures:
+                    for related in c.related_creatures:
+                        if related not in all_creatures:
+                            all_creatures.append(related)
+
+                for r in await self.get_regions(con=sub_con):
+                    for related in r.region.related_creatures:
+                        if related not in all_creatures:
+                            all_creatures.append(related)
+
+                return all_creatures
+
+        async def get_creature_pool(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.BaseCreature]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    "SELECT id FROM base_creatures WHERE guild_id = $1", self.id
+                )
+                return [creatures[row[0]] for row in results]
+
+        async def get_free_creatures(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.FreeCreature]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    """
+                    SELECT base_creature_id, channel_id, message_id, roller_id,
+                        timestamp_protected, timestamp_expires
+                    FROM free_creatures
+                    WHERE guild_id = $1
+                    """,
+                    self.id,
+                )
+                guild = self.sync()
+                return [
+                    PostgresDatabase.FreeCreature(
+                        self.parent.db, creatures[row[0]], guild, *row[1:]
+                    )
+                    for row in results
+                ]
+
+    class Region:
+        def __init__(
+            self,
+            parent: AsyncPostgresDatabase,
+            id: int,
+            region: Database.BaseRegion,
+            guild: AsyncPostgresDatabase.Guild,
+        ):
+            self.parent = parent
+            self.id = id
+            self.region = region
+            self.guild = guild
+
+        def __eq__(self, other: Any) -> bool:
+            if isinstance(other, AsyncPostgresDatabase.Region):
+                return self.id == other.id and self.guild == other.guild
+            return False
+
+        def __repr__(self) -> str:
+            return f"<AsyncDatabaseRegion: {self.region} in {self.guild}>"
+
+        def text(self) -> str:
+            return self.sync().text()
+
+        def sync(self) -> Database.Region:
+            return PostgresDatabase.Region(self.parent.db, self.id, self.region, self.guild.sync())
+
+        async def occupied(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> Tuple[Optional[Database.Creature], Optional[int]]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                result = await sub_con.fetchrow(
+                    """
+                    SELECT c.id, c.base_creature_id, c.owner_id, o.timestamp_occupied
+                    FROM occupies o
+                    JOIN creatures c ON c.id = o.creature_id AND c.guild_id = o.guild_id
+                    WHERE o.guild_id = $1 AND o.region_id = $2
+                    """,
+                    self.guild.id,
+                    self.id,
+                )
+                if result is None:
+                    return (None, None)
+
+                guild = self.guild.sync()
+                creature = PostgresDatabase.Creature(
+                    self.parent.db,
+                    result[0],
+                    creatures[result[1]],
+                    guild,
+                    PostgresDatabase.Player(self.parent.db, result[2], guild),
+                )
+                return (creature, result[3])
+
+        async def is_occupied(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> bool:
+            async with self.parent.transaction(parent=con) as sub_con:
+                result = await sub_con.fetchval(
+                    "SELECT EXISTS (SELECT 1 FROM occupies WHERE guild_id = $1 AND region_id = $2)",
+                    self.guild.id,
+                    self.id,
+                )
+                return cast(bool, result)
+
+    class Player:
+        def __init__(
+            self, parent: AsyncPostgresDatabase, user_id: int, guild: AsyncPostgresDatabase.Guild
+        ):
+            self.parent = parent
+            self.id = user_id
+            self.guild = guild
+
+        def __eq__(self, other: Any) -> bool:
+            if isinstance(other, AsyncPostgresDatabase.Player):
+                return self.id == other.id and self.guild == other.guild
+            return False
+
+        def __repr__(self) -> str:
+            return f"<AsyncDatabasePlayer: {self.id} in {self.guild}>"
+
+        def sync(self) -> Database.Player:
+            return PostgresDatabase.Player(self.parent.db, self.id, self.guild.sync())
+
+        async def get_resources(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> dict[Resource, int]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                if self.parent.db.wide_resources:
+                    row = await sub_con.fetchrow(
+                        f"""
+                        SELECT {", ".join(RESOURCE_COLUMNS.values())} FROM player_resources
+                        WHERE player_id = $1 AND guild_id = $2
+                        """,
+                        self.id,
+                        self.guild.id,
+                    )
+                    # players that were not copied yet are still read from the old layout
+                    if row is not None:
+                        return {resource: row[i] for i, resource in enumerate(RESOURCE_COLUMNS)}
+
+                results = await sub_con.fetch(
+                    """
+                    SELECT resource_type, quantity FROM resources
+                    WHERE player_id = $1 AND guild_id = $2
+                    """,
+                    self.id,
+                    self.guild.id,
+                )
+                return {Resource(row[0]): row[1] for row in results}
+
+        async def has(
+            self,
+            resource: Resource,
+            amount: int,
+            con: Optional[AsyncPostgresDatabase.TransactionManager] = None,
+        ) -> bool:
+            if self.parent.db.wide_resources:
+                resources = await self.get_resources(con=con)
+                return resource in resources and resources[resource] >= amount
+
+            async with self.parent.transaction(parent=con) as sub_con:
+                result = await sub_con.fetchval(
+                    """
+                    SELECT quantity FROM resources
+                    WHERE player_id = $1 AND guild_id = $2 AND resource_type = $3
+                    """,
+                    self.id,
+                    self.guild.id,
+                    resource.value,
+                )
+                return cast(bool, result >= amount) if result is not None else False
+
+        async def get_creatures_in(
+            self, table: str, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Tuple[Database.Creature, Any]]:
+            # table is one of our own table names, never user input
+            extra_column = {
+                "deck": "NULL",
+                "hand": "NULL",
+                "discard": "NULL",
+                "played": "t.timestamp_recharge",
+                "campaign": "t.strength",
+            }[table]
+            # the hand is the only pile with an order, the one the cards were drawn in
+            order = "ORDER BY t.position" if table == "hand" else ""
+
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    f"""
+                    SELECT t.creature_id, c.base_creature_id, {extra_column}
+                    FROM {table} t
+                    JOIN creatures c ON t.creature_id = c.id AND c.guild_id = t.guild_id
+                    WHERE t.player_id = $1 AND t.guild_id = $2
+                    {order}
+                    """,
+                    self.id,
+                    self.guild.id,
+                )
+                guild = self.guild.sync()
+                owner = PostgresDatabase.Player(self.parent.db, self.id, guild)
+                return [
+                    (
+                        PostgresDatabase.Creature(
+                            self.parent.db, row[0], creatures[row[1]], guild, owner
+                        ),
+                        row[2],
+                    )
+                    for row in results
+                ]
+
+        async def get_deck(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            return [c for c, _ in await self.get_creatures_in("deck", con=con)]
+
+        async def get_hand(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            return [c for c, _ in await self.get_creatures_in("hand", con=con)]
+
+        async def get_discard(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            return [c for c, _ in await self.get_creatures_in("discard", con=con)]
+
+        async def get_played(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Tuple[Database.Creature, int]]:
+            return await self.get_creatures_in("played", con=con)
+
+        async def get_campaign(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> List[Tuple[Database.Creature, int]]:
+            return await self.get_creatures_in("campaign", con=con)
+
+        async def get_events(
+            self,
+            timestamp_start: float,
+            timestamp_end: float,
+            event_type: Optional[Type[Event]] = None,
+            also_resolved: Optional[bool] = True,
+            con: Optional[AsyncPostgresDatabase.TransactionManager] = None,
+        ) -> List[Event]:
+            async with self.parent.transaction(parent=con) as sub_con:
+                resolved_string = "" if also_resolved else "AND NOT resolved"
+                start, end = timestamp_bounds(timestamp_start, timestamp_end)
+                type_string = "" if event_type is None else "AND event_type = $5"
+                args: List[Any] = [self.guild.id, start, end, self.id]
+                if event_type is not None:
+                    args.append(event_type.event_type)
+
+                results = await sub_con.fetch(
+                    f"""
+                    SELECT id, timestamp, parent_event_id, event_type, extra_data FROM events
+                    WHERE guild_id = $1
+                    AND timestamp BETWEEN $2::bigint AND $3::bigint
+                    AND player_id = $4
+                    {type_string}
+                    {resolved_string}
+                    ORDER BY timestamp
+                    """,
+                    *args,
+                )
+                return self.parent.db.decode_rows(self.guild.sync(), results)
+
+        async def get_recharges(
+            self, con: Optional[AsyncPostgresDatabase.TransactionManager] = None
+        ) -> dict[str, Event]:
+            recharge_event_types = [
+                Database.Player.PlayerOrderRechargeEvent.event_type,
+                Database.Player.PlayerMagicRechargeEvent.event_type,
+                Database.Player.PlayerCardRechargeEvent.event_type,
+            ]
+
+            async with self.parent.transaction(parent=con) as sub_con:
+                results = await sub_con.fetch(
+                    """
+                    SELECT DISTINCT ON (event_type)
+                        id, timestamp, parent_event_id, event_type, extra_data
+                    FROM events
+                    WHERE guild_id = $1 AND player_id = $2
+                    AND event_type = ANY($3::text[])
+                    AND NOT resolved
+                    ORDER BY event_type, timestamp
+                    """,
+                    self.guild.id,
+                    self.id,
+                    recharge_event_types,
+                )
+                events = self.parent.db.decode_rows(self.guild.sync(), results)
+                return {e.event_type: e for e in events}
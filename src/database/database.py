@@ -16,8 +16,11 @@ from typing import (
     Generic,
     TypeVar,
     Callable,
+    NamedTuple,
+    Mapping,
     TYPE_CHECKING,
 )
+from types import MappingProxyType
 from collections import defaultdict
 
 from src.core.base_types import (
@@ -37,6 +40,8 @@ from src.core.exceptions import (
     ExpiredFreeCreature,
     ProtectedFreeCreature,
     CreatureNotFound,
+    RegionNotFound,
+    EmptyDeckException,
 )
 
 if TYPE_CHECKING:
@@ -49,9 +54,14 @@ from sqlalchemy import RootTransaction, Connection
 class Database:
     def __init__(self, start_condition: StartCondition):
         self.start_condition = start_condition
+        # where game time comes from, a simulation swaps in its own clock
+        self.clock: Callable[[], float] = time.time
+
+    def now(self) -> float:
+        return self.clock()
 
     def timestamp_after(self, seconds: float) -> float:
-        return float(time.time() + seconds)
+        return float(self.now() + seconds)
 
     class TransactionManager:
         def __init__(
@@ -61,8 +71,13 @@ class Database:
         ):
             self.parent: Database = parent
             self.parent_manager = parent_manager
-            self.children: list[Database.TransactionManager] = []
+            self.root: Database.TransactionManager = (
+                self if parent_manager is None else parent_manager.root
+            )
             self.events: list[Event] = []
+            # events of the whole transaction in the order they were added, only kept on the root
+            self.event_log: list[Event] = []
+            self.end_hooks: list[Callable[[], None]] = []
 
             self.con: Connection = cast(Connection, None)
             self.trans: RootTransaction = cast(RootTransaction, None)
@@ -77,7 +92,6 @@ class Database:
                 assert self.parent_manager.trans is not None
                 self.con = self.parent_manager.con
                 self.trans = self.parent_manager.trans
-                self.parent_manager.children.append(self)
 
             return self
 
@@ -88,15 +102,18 @@ class Database:
             traceback: Any,
         ) -> None:
             if self.parent_manager is None:
-                if exc_value is not None:
-                    self.rollback_transaction()
-                    raise exc_value
-
-                for e in self.get_events():
-                    self.parent.add_event(e, con=self)
-
-                self.commit_transaction()
-                self.end_connection()
+                try:
+                    if exc_value is not None:
+                        self.rollback_transaction()
+                        raise exc_value
+
+                    self.parent.add_events(self.get_events(), con=self)
+
+                    self.commit_transaction()
+                    self.end_connection()
+                finally:
+                    for hook in self.end_hooks:
+                        hook()
             else:
                 if exc_value is not None:
                     raise exc_value
@@ -126,14 +143,20 @@ class Database:
                     event.parent_event_id = parent.events[-1].id
 
             self.events.append(event)
+            self.root.event_log.append(event)
 
         def get_events(self) -> List[Event]:
-            return self.events + sum([c.get_events() for c in self.children], [])
+            return self.root.event_log
+
+        def event_count(self) -> int:
+            return len(self.root.event_log)
 
         def get_root(self) -> Database.TransactionManager:
-            if self.parent_manager is None:
-                return self
-            return self.parent_manager.get_root()
+            return self.root
+
+        def on_end(self, hook: Callable[[], None]) -> None:
+            """Runs hook once the root transaction has committed or rolled back."""
+            self.root.end_hooks.append(hook)
 
     def transaction(
         self, parent: Optional[Database.TransactionManager] = None
@@ -154,6 +177,14 @@ class Database:
     ) -> None:
         assert False
 
+    def add_events(
+        self,
+        events: List[Event],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> None:
+        for event in events:
+            self.add_event(event, con=con)
+
     def add_guild(
         self,
         guild_id: int,
@@ -178,6 +209,76 @@ class Database:
     ) -> Database.Guild:
         assert False
 
+    def get_next_event_timestamps(
+        self,
+        guild_ids: Optional[List[int]] = None,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> dict[int, float]:
+        assert False
+
+    def get_event_timestamps(
+        self,
+        event_keys: List[Tuple[int, int]],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> List[Tuple[int, float]]:
+        assert False
+
+    def get_event_players(
+        self,
+        event_keys: List[Tuple[int, int]],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> List[Tuple[int, int]]:
+        assert False
+
+    class GuildConfig(NamedTuple):
+        channel_id: int
+        max_orders: int
+        order_recharge: int
+        max_magic: int
+        magic_recharge: int
+        max_cards: int
+        card_recharge: int
+        region_recharge: int
+        creature_recharge: int
+        free_protection: int
+        free_expire: int
+        conflict_duration: int
+
+        @staticmethod
+        def from_dict(
+            config: dict[Any, Any], defaults: Mapping[Any, Any] = {}
+        ) -> Database.GuildConfig:
+            """Fields an older stored config does not have yet are taken from defaults."""
+            return Database.GuildConfig(
+                **{
+                    field: config[field] if field in config else defaults[field]
+                    for field in Database.GuildConfig._fields
+                }
+            )
+
+    class RegionState(NamedTuple):
+        region: Database.Region
+        # the creature questing there and when it got there, both None if the region is free
+        occupant: Optional[Database.Creature]
+        timestamp: Optional[int]
+
+    class PlayerSnapshot(NamedTuple):
+        config: Database.GuildConfig
+        resources: Mapping[Resource, int]
+        hand: Tuple[Database.Creature, ...]
+        deck: Tuple[Database.Creature, ...]
+        discard: Tuple[Database.Creature, ...]
+        played: Tuple[Tuple[Database.Creature, int], ...]
+        campaign: Tuple[Tuple[Database.Creature, int], ...]
+        # event type of each recharge -> when it happens next
+        recharges: Mapping[str, float]
+
+    class Leaderboard(NamedTuple):
+        # when the current conflict ends, None if no end is scheduled
+        end_timestamp: Optional[float]
+        # (player_id, campaign strength) of every player, strongest first
+        scores: List[Tuple[int, int]]
+
     class StartCondition:
         def __init__(
             self,
@@ -245,6 +346,13 @@ class Database:
         def get_config(self, con: Optional[Database.TransactionManager] = None) -> dict[Any, Any]:
             assert False
 
+        def get_typed_config(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.GuildConfig:
+            return Database.GuildConfig.from_dict(
+                self.get_config(con=con), self.parent.start_condition.start_config
+            )
+
         def fresh_region_id(self, con: Optional[Database.TransactionManager] = None) -> int:
             assert False
 
@@ -260,6 +368,15 @@ class Database:
         ) -> List[Database.Region]:
             assert False
 
+        def get_region_states(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.RegionState]:
+            with self.parent.transaction(parent=con) as sub_con:
+                return [
+                    Database.RegionState(region, *region.occupied(con=sub_con))
+                    for region in sorted(self.get_regions(con=sub_con), key=lambda x: x.id)
+                ]
+
         def get_region(
             self,
             region_id: int,
@@ -267,6 +384,19 @@ class Database:
         ) -> Database.Region:
             assert False
 
+        def get_regions_by_ids(
+            self, region_ids: List[int], con: Optional[Database.TransactionManager] = None
+        ) -> dict[int, Database.Region]:
+            """The regions with the given ids, ids without a region are left out."""
+            with self.parent.transaction(parent=con) as sub_con:
+                found: dict[int, Database.Region] = {}
+                for region_id in region_ids:
+                    try:
+                        found[region_id] = self.get_region(region_id, con=sub_con)
+                    except RegionNotFound:
+                        pass
+                return found
+
         def remove_region(
             self,
             region: Database.Region,
@@ -281,6 +411,15 @@ class Database:
         ) -> Database.Player:
             assert False
 
+        def add_players(
+            self,
+            player_ids: List[int],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> List[Database.Player]:
+            """Adds several players at once, the same as calling add_player for each of them."""
+            with self.parent.transaction(parent=con) as sub_con:
+                return [self.add_player(player_id, con=sub_con) for player_id in player_ids]
+
         def get_players(
             self, con: Optional[Database.TransactionManager] = None
         ) -> List[Database.Player]:
@@ -300,6 +439,43 @@ class Database:
         ) -> Database.Player:
             assert False
 
+        def get_leaderboard(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.Leaderboard:
+            with self.parent.transaction(parent=con) as sub_con:
+                end_events = self.get_events(
+                    self.parent.now(),
+                    self.parent.now() * 2,
+                    Database.Guild.ConflictEndEvent,
+                    also_resolved=False,
+                    con=sub_con,
+                )
+                end_timestamp = end_events[0].timestamp if end_events != [] else None
+
+                scores = [
+                    (player_db.id, sum(s for _, s in player_db.get_campaign(con=sub_con)))
+                    for player_db in sorted(self.get_players(con=sub_con), key=lambda x: x.id)
+                ]
+                scores.sort(key=lambda x: x[1], reverse=True)
+                return Database.Leaderboard(end_timestamp, scores)
+
+        def end_campaigns(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> dict[int, int]:
+            """Moves every campaigning creature to the discard, returns the campaign strength of
+            every player."""
+            with self.parent.transaction(parent=con) as sub_con:
+                player_scores: dict[int, int] = {}
+                for player_db in self.get_players(con=sub_con):
+                    player_strength = 0
+
+                    for c, s in player_db.get_campaign(con=sub_con):
+                        player_db.uncampaign_creature(c, con=sub_con)
+                        player_strength += s
+
+                    player_scores[player_db.id] = player_strength
+                return player_scores
+
         def fresh_creature_id(self, con: Optional[Database.TransactionManager] = None) -> int:
             assert False
 
@@ -346,6 +522,19 @@ class Database:
         ) -> Database.Creature:
             assert False
 
+        def get_creatures_by_ids(
+            self, creature_ids: List[int], con: Optional[Database.TransactionManager] = None
+        ) -> dict[int, Database.Creature]:
+            """The creatures with the given ids, ids without a creature are left out."""
+            with self.parent.transaction(parent=con) as sub_con:
+                found: dict[int, Database.Creature] = {}
+                for creature_id in creature_ids:
+                    try:
+                        found[creature_id] = self.get_creature(creature_id, con=sub_con)
+                    except CreatureNotFound:
+                        pass
+                return found
+
         def remove_creature(
             self,
             creature: Database.Creature,
@@ -415,6 +604,23 @@ class Database:
         ) -> Database.FreeCreature:
             assert False
 
+        def get_free_creatures_by_keys(
+            self,
+            keys: List[Tuple[int, int]],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> dict[Tuple[int, int], Database.FreeCreature]:
+            """The free creatures with the given (channel_id, message_id), missing keys are left out."""
+            with self.parent.transaction(parent=con) as sub_con:
+                found: dict[Tuple[int, int], Database.FreeCreature] = {}
+                for channel_id, message_id in keys:
+                    try:
+                        found[(channel_id, message_id)] = self.get_free_creature(
+                            channel_id, message_id, con=sub_con
+                        )
+                    except CreatureNotFound:
+                        pass
+                return found
+
         def remove_free_creature(
             self,
             creature: Database.FreeCreature,
@@ -629,7 +835,7 @@ class Database:
 
                 with self.parent.transaction(parent=con) as sub_con:
                     until = self.parent.timestamp_after(
-                        self.guild.get_config(con=sub_con)["conflict_duration"]
+                        self.guild.get_typed_config(con=sub_con).conflict_duration
                     )
 
                     event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
@@ -678,26 +884,16 @@ class Database:
                 self.guild = cast(Database.Guild, self.guild)
 
                 with self.parent.transaction(parent=con) as sub_con:
-                    player_scores: dict[int, int] = {}
-                    players = self.guild.get_players(con=sub_con)
-
-                    if len(players) > 0:
-                        for player_db in self.guild.get_players(con=sub_con):
-                            player_strength = 0
-
-                            for c, s in player_db.get_campaign(con=sub_con):
-                                player_db.uncampaign_creature(c, con=sub_con)
-                                player_strength += s
-
-                            player_scores[player_db.id] = player_strength
+                    player_scores = self.guild.end_campaigns(con=sub_con)
 
+                    if len(player_scores) > 0:
                         event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
 
                         sub_con.add_event(
                             Database.Guild.ConflictResultEvent(
                                 self.parent,
                                 event_id,
-                                time.time(),
+                                self.parent.now(),
                                 None,
                                 self.guild,
                                 list(
@@ -715,7 +911,7 @@ class Database:
 
                     sub_con.add_event(
                         Database.Guild.ConflictStartEvent(
-                            self.parent, event_id, time.time(), None, self.guild
+                            self.parent, event_id, self.parent.now(), None, self.guild
                         ),
                     )
 
@@ -885,7 +1081,7 @@ class Database:
                 con: Optional[Database.TransactionManager] = None,
             ) -> None:
                 self.guild = cast(Database.Guild, self.guild)
-                self.guild.get_region(self.region_id).unoccupy(int(time.time()), con=con)
+                self.guild.get_region(self.region_id).unoccupy(int(self.parent.now()), con=con)
 
     class Player:
         def __init__(self, parent: Database, id: int, guild: Database.Guild):
@@ -917,6 +1113,28 @@ class Database:
         ) -> None:
             assert False
 
+        def change_resources(
+            self,
+            deltas: dict[Resource, int],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> dict[Resource, int]:
+            """Adds deltas to the resources and returns the new quantities of the changed ones.
+
+            Raises NotEnoughResourcesException and changes nothing if any would go below zero.
+            """
+            with self.parent.transaction(parent=con) as sub_con:
+                resources: dict[Resource, int] = self.get_resources(con=sub_con)
+
+                for r, a in deltas.items():
+                    if resources[r] + a < 0:
+                        raise NotEnoughResourcesException(
+                            "Player is paying {} {} but only has {}".format(-a, r, resources[r])
+                        )
+
+                changed = {r: resources[r] + a for r, a in deltas.items()}
+                self.set_resources(changed, con=sub_con)
+                return changed
+
         def get_deck(
             self, con: Optional[Database.TransactionManager] = None
         ) -> List[Database.Creature]:
@@ -964,6 +1182,23 @@ class Database:
         ) -> list[Event]:
             assert False
 
+        def snapshot(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.PlayerSnapshot:
+            """Everything about the player that player_embed shows, read in one transaction."""
+            with self.parent.transaction(parent=con) as sub_con:
+                recharges = self.get_recharges(con=sub_con)
+                return Database.PlayerSnapshot(
+                    config=self.guild.get_typed_config(con=sub_con),
+                    resources=MappingProxyType(self.get_resources(con=sub_con)),
+                    hand=tuple(self.get_hand(con=sub_con)),
+                    deck=tuple(self.get_deck(con=sub_con)),
+                    discard=tuple(self.get_discard(con=sub_con)),
+                    played=tuple(self.get_played(con=sub_con)),
+                    campaign=tuple(self.get_campaign(con=sub_con)),
+                    recharges=MappingProxyType({t: e.timestamp for t, e in recharges.items()}),
+                )
+
         def test_recharges(
             self, con: Optional[Database.TransactionManager] = None
         ) -> dict[str, List[Event]]:
@@ -977,7 +1212,7 @@ class Database:
 
             for c in recharge_event_classes:
                 events = self.get_events(
-                    0, time.time() * 2, event_type=c, also_resolved=False, con=con
+                    0, self.parent.now() * 2, event_type=c, also_resolved=False, con=con
                 )
                 r[c.event_type] = events
 
@@ -996,7 +1231,7 @@ class Database:
 
             for c in recharge_event_classes:
                 events = self.get_events(
-                    0, time.time() * 2, event_type=c, also_resolved=False, con=con
+                    0, self.parent.now() * 2, event_type=c, also_resolved=False, con=con
                 )
 
                 recharge_event = sorted(events, key=lambda x: x.timestamp)[0]
@@ -1043,9 +1278,7 @@ class Database:
             if len(merged_prices) == 0:
                 return True
 
-            with self.parent.transaction(parent=con) as sub_con:
-                resources: dict[Resource, int] = self.get_resources(con=sub_con)
-                hand_size: int = len(self.get_hand(con=sub_con))
+            resources: dict[Resource, int] = self.get_resources(con=con)
 
             for r, a in merged_prices.items():
                 if r in BaseResources:
@@ -1069,7 +1302,7 @@ class Database:
                     Database.Player.PlayerGainEvent(
                         self.parent,
                         event_id,
-                        time.time(),
+                        self.parent.now(),
                         None,
                         self.guild,
                         self.id,
@@ -1077,14 +1310,9 @@ class Database:
                     ),
                 )
 
-                resources: dict[Resource, int] = self.get_resources(con=sub_con)
-                hand_size: int = len(self.get_hand(con=sub_con))
-
-                for r, a in merged_gains.items():
-                    if r in BaseResources:
-                        resources[r] += a
-
-                self.set_resources(resources, con=sub_con)
+                self.change_resources(
+                    {r: a for r, a in merged_gains.items() if r in BaseResources}, con=sub_con
+                )
 
         def pay_price(
             self, price: list[Price], con: Optional[Database.TransactionManager] = None
@@ -1104,7 +1332,7 @@ class Database:
                     Database.Player.PlayerPayEvent(
                         self.parent,
                         event_id,
-                        time.time(),
+                        self.parent.now(),
                         None,
                         self.guild,
                         self.id,
@@ -1112,17 +1340,9 @@ class Database:
                     ),
                 )
 
-                resources: dict[Resource, int] = self.get_resources(con=sub_con)
-                hand_size = len(self.get_hand(con=sub_con))
-
-                for r, a in merged_price.items():
-                    if r in BaseResources:
-                        if resources[r] < a:
-                            raise NotEnoughResourcesException(
-                                "Player is paying {} {} but only has {}".format(a, r, resources[r])
-                            )
-                        resources[r] -= a
-                self.set_resources(resources, con=sub_con)
+                self.change_resources(
+                    {r: -a for r, a in merged_price.items() if r in BaseResources}, con=sub_con
+                )
 
         def draw_card_raw(
             self, con: Optional[Database.TransactionManager] = None
@@ -1132,34 +1352,39 @@ class Database:
         def reshuffle_discard(self, con: Optional[Database.TransactionManager] = None) -> None:
             pass
 
+        def draw_cards_bulk(
+            self, N: int, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            """Moves up to N random cards from the deck to the hand, fewer if the deck runs out."""
+            with self.parent.transaction(parent=con) as sub_con:
+                drawn: List[Database.Creature] = []
+                for _ in range(N):
+                    try:
+                        drawn.append(self.draw_card_raw(con=sub_con))
+                    except EmptyDeckException:
+                        break
+                return drawn
+
         def draw_cards(
             self,
             N: int = 1,
             con: Optional[Database.TransactionManager] = None,
         ) -> tuple[List[Database.Creature], bool, bool]:
             with self.parent.transaction(parent=con) as sub_con:
-                max_cards = self.guild.get_config(con=sub_con)["max_cards"]
-                current_cards = len(self.get_hand(con=sub_con))
-
-                cards_drawn: List[Database.Creature] = []
-                discard_reshuffled = False
-                hand_full = False
-                for _ in range(N):
-                    assert current_cards + len(cards_drawn) <= max_cards
-
-                    if current_cards + len(cards_drawn) == max_cards:
-                        hand_full = True
-                        break
+                max_cards = self.guild.get_typed_config(con=sub_con).max_cards
+                space = max_cards - len(self.get_hand(con=sub_con))
+                assert space >= 0
 
-                    if len(self.get_deck(con=sub_con)) == 0:
-                        self.reshuffle_discard(con=sub_con)
-                        discard_reshuffled = True
+                to_draw = min(N, space)
+                cards_drawn = self.draw_cards_bulk(to_draw, con=sub_con)
 
-                        if len(self.get_deck(con=sub_con)) == 0:
-                            break
+                discard_reshuffled = False
+                if len(cards_drawn) < to_draw:
+                    self.reshuffle_discard(con=sub_con)
+                    discard_reshuffled = True
+                    cards_drawn += self.draw_cards_bulk(to_draw - len(cards_drawn), con=sub_con)
 
-                    card = self.draw_card_raw(con=sub_con)
-                    cards_drawn.append(card)
+                hand_full = N > space and len(cards_drawn) == space
 
                 if len(cards_drawn) > 0:
                     event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
@@ -1167,7 +1392,7 @@ class Database:
                         Database.Player.PlayerDrawEvent(
                             self.parent,
                             event_id,
-                            time.time(),
+                            self.parent.now(),
                             None,
                             self.guild,
                             self.id,
@@ -1186,7 +1411,13 @@ class Database:
                 event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
                 sub_con.add_event(
                     Database.Player.PlayerCreateCreatureEvent(
-                        self.parent, event_id, time.time(), None, self.guild, self.id, creature.id
+                        self.parent,
+                        event_id,
+                        self.parent.now(),
+                        None,
+                        self.guild,
+                        self.id,
+                        creature.id,
                     )
                 )
 
@@ -1207,7 +1438,13 @@ class Database:
                 event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
                 sub_con.add_event(
                     Database.Player.PlayerDrawCreatureEvent(
-                        self.parent, event_id, time.time(), None, self.guild, self.id, creature.id
+                        self.parent,
+                        event_id,
+                        self.parent.now(),
+                        None,
+                        self.guild,
+                        self.id,
+                        creature.id,
                     )
                 )
 
@@ -1240,7 +1477,13 @@ class Database:
                 event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
                 sub_con.add_event(
                     Database.Player.PlayerDeleteCreatureEvent(
-                        self.parent, event_id, time.time(), None, self.guild, self.id, creature.id
+                        self.parent,
+                        event_id,
+                        self.parent.now(),
+                        None,
+                        self.guild,
+                        self.id,
+                        creature.id,
                     )
                 )
 
@@ -1265,7 +1508,13 @@ class Database:
                 event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
                 sub_con.add_event(
                     Database.Player.PlayerDeleteCreatureEvent(
-                        self.parent, event_id, time.time(), None, self.guild, self.id, creature.id
+                        self.parent,
+                        event_id,
+                        self.parent.now(),
+                        None,
+                        self.guild,
+                        self.id,
+                        creature.id,
                     )
                 )
 
@@ -1295,7 +1544,13 @@ class Database:
                 event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
                 sub_con.add_event(
                     Database.Player.PlayerDiscardCreatureEvent(
-                        self.parent, event_id, time.time(), None, self.guild, self.id, creature.id
+                        self.parent,
+                        event_id,
+                        self.parent.now(),
+                        None,
+                        self.guild,
+                        self.id,
+                        creature.id,
                     )
                 )
 
@@ -1389,7 +1644,7 @@ class Database:
             base_creature: Database.BaseCreature = creature.creature
 
             with self.parent.transaction(parent=con) as sub_con:
-                until = self.parent.timestamp_after(self.guild.get_config()["creature_recharge"])
+                until = self.parent.timestamp_after(self.guild.get_typed_config().creature_recharge)
 
                 sub_con.add_event(
                     Database.Creature.CreatureRechargeEvent(
@@ -1407,7 +1662,7 @@ class Database:
                     Database.Player.PlayerPlayToRegionEvent(
                         self.parent,
                         event_id,
-                        time.time(),
+                        self.parent.now(),
                         None,
                         self.guild,
                         self.id,
@@ -1442,7 +1697,7 @@ class Database:
                 event = Database.Player.PlayerPlayToCampaignEvent(
                     self.parent,
                     event_id,
-                    time.time(),
+                    self.parent.now(),
                     None,
                     self.guild,
                     self.id,
@@ -1913,15 +2168,15 @@ class Database:
             ) -> None:
                 with self.parent.transaction(parent=con) as sub_con:
                     player: Database.Player = self.guild.get_player(self.player_id, con=sub_con)
-                    guild_config = self.guild.get_config(con=sub_con)
+                    guild_config = self.guild.get_typed_config(con=sub_con)
                     player_orders = player.get_resources(con=sub_con)[Resource.ORDERS]
 
-                    if player_orders + 1 <= guild_config["max_orders"]:
+                    if player_orders + 1 <= guild_config.max_orders:
                         sub_con.add_event(
                             Database.Player.PlayerOrderRechargedEvent(
                                 self.parent,
                                 self.parent.fresh_event_id(self.guild, con=sub_con),
-                                time.time(),
+                                self.parent.now(),
                                 None,
                                 self.guild,
                                 self.player_id,
@@ -1943,7 +2198,7 @@ class Database:
                             Database.Player.PlayerOrderRechargeEvent(
                                 self.parent,
                                 event_id,
-                                time.time() + guild_config["order_recharge"],
+                                self.parent.now() + guild_config.order_recharge,
                                 None,
                                 self.guild,
                                 self.player_id,
@@ -2012,15 +2267,15 @@ class Database:
             ) -> None:
                 with self.parent.transaction(parent=con) as sub_con:
                     player: Database.Player = self.guild.get_player(self.player_id, con=sub_con)
-                    guild_config = self.guild.get_config(con=sub_con)
+                    guild_config = self.guild.get_typed_config(con=sub_con)
                     player_magic = player.get_resources(con=sub_con)[Resource.MAGIC]
 
-                    if player_magic + 1 <= guild_config["max_magic"]:
+                    if player_magic + 1 <= guild_config.max_magic:
                         sub_con.add_event(
                             Database.Player.PlayerMagicRechargedEvent(
                                 self.parent,
                                 self.parent.fresh_event_id(self.guild, con=sub_con),
-                                time.time(),
+                                self.parent.now(),
                                 None,
                                 self.guild,
                                 self.player_id,
@@ -2042,7 +2297,7 @@ class Database:
                             Database.Player.PlayerMagicRechargeEvent(
                                 self.parent,
                                 event_id,
-                                time.time() + guild_config["magic_recharge"],
+                                self.parent.now() + guild_config.magic_recharge,
                                 None,
                                 self.guild,
                                 self.player_id,
@@ -2111,14 +2366,14 @@ class Database:
             ) -> None:
                 with self.parent.transaction(parent=con) as sub_con:
                     player: Database.Player = self.guild.get_player(self.player_id, con=sub_con)
-                    guild_config = self.guild.get_config(con=sub_con)
+                    guild_config = self.guild.get_typed_config(con=sub_con)
 
-                    if len(player.get_hand(con=sub_con)) < guild_config["max_cards"]:
+                    if len(player.get_hand(con=sub_con)) < guild_config.max_cards:
                         sub_con.add_event(
                             Database.Player.PlayerCardRechargedEvent(
                                 self.parent,
                                 self.parent.fresh_event_id(self.guild, con=sub_con),
-                                time.time(),
+                                self.parent.now(),
                                 None,
                                 self.guild,
                                 self.player_id,
@@ -2140,7 +2395,7 @@ class Database:
                             Database.Player.PlayerCardRechargeEvent(
                                 self.parent,
                                 event_id,
-                                time.time() + guild_config["card_recharge"],
+                                self.parent.now() + guild_config.card_recharge,
                                 None,
                                 self.guild,
                                 self.player_id,
@@ -2435,7 +2690,7 @@ class Database:
                     Database.FreeCreature.FreeCreatureClaimedEvent(
                         self.parent,
                         event_id,
-                        time.time(),
+                        self.parent.now(),
                         None,
                         self.guild,
                         self.channel_id,
@@ -2634,35 +2889,3 @@ class Database:
 
             def text(self) -> str:
                 return f"<free_creature:({self.channel_id},{self.message_id})> has been claimed by <player:{self.player_id}>"
-
-
-event_classes: list[type[Event]] = [
-    Database.Guild.GuildCreatedEvent,
-    Database.Guild.RegionAddedEvent,
-    Database.Guild.RegionRemovedEvent,
-    Database.Guild.PlayerAddedEvent,
-    Database.Guild.PlayerRemovedEvent,
-    Database.Guild.ConflictStartEvent,
-    Database.Guild.ConflictEndEvent,
-    Database.Guild.ConflictResultEvent,
-    Database.Region.RegionRechargeEvent,
-    Database.Creature.CreatureRechargeEvent,
-    Database.FreeCreature.FreeCreatureProtectedEvent,
-    Database.FreeCreature.FreeCreatureExpiresEvent,
-    Database.Player.PlayerDrawEvent,
-    Database.Player.PlayerGainEvent,
-    Database.Player.PlayerPayEvent,
-    Database.Player.PlayerPlayToRegionEvent,
-    Database.Player.PlayerPlayToCampaignEvent,
-    Database.FreeCreature.FreeCreatureClaimedEvent,
-    Database.Player.PlayerOrderRechargeEvent,
-    Database.Player.PlayerOrderRechargedEvent,
-    Database.Player.PlayerMagicRechargeEvent,
-    Database.Player.PlayerMagicRechargedEvent,
-    Database.Player.PlayerCardRechargeEvent,
-    Database.Player.PlayerCardRechargedEvent,
-    Database.Player.PlayerDiscardCreatureEvent,
-    Database.Player.PlayerDeleteCreatureEvent,
-    Database.Player.PlayerCreateCreatureEvent,
-    Database.Player.PlayerDrawCreatureEvent,
-]
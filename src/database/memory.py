@@ -0,0 +1,1119 @@
+import json
+import random
+from typing import List, Tuple, Type, Optional, Any, Generic, TypeVar, NamedTuple, cast
+
+from sqlalchemy import RootTransaction, Connection
+
+from src.core.base_types import (
+    event_registry,
+    Resource,
+    BaseResources,
+    Event,
+)
+
+from src.database.database import Database
+
+from src.core.exceptions import (
+    GuildNotFound,
+    PlayerNotFound,
+    CreatureNotFound,
+    RegionNotFound,
+    EmptyDeckException,
+)
+
+from src.definitions.regions import regions
+from src.definitions.creatures import creatures
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+# marks a row that did not exist before a write
+MISSING = object()
+
+
+def stored_timestamp(timestamp: float) -> int:
+    """Timestamps are BIGINT columns in postgres, they come back rounded."""
+    return round(timestamp)
+
+
+class Journal:
+    """The rows a root transaction overwrote or deleted, as they were before."""
+
+    def __init__(self) -> None:
+        self.entries: List[Tuple[dict[Any, Any], Any, Any]] = []
+
+    def record(self, table: dict[Any, Any], key: Any) -> None:
+        self.entries.append((table, key, table.get(key, MISSING)))
+
+    def undo(self) -> None:
+        for table, key, old in reversed(self.entries):
+            if old is MISSING:
+                table.pop(key, None)
+            else:
+                table[key] = old
+        self.entries = []
+
+
+class Table(dict[K, V], Generic[K, V]):
+    """A dict that records every write in the journal of the transaction doing it.
+
+    Rows are never changed in place, put replaces them, so a rollback only has to put back
+    the old rows.
+    """
+
+    def put(self, con: Database.TransactionManager, key: K, value: V) -> None:
+        cast(Journal, con.trans).record(self, key)
+        self[key] = value
+
+    def remove(self, con: Database.TransactionManager, key: K) -> None:
+        if key in self:
+            cast(Journal, con.trans).record(self, key)
+            del self[key]
+
+
+class EventRow(NamedTuple):
+    timestamp: int
+    parent_event_id: Optional[int]
+    event_type: str
+    extra_data: str
+    resolved: bool
+    region_id: Optional[int]
+    player_id: Optional[int]
+    creature_id: Optional[int]
+
+
+class FreeCreatureRow(NamedTuple):
+    base_creature_id: int
+    roller_id: int
+    timestamp_protected: int
+    timestamp_expires: int
+
+
+class GuildState:
+    """The tables of one guild, rows are keyed by id within the guild."""
+
+    def __init__(self) -> None:
+        self.events: Table[int, EventRow] = Table()
+        # ids of the unresolved events, what the event handler asks for on every tick
+        self.unresolved: Table[int, None] = Table()
+        self.regions: Table[int, int] = Table()
+        # region_id -> (creature_id, timestamp_occupied)
+        self.occupies: Table[int, Tuple[int, int]] = Table()
+        self.players: Table[int, None] = Table()
+        self.pool: Table[int, None] = Table()
+        # creature_id -> (base_creature_id, owner_id)
+        self.creatures: Table[int, Tuple[int, int]] = Table()
+        self.free_creatures: Table[Tuple[int, int], FreeCreatureRow] = Table()
+        # player_id -> everything below
+        self.resources: Table[int, dict[Resource, int]] = Table()
+        self.deck: Table[int, Tuple[int, ...]] = Table()
+        # in order of position
+        self.hand: Table[int, Tuple[int, ...]] = Table()
+        self.discard: Table[int, Tuple[int, ...]] = Table()
+        # (creature_id, timestamp_recharge)
+        self.played: Table[int, Tuple[Tuple[int, int], ...]] = Table()
+        # (creature_id, strength)
+        self.campaign: Table[int, Tuple[Tuple[int, int], ...]] = Table()
+
+
+class InMemoryDatabase(Database):
+    """Keeps every table in dicts of this process, for simulations and tests without postgres.
+
+    A root transaction journals the rows it overwrites and puts them back on a rollback.
+    Transactions are not isolated from each other, only one should write at a time.
+    """
+
+    def __init__(self, start_condition: Database.StartCondition):
+        super().__init__(start_condition)
+        self.guilds: Table[int, GuildState] = Table()
+        self.configs: Table[int, str] = Table()
+        # like the id allocator, ids are never handed out twice even after a rollback
+        self.next_ids: dict[Tuple[int, str], int] = {}
+
+    class TransactionManager(Database.TransactionManager):
+        def start_connection(self) -> Tuple[Connection, RootTransaction]:
+            # there is no connection, the journal stands in for the transaction
+            return cast(Connection, self.parent), cast(RootTransaction, Journal())
+
+        def end_connection(self) -> None:
+            pass
+
+        def commit_transaction(self) -> None:
+            cast(Journal, self.trans).entries = []
+
+        def rollback_transaction(self) -> None:
+            cast(Journal, self.trans).undo()
+
+    def reserve(self, guild_id: int, kind: str, amount: int = 1) -> int:
+        """Returns the first of `amount` consecutive fresh ids."""
+        next_id = self.next_ids.get((guild_id, kind), 1)
+        self.next_ids[(guild_id, kind)] = next_id + amount
+        return next_id
+
+    def state(self, guild_id: int) -> GuildState:
+        state = self.guilds.get(guild_id)
+        if state is None:
+            raise GuildNotFound("No guilds with this guild_id")
+        return state
+
+    def decode(self, guild: Database.Guild, event_id: int, row: EventRow) -> Event:
+        return event_registry[row.event_type].from_extra_data(
+            self, event_id, row.timestamp, row.parent_event_id, guild, json.loads(row.extra_data)
+        )
+
+    def fresh_event_id(
+        self,
+        guild: Database.Guild,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> int:
+        return self.reserve(guild.id, "events")
+
+    def add_event(
+        self,
+        event: Event,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> None:
+        self.add_events([event], con=con)
+
+    def add_events(
+        self,
+        events: List[Event],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> None:
+        if events == []:
+            return
+
+        with self.transaction(parent=con) as sub_con:
+            for event in events:
+                state = self.state(event.guild.id)
+                state.events.put(
+                    sub_con,
+                    event.id,
+                    EventRow(
+                        stored_timestamp(event.timestamp),
+                        event.parent_event_id if event.parent_event_id else None,
+                        event.event_type,
+                        event.extra_data(),
+                        False,
+                        getattr(event, "region_id", None),
+                        getattr(event, "player_id", None),
+                        getattr(event, "creature_id", None),
+                    ),
+                )
+                state.unresolved.put(sub_con, event.id, None)
+
+    def add_guild(
+        self,
+        guild_id: int,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> Database.Guild:
+        guild = InMemoryDatabase.Guild(self, guild_id)
+
+        with self.transaction(parent=con) as sub_con:
+            sub_con.add_event(
+                Database.Guild.GuildCreatedEvent(
+                    self, self.fresh_event_id(guild, con=sub_con), self.now(), None, guild
+                )
+            )
+
+            self.guilds.put(sub_con, guild_id, GuildState())
+            self.configs.put(sub_con, guild_id, json.dumps(self.start_condition.start_config))
+
+            for base_region in self.start_condition.start_active_regions:
+                guild.add_region(base_region, con=sub_con)
+
+            for base_creature in self.start_condition.start_available_creatures:
+                guild.add_to_creature_pool(base_creature, con=sub_con)
+
+            sub_con.add_event(
+                Database.Guild.ConflictStartEvent(
+                    self, self.fresh_event_id(guild, con=sub_con), self.now(), None, guild
+                )
+            )
+
+        return guild
+
+    def get_guilds(self, con: Optional[Database.TransactionManager] = None) -> List[Database.Guild]:
+        return [InMemoryDatabase.Guild(self, guild_id) for guild_id in self.guilds]
+
+    def get_guild(
+        self,
+        guild_id: int,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> Database.Guild:
+        self.state(guild_id)
+        return InMemoryDatabase.Guild(self, guild_id)
+
+    def remove_guild(
+        self,
+        guild: Database.Guild,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> Database.Guild:
+        with self.transaction(parent=con) as sub_con:
+            self.guilds.remove(sub_con, guild.id)
+            self.configs.remove(sub_con, guild.id)
+            return guild
+
+    def get_next_event_timestamps(
+        self,
+        guild_ids: Optional[List[int]] = None,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> dict[int, float]:
+        """Earliest unresolved event timestamp per guild, all guilds if guild_ids is None."""
+        timestamps: dict[int, float] = {}
+        for guild_id in self.guilds if guild_ids is None else guild_ids:
+            state = self.guilds.get(guild_id)
+            if state is not None and len(state.unresolved) > 0:
+                timestamps[guild_id] = min(state.events[i].timestamp for i in state.unresolved)
+        return timestamps
+
+    def get_event_timestamps(
+        self,
+        event_keys: List[Tuple[int, int]],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> List[Tuple[int, float]]:
+        """(guild_id, timestamp) of the unresolved events with these (guild_id, event_id) keys."""
+        return [
+            (guild_id, self.guilds[guild_id].events[event_id].timestamp)
+            for guild_id, event_id in event_keys
+            if guild_id in self.guilds and event_id in self.guilds[guild_id].unresolved
+        ]
+
+    def get_event_players(
+        self,
+        event_keys: List[Tuple[int, int]],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> List[Tuple[int, int]]:
+        """(guild_id, player_id) of every player concerned by the events with these keys."""
+        players: dict[Tuple[int, int], None] = {}
+        for guild_id, event_id in event_keys:
+            state = self.guilds.get(guild_id)
+            row = state.events.get(event_id) if state is not None else None
+            if row is not None and row.player_id is not None:
+                players[(guild_id, row.player_id)] = None
+        return list(players)
+
+    class Guild(Database.Guild):
+        def __init__(self, parent: Database, guild_id: int):
+            super().__init__(parent, guild_id)
+
+        def state(self) -> GuildState:
+            return cast(InMemoryDatabase, self.parent).state(self.id)
+
+        def make_creature(self, creature_id: int) -> Database.Creature:
+            base_creature_id, owner_id = self.state().creatures[creature_id]
+            return InMemoryDatabase.Creature(
+                self.parent,
+                creature_id,
+                creatures[base_creature_id],
+                self,
+                InMemoryDatabase.Player(self.parent, owner_id, self),
+            )
+
+        def get_events(
+            self,
+            timestamp_start: float,
+            timestamp_end: float,
+            event_type: Optional[Type[Event]] = None,
+            also_resolved: Optional[bool] = True,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> list[Event]:
+            state = self.state()
+            rows = [
+                (event_id, state.events[event_id])
+                for event_id in (state.events if also_resolved else state.unresolved)
+            ]
+            rows = [
+                (event_id, row)
+                for event_id, row in rows
+                if timestamp_start <= row.timestamp <= timestamp_end
+                and (event_type is None or row.event_type == event_type.event_type)
+            ]
+            rows.sort(key=lambda x: x[1].timestamp)
+            parent = cast(InMemoryDatabase, self.parent)
+            return [parent.decode(self, event_id, row) for event_id, row in rows]
+
+        def get_event_by_id(
+            self,
+            event_id: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Event:
+            row = self.state().events[event_id]
+            return cast(InMemoryDatabase, self.parent).decode(self, event_id, row)
+
+        def mark_event_as_resolved(
+            self, event: Event, con: Optional[Database.TransactionManager] = None
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                row = state.events.get(event.id)
+                if row is not None:
+                    state.events.put(sub_con, event.id, row._replace(resolved=True))
+                    state.unresolved.remove(sub_con, event.id)
+
+        def remove_event(
+            self,
+            event: Event,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Event:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                # child events go with their parent
+                removed = {event.id}
+                while removed:
+                    for event_id in removed:
+                        state.events.remove(sub_con, event_id)
+                        state.unresolved.remove(sub_con, event_id)
+                    removed = {
+                        event_id
+                        for event_id, row in state.events.items()
+                        if row.parent_event_id in removed
+                    }
+
+                return event
+
+        def set_config(
+            self,
+            config: dict[Any, Any],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.state()
+                cast(InMemoryDatabase, self.parent).configs.put(
+                    sub_con, self.id, json.dumps(config)
+                )
+
+        def get_config(self, con: Optional[Database.TransactionManager] = None) -> dict[Any, Any]:
+            config = cast(InMemoryDatabase, self.parent).configs.get(self.id)
+            if config is None:
+                raise GuildNotFound("No guilds with this guild_id")
+            return cast(dict[Any, Any], json.loads(config))
+
+        def fresh_region_id(self, con: Optional[Database.TransactionManager] = None) -> int:
+            return cast(InMemoryDatabase, self.parent).reserve(self.id, "regions")
+
+        def add_region(
+            self,
+            base_region: Database.BaseRegion,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Region:
+            with self.parent.transaction(parent=con) as sub_con:
+                region_id = self.fresh_region_id(con=sub_con)
+                self.state().regions.put(sub_con, region_id, base_region.id)
+
+                event_id = self.parent.fresh_event_id(self, con=sub_con)
+                sub_con.add_event(
+                    Database.Guild.RegionAddedEvent(
+                        self.parent, event_id, self.parent.now(), None, self, region_id
+                    ),
+                )
+                return InMemoryDatabase.Region(self.parent, region_id, base_region, self)
+
+        def get_regions(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Region]:
+            return [
+                InMemoryDatabase.Region(self.parent, region_id, regions[base_region_id], self)
+                for region_id, base_region_id in self.state().regions.items()
+            ]
+
+        def get_region(
+            self,
+            region_id: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Region:
+            base_region_id = self.state().regions.get(region_id)
+            if base_region_id is None:
+                raise RegionNotFound("No regions with this id")
+            return InMemoryDatabase.Region(self.parent, region_id, regions[base_region_id], self)
+
+        def remove_region(
+            self,
+            region: Database.Region,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Region:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                state.regions.remove(sub_con, region.id)
+                state.occupies.remove(sub_con, region.id)
+
+                event_id = self.parent.fresh_event_id(self, con=sub_con)
+                sub_con.add_event(
+                    Database.Guild.RegionRemovedEvent(
+                        self.parent, event_id, self.parent.now(), None, self, region.id
+                    ),
+                )
+                return region
+
+        def add_player(
+            self,
+            player_id: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Player:
+            return self.add_players([player_id], con=con)[0]
+
+        def add_players(
+            self,
+            player_ids: List[int],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> List[Database.Player]:
+            if len(player_ids) == 0:
+                return []
+
+            parent = cast(InMemoryDatabase, self.parent)
+            players = [
+                InMemoryDatabase.Player(self.parent, player_id, self) for player_id in player_ids
+            ]
+            start_deck = self.parent.start_condition.start_deck
+
+            with self.parent.transaction(parent=con) as sub_con:
+                guild_config = self.get_typed_config(con=sub_con)
+                state = self.state()
+
+                # the whole start deck goes straight into the deck, like the postgres backend
+                creature_id = parent.reserve(self.id, "creatures", len(players) * len(start_deck))
+                for player in players:
+                    state.players.put(sub_con, player.id, None)
+                    state.resources.put(sub_con, player.id, dict.fromkeys(BaseResources, 0))
+
+                    deck = []
+                    for base_creature in start_deck:
+                        state.creatures.put(sub_con, creature_id, (base_creature.id, player.id))
+                        deck.append(creature_id)
+                        creature_id += 1
+
+                    state.deck.put(sub_con, player.id, tuple(deck))
+                    state.hand.put(sub_con, player.id, ())
+                    state.discard.put(sub_con, player.id, ())
+                    state.played.put(sub_con, player.id, ())
+                    state.campaign.put(sub_con, player.id, ())
+
+                event_id = parent.reserve(self.id, "events", 4 * len(players))
+                now = self.parent.now()
+                for player in players:
+                    sub_con.add_event(
+                        Database.Player.PlayerOrderRechargeEvent(
+                            self.parent,
+                            event_id,
+                            now + guild_config.order_recharge,
+                            None,
+                            self,
+                            player.id,
+                        ),
+                    )
+                    sub_con.add_event(
+                        Database.Player.PlayerMagicRechargeEvent(
+                            self.parent,
+                            event_id + 1,
+                            now + guild_config.magic_recharge,
+                            None,
+                            self,
+                            player.id,
+                        ),
+                    )
+                    sub_con.add_event(
+                        Database.Player.PlayerCardRechargeEvent(
+                            self.parent,
+                            event_id + 2,
+                            now + guild_config.card_recharge,
+                            None,
+                            self,
+                            player.id,
+                        ),
+                    )
+                    sub_con.add_event(
+                        Database.Guild.PlayerAddedEvent(
+                            self.parent, event_id + 3, now, None, self, player.id
+                        ),
+                    )
+                    event_id += 4
+
+                for player in players:
+                    self.parent.start_condition.join_action(player, sub_con)
+
+            return list(players)
+
+        def get_players(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Player]:
+            return [
+                InMemoryDatabase.Player(self.parent, player_id, self)
+                for player_id in self.state().players
+            ]
+
+        def get_player(
+            self,
+            player_id: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Player:
+            if player_id not in self.state().players:
+                raise PlayerNotFound("No players with this player_id")
+            return InMemoryDatabase.Player(self.parent, player_id, self)
+
+        def remove_player(
+            self,
+            player: Database.Player,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Player:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                state.players.remove(sub_con, player.id)
+                state.resources.remove(sub_con, player.id)
+                for pile in [state.deck, state.hand, state.discard]:
+                    pile.remove(sub_con, player.id)
+                for timed_pile in [state.played, state.campaign]:
+                    timed_pile.remove(sub_con, player.id)
+
+                owned = {c for c, (_, owner_id) in state.creatures.items() if owner_id == player.id}
+                for creature_id in owned:
+                    state.creatures.remove(sub_con, creature_id)
+                for region_id, (creature_id, _) in list(state.occupies.items()):
+                    if creature_id in owned:
+                        state.occupies.remove(sub_con, region_id)
+                for key, row in list(state.free_creatures.items()):
+                    if row.roller_id == player.id:
+                        state.free_creatures.remove(sub_con, key)
+
+                event_id = self.parent.fresh_event_id(self, con=sub_con)
+                sub_con.add_event(
+                    Database.Guild.PlayerRemovedEvent(
+                        self.parent, event_id, self.parent.now(), None, self, player.id
+                    ),
+                )
+                return player
+
+        def fresh_creature_id(self, con: Optional[Database.TransactionManager] = None) -> int:
+            return cast(InMemoryDatabase, self.parent).reserve(self.id, "creatures")
+
+        def add_creature(
+            self,
+            creature: Database.BaseCreature,
+            owner: Database.Player,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Creature:
+            with self.parent.transaction(parent=con) as sub_con:
+                creature_id = self.fresh_creature_id(con=sub_con)
+                self.state().creatures.put(sub_con, creature_id, (creature.id, owner.id))
+                return InMemoryDatabase.Creature(self.parent, creature_id, creature, self, owner)
+
+        def get_creatures(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            return [self.make_creature(creature_id) for creature_id in self.state().creatures]
+
+        def get_basecreatures(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.BaseCreature]:
+            state = self.state()
+            base_creature_ids = dict.fromkeys(c for c, _ in state.creatures.values())
+            base_creature_ids.update(dict.fromkeys(state.pool))
+            return [creatures[base_creature_id] for base_creature_id in base_creature_ids]
+
+        def get_creature(
+            self,
+            creature_id: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Creature:
+            if creature_id not in self.state().creatures:
+                raise CreatureNotFound("No creatures with this id")
+            return self.make_creature(creature_id)
+
+        def remove_creature(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.Creature:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                row = state.creatures.get(creature.id)
+                if row is None:
+                    return creature
+
+                state.creatures.remove(sub_con, creature.id)
+                owner_id = row[1]
+                for pile in [state.deck, state.hand, state.discard]:
+                    if owner_id in pile:
+                        pile.put(
+                            sub_con, owner_id, tuple(c for c in pile[owner_id] if c != creature.id)
+                        )
+                for timed_pile in [state.played, state.campaign]:
+                    if owner_id in timed_pile:
+                        timed_pile.put(
+                            sub_con,
+                            owner_id,
+                            tuple(e for e in timed_pile[owner_id] if e[0] != creature.id),
+                        )
+                for region_id, (creature_id, _) in list(state.occupies.items()):
+                    if creature_id == creature.id:
+                        state.occupies.remove(sub_con, region_id)
+                return creature
+
+        def add_to_creature_pool(
+            self,
+            base_creature: Database.BaseCreature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.state().pool.put(sub_con, base_creature.id, None)
+
+        def get_creature_pool(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.BaseCreature]:
+            return [creatures[base_creature_id] for base_creature_id in self.state().pool]
+
+        def get_random_from_creature_pool(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.BaseCreature:
+            creature_pool = self.get_creature_pool(con=con)
+            if not creature_pool:
+                raise ValueError("Creature pool is empty")
+            return random.choice(creature_pool)
+
+        def remove_from_creature_pool(
+            self,
+            base_creature: Database.BaseCreature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                state.pool.remove(sub_con, base_creature.id)
+                for key, row in list(state.free_creatures.items()):
+                    if row.base_creature_id == base_creature.id:
+                        state.free_creatures.remove(sub_con, key)
+
+        def add_free_creature(
+            self,
+            base_creature: Database.BaseCreature,
+            channel_id: int,
+            message_id: int,
+            roller: Database.Player,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.FreeCreature:
+            with self.parent.transaction(parent=con) as sub_con:
+                config = self.get_typed_config(con=sub_con)
+                timestamp_protected = stored_timestamp(
+                    self.parent.timestamp_after(config.free_protection)
+                )
+                timestamp_expires = stored_timestamp(
+                    self.parent.timestamp_after(config.free_expire)
+                )
+                self.state().free_creatures.put(
+                    sub_con,
+                    (channel_id, message_id),
+                    FreeCreatureRow(
+                        base_creature.id, roller.id, timestamp_protected, timestamp_expires
+                    ),
+                )
+                return InMemoryDatabase.FreeCreature(
+                    self.parent,
+                    base_creature,
+                    self,
+                    channel_id,
+                    message_id,
+                    roller.id,
+                    timestamp_protected,
+                    timestamp_expires,
+                )
+
+        def get_free_creatures(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.FreeCreature]:
+            return [
+                InMemoryDatabase.FreeCreature(
+                    self.parent,
+                    creatures[row.base_creature_id],
+                    self,
+                    channel_id,
+                    message_id,
+                    row.roller_id,
+                    row.timestamp_protected,
+                    row.timestamp_expires,
+                )
+                for (channel_id, message_id), row in self.state().free_creatures.items()
+            ]
+
+        def get_free_creature(
+            self,
+            channel_id: int,
+            message_id: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.FreeCreature:
+            row = self.state().free_creatures.get((channel_id, message_id))
+            if row is None:
+                raise CreatureNotFound("No creatures with this id")
+            return InMemoryDatabase.FreeCreature(
+                self.parent,
+                creatures[row.base_creature_id],
+                self,
+                channel_id,
+                message_id,
+                row.roller_id,
+                row.timestamp_protected,
+                row.timestamp_expires,
+            )
+
+        def remove_free_creature(
+            self,
+            creature: Database.FreeCreature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> Database.FreeCreature:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.state().free_creatures.remove(
+                    sub_con, (creature.channel_id, creature.message_id)
+                )
+                return creature
+
+    class Region(Database.Region):
+        def __init__(
+            self, parent: Database, id: int, region: Database.BaseRegion, guild: Database.Guild
+        ):
+            super().__init__(parent, id, region, guild)
+
+        def occupy(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = cast(InMemoryDatabase.Guild, self.guild).state()
+                if self.id in state.occupies:
+                    raise Exception("Trying to occupy an occupied region")
+
+                until = self.parent.timestamp_after(
+                    self.guild.get_typed_config(con=sub_con).region_recharge
+                )
+                state.occupies.put(sub_con, self.id, (creature.id, stored_timestamp(until)))
+
+                event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
+
+                sub_con.add_event(
+                    Database.Region.RegionRechargeEvent(
+                        self.parent, event_id, until, None, self.guild, self.id
+                    ),
+                )
+
+        def unoccupy(
+            self,
+            current: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                cast(InMemoryDatabase.Guild, self.guild).state().occupies.remove(sub_con, self.id)
+
+        def occupied(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> tuple[Optional[Database.Creature], Optional[int]]:
+            guild = cast(InMemoryDatabase.Guild, self.guild)
+            row = guild.state().occupies.get(self.id)
+            if row is None:
+                return (None, None)
+            return (guild.make_creature(row[0]), row[1])
+
+    class Player(Database.Player):
+        def __init__(self, parent: Database, user_id: int, guild: Database.Guild):
+            super().__init__(parent, user_id, guild)
+
+        def state(self) -> GuildState:
+            return cast(InMemoryDatabase.Guild, self.guild).state()
+
+        def make_creature(self, creature_id: int) -> Database.Creature:
+            base_creature_id = self.state().creatures[creature_id][0]
+            return InMemoryDatabase.Creature(
+                self.parent, creature_id, creatures[base_creature_id], self.guild, self
+            )
+
+        def get_resources(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> dict[Resource, int]:
+            return dict(self.state().resources.get(self.id, {}))
+
+        def set_resources(
+            self,
+            resources: dict[Resource, int],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                current = state.resources.get(self.id)
+                if current is None:
+                    return
+                # like the UPDATE in postgres, resources the player has no row for stay unset
+                state.resources.put(
+                    sub_con,
+                    self.id,
+                    {r: resources.get(r, a) for r, a in current.items()},
+                )
+
+        def has(
+            self,
+            resource: Resource,
+            amount: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> bool:
+            resources = self.get_resources(con=con)
+            return resource in resources and resources[resource] >= amount
+
+        def give(
+            self,
+            resource: Resource,
+            amount: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                event_id = self.parent.fresh_event_id(self.guild, con=sub_con)
+                sub_con.add_event(
+                    Database.Player.PlayerGainEvent(
+                        self.parent,
+                        event_id,
+                        self.parent.now(),
+                        None,
+                        self.guild,
+                        self.id,
+                        [(resource.value, amount)],
+                    ),
+                )
+
+                resources = self.get_resources(con=sub_con)
+                if resource in resources:
+                    self.set_resources({resource: resources[resource] + amount}, con=sub_con)
+
+        def get_deck(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            return [self.make_creature(c) for c in self.state().deck.get(self.id, ())]
+
+        def get_hand(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            return [self.make_creature(c) for c in self.state().hand.get(self.id, ())]
+
+        def get_discard(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            return [self.make_creature(c) for c in self.state().discard.get(self.id, ())]
+
+        def get_played(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Tuple[Database.Creature, int]]:
+            return [(self.make_creature(c), t) for c, t in self.state().played.get(self.id, ())]
+
+        def get_campaign(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Tuple[Database.Creature, int]]:
+            return [(self.make_creature(c), s) for c, s in self.state().campaign.get(self.id, ())]
+
+        def get_events(
+            self,
+            timestamp_start: float,
+            timestamp_end: float,
+            event_type: Optional[Type[Event]] = None,
+            also_resolved: Optional[bool] = True,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> list[Event]:
+            state = self.state()
+            rows = [
+                (event_id, state.events[event_id])
+                for event_id in (state.events if also_resolved else state.unresolved)
+            ]
+            rows = [
+                (event_id, row)
+                for event_id, row in rows
+                if row.player_id == self.id
+                and timestamp_start <= row.timestamp <= timestamp_end
+                and (event_type is None or row.event_type == event_type.event_type)
+            ]
+            rows.sort(key=lambda x: x[1].timestamp)
+            parent = cast(InMemoryDatabase, self.parent)
+            return [parent.decode(self.guild, event_id, row) for event_id, row in rows]
+
+        def draw_card_raw(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.Creature:
+            drawn = self.draw_cards_bulk(1, con=con)
+            if drawn == []:
+                raise EmptyDeckException()
+            return drawn[0]
+
+        def draw_cards_bulk(
+            self, N: int, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            if N <= 0:
+                return []
+
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                deck = state.deck.get(self.id, ())
+                # appended to the hand in the order they were drawn
+                picked = random.sample(deck, min(N, len(deck)))
+                if picked == []:
+                    return []
+
+                state.deck.put(sub_con, self.id, tuple(c for c in deck if c not in picked))
+                state.hand.put(sub_con, self.id, state.hand.get(self.id, ()) + tuple(picked))
+                return [self.make_creature(c) for c in picked]
+
+        def reshuffle_discard(self, con: Optional[Database.TransactionManager] = None) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                state = self.state()
+                discard = state.discard.get(self.id, ())
+                if discard == ():
+                    return
+                state.deck.put(sub_con, self.id, state.deck.get(self.id, ()) + discard)
+                state.discard.put(sub_con, self.id, ())
+
+        def add_to_pile(
+            self,
+            pile: Table[int, Tuple[Any, ...]],
+            entry: Any,
+            con: Database.TransactionManager,
+        ) -> None:
+            pile.put(con, self.id, pile.get(self.id, ()) + (entry,))
+
+        def remove_from_pile(
+            self,
+            pile: Table[int, Tuple[Any, ...]],
+            creature: Database.Creature,
+            con: Database.TransactionManager,
+        ) -> None:
+            """Removes the creature from a pile of ids or of (id, value) pairs."""
+            entries = pile.get(self.id, ())
+            pile.put(
+                con,
+                self.id,
+                tuple(e for e in entries if (e[0] if isinstance(e, tuple) else e) != creature.id),
+            )
+
+        def add_creature_to_hand(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.add_to_pile(self.state().hand, creature.id, sub_con)
+
+        def remove_creature_from_hand(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.remove_from_pile(self.state().hand, creature, sub_con)
+
+        def remove_creature_from_deck(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.remove_from_pile(self.state().deck, creature, sub_con)
+
+        def remove_creature_from_played(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.remove_from_pile(self.state().played, creature, sub_con)
+
+        def add_creature_to_played(
+            self,
+            creature: Database.Creature,
+            until: float,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.add_to_pile(
+                    self.state().played, (creature.id, stored_timestamp(until)), sub_con
+                )
+
+        def add_creature_to_campaign(
+            self,
+            creature: Database.Creature,
+            strength: int,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.add_to_pile(self.state().campaign, (creature.id, strength), sub_con)
+
+        def remove_creature_from_campaign(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.remove_from_pile(self.state().campaign, creature, sub_con)
+
+        def add_to_discard(
+            self,
+            creature: Database.Creature,
+            con: Optional[Database.TransactionManager] = None,
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                self.add_to_pile(self.state().discard, creature.id, sub_con)
+
+    class Creature(Database.Creature):
+        def __init__(
+            self,
+            parent: Database,
+            id: int,
+            creature: Database.BaseCreature,
+            guild: Database.Guild,
+            owner: Database.Player,
+        ):
+            super().__init__(parent, id, creature, guild, owner)
+
+        def occupies(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Optional[Tuple[Database.Region, int]]:
+            state = cast(InMemoryDatabase.Guild, self.guild).state()
+            for region_id, (creature_id, timestamp) in state.occupies.items():
+                if creature_id == self.id:
+                    return (self.guild.get_region(region_id, con=con), timestamp)
+            return None
+
+        def change_strength(
+            self, new_strength: int, con: Optional[Database.TransactionManager] = None
+        ) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                campaign = cast(InMemoryDatabase.Guild, self.guild).state().campaign
+                entries = campaign.get(self.owner.id, ())
+                campaign.put(
+                    sub_con,
+                    self.owner.id,
+                    tuple((c, new_strength if c == self.id else s) for c, s in entries),
+                )
+
+    class FreeCreature(Database.FreeCreature):
+        def __init__(
+            self,
+            parent: Database,
+            creature: Database.BaseCreature,
+            guild: Database.Guild,
+            channel_id: int,
+            message_id: int,
+            roller_id: int,
+            timestamp_protected: float,
+            timestamp_expires: float,
+        ):
+            super().__init__(
+                parent,
+                creature,
+                guild,
+                channel_id,
+                message_id,
+                roller_id,
+                timestamp_protected,
+                timestamp_expires,
+            )
+            self.timestamp_protected = timestamp_protected
+            self.timestamp_expires = timestamp_expires
+
+        def row(self) -> FreeCreatureRow:
+            state = cast(InMemoryDatabase.Guild, self.guild).state()
+            return state.free_creatures[(self.channel_id, self.message_id)]
+
+        def get_protected_timestamp(self, con: Optional[Database.TransactionManager] = None) -> int:
+            return self.row().timestamp_protected
+
+        def get_expires_timestamp(self, con: Optional[Database.TransactionManager] = None) -> int:
+            return self.row().timestamp_expires
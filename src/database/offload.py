@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, NamedTuple, Optional, TypeVar, Any
+
+from sqlalchemy import QueuePool
+
+from src.database.database import Database
+from src.database.postgres import PostgresDatabase
+
+
+T = TypeVar("T")
+
+
+class OffloadStats(NamedTuple):
+    workers: int
+    queued: int
+    running: int
+    max_queued: int
+    completed: int
+    mean_wait: float
+    max_wait: float
+
+
+class OffloadDatabase:
+    """Runs calls against the synchronous database on a thread pool and returns awaitables.
+
+    The pool has as many threads as the engine has pooled connections, so a call that got a
+    thread never waits for a connection. Everything queued behind them shows up in stats().
+    """
+
+    def __init__(self, db: PostgresDatabase, workers: Optional[int] = None):
+        self.db = db
+
+        if workers is None:
+            pool = db.engine.pool
+            workers = pool.size() if isinstance(pool, QueuePool) else 5
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="database")
+
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.started = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, f: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        submitted = time.perf_counter()
+
+        def call() -> T:
+            wait = time.perf_counter() - submitted
+            with self.lock:
+                self.queued -= 1
+                self.running += 1
+                self.started += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+            try:
+                return f(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        with self.lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, call)
+
+    async def transact(self, f: Callable[[Database.TransactionManager], T]) -> T:
+        """Runs f inside one root transaction, commits if it returns and rolls back if it raises."""
+
+        def call() -> T:
+            with self.db.transaction() as con:
+                return f(con)
+
+        return await self.run(call)
+
+    def stats(self) -> OffloadStats:
+        with self.lock:
+            return OffloadStats(
+                workers=self.workers,
+                queued=self.queued,
+                running=self.running,
+                max_queued=self.max_queued,
+                completed=self.completed,
+                mean_wait=self.total_wait / self.started if self.started else 0.0,
+                max_wait=self.max_wait,
+            )
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.max_queued = self.queued
+            self.started = 0
+            self.completed = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -1,9 +1,10 @@
+import math
 import random
 import json
-import time
+import threading
 from copy import deepcopy
-from typing import List, Tuple, Type, Optional, Union, Any, cast
-from collections import defaultdict
+from types import MappingProxyType
+from typing import List, Tuple, Type, Optional, Union, Any, Sequence, cast
 
 from sqlalchemy import (
     RootTransaction,
@@ -11,6 +12,7 @@ from sqlalchemy import (
     Connection,
     Engine,
     text,
+    bindparam,
     TextClause,
     MetaData,
     Table,
@@ -20,18 +22,21 @@ from sqlalchemy import (
     Boolean,
     JSON,
     String,
+    Index,
     ForeignKeyConstraint,
     PrimaryKeyConstraint,
     UniqueConstraint,
+    inspect,
 )
 
 from src.core.base_types import (
+    event_registry,
     Resource,
     BaseResources,
     Event,
 )
 
-from src.database.database import Database, event_classes
+from src.database.database import Database
 
 from src.core.exceptions import (
     GuildNotFound,
@@ -46,10 +51,208 @@ from src.definitions.regions import regions
 from src.definitions.creatures import creatures
 
 
+class IdAllocator:
+    """Hands out per-guild ids from blocks reserved in the id_counters table.
+
+    Blocks are reserved on their own short transaction, so concurrent transactions
+    (and other processes) never receive the same id, and ids are never reused even
+    if the transaction that requested them is rolled back.
+    """
+
+    # kind -> table the ids end up in, used to seed a counter from existing rows
+    kinds = {"events": "events", "creatures": "creatures", "regions": "regions"}
+
+    def __init__(self, engine: Engine, block_size: int = 100):
+        self.engine = engine
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.blocks: dict[Tuple[int, str], Tuple[int, int]] = {}
+
+    def reserve(self, guild_id: int, kind: str, amount: int = 1) -> int:
+        """Returns the first of `amount` consecutive fresh ids."""
+        with self.lock:
+            next_id, end = self.blocks.get((guild_id, kind), (0, 0))
+            if next_id + amount > end:
+                size = max(self.block_size, amount)
+                end = self.reserve_block(guild_id, kind, size)
+                next_id = end - size
+            self.blocks[(guild_id, kind)] = (next_id + amount, end)
+            return next_id
+
+    def reserve_block(self, guild_id: int, kind: str, size: int) -> int:
+        """Reserves `size` ids in the database and returns the exclusive end of the block."""
+        update_sql = text(
+            """
+            UPDATE id_counters SET next_id = next_id + :size
+            WHERE guild_id = :guild_id AND kind = :kind
+            RETURNING next_id
+        """
+        )
+        params = {"guild_id": guild_id, "kind": kind, "size": size}
+
+        with self.engine.begin() as con:
+            end = con.execute(update_sql, params).scalar()
+            if end is None:
+                # first reservation for this guild, continue after any existing rows
+                seed_sql = text(
+                    f"""
+                    INSERT INTO id_counters (guild_id, kind, next_id)
+                    VALUES (:guild_id, :kind, (SELECT COALESCE(MAX(id), 0) + 1 FROM {self.kinds[kind]} WHERE guild_id = :guild_id))
+                    ON CONFLICT DO NOTHING
+                """
+                )
+                con.execute(seed_sql, params)
+                end = con.execute(update_sql, params).scalar()
+
+        return cast(int, end)
+
+
+# column of each resource in player_resources, the one row per player layout
+RESOURCE_COLUMNS: dict[Resource, str] = {
+    resource: resource.name.lower() for resource in BaseResources
+}
+
+
+def backfill_resources_sql(condition: str) -> TextClause:
+    """Copies the resource rows of the players matching condition into player_resources."""
+    columns = ", ".join(RESOURCE_COLUMNS.values())
+    sums = ", ".join(
+        f"COALESCE(SUM(r.quantity) FILTER (WHERE r.resource_type = {resource.value}), 0)"
+        for resource in RESOURCE_COLUMNS
+    )
+    return text(
+        f"""
+        INSERT INTO player_resources (player_id, guild_id, {columns})
+        SELECT p.id, p.guild_id, {sums}
+        FROM players p
+        LEFT JOIN resources r ON r.player_id = p.id AND r.guild_id = p.guild_id
+        WHERE {condition}
+        GROUP BY p.guild_id, p.id
+        ON CONFLICT DO NOTHING
+    """
+    )
+
+
+def timestamp_bounds(start: float, end: float) -> Tuple[int, int]:
+    """The BIGINT timestamps within [start, end].
+
+    Comparing the column to a float casts every row instead, which the timestamp indexes
+    can not serve.
+    """
+    return math.ceil(start), math.floor(end)
+
+
+def event_key_params(event_keys: List[Tuple[int, int]]) -> dict[str, List[int]]:
+    """Event ids are only unique within a guild, so events are looked up by both."""
+    return {
+        "guild_ids": [guild_id for guild_id, _ in event_keys],
+        "event_ids": [event_id for _, event_id in event_keys],
+    }
+
+
+class ConfigCache:
+    """Process wide cache of guild configs, as raw dict and as typed config.
+
+    Entries are dropped when a transaction that wrote the config ends and when another process
+    announces a change on the guild_config channel. Every drop bumps the guild's generation,
+    so a read that started before the drop cannot put its stale result back.
+    """
+
+    def __init__(self, defaults: dict[Any, Any]) -> None:
+        self.lock = threading.Lock()
+        # fills in the fields older stored configs are missing
+        self.defaults = defaults
+        self.configs: dict[int, Tuple[dict[Any, Any], Database.GuildConfig]] = {}
+        self.generations: dict[int, int] = {}
+
+    def get(self, guild_id: int) -> Optional[Tuple[dict[Any, Any], Database.GuildConfig]]:
+        with self.lock:
+            return self.configs.get(guild_id)
+
+    def generation(self, guild_id: int) -> int:
+        with self.lock:
+            return self.generations.get(guild_id, 0)
+
+    def put(
+        self, guild_id: int, generation: int, config: dict[Any, Any]
+    ) -> Tuple[dict[Any, Any], Database.GuildConfig]:
+        entry = (config, Database.GuildConfig.from_dict(config, self.defaults))
+        with self.lock:
+            if self.generations.get(guild_id, 0) == generation:
+                self.configs[guild_id] = entry
+        return entry
+
+    def invalidate(self, guild_id: int) -> None:
+        with self.lock:
+            self.configs.pop(guild_id, None)
+            self.generations[guild_id] = self.generations.get(guild_id, 0) + 1
+
+
+class ExistenceCache:
+    """Process wide cache of the guilds and players known to exist.
+
+    Only existence is remembered, a miss always goes to the database. Entries are dropped when
+    a transaction that added or removed the guild or player ends, a guild takes its players
+    with it. Like the config cache a drop bumps the generation, so a lookup that started
+    before the drop cannot put its stale result back.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.guilds: set[int] = set()
+        self.players: set[Tuple[int, int]] = set()
+        self.current_generation = 0
+
+    def generation(self) -> int:
+        with self.lock:
+            return self.current_generation
+
+    def has_guild(self, guild_id: int) -> bool:
+        with self.lock:
+            return guild_id in self.guilds
+
+    def has_player(self, guild_id: int, player_id: int) -> bool:
+        with self.lock:
+            return (guild_id, player_id) in self.players
+
+    def put_guild(self, guild_id: int, generation: int) -> None:
+        with self.lock:
+            if self.current_generation == generation:
+                self.guilds.add(guild_id)
+
+    def put_player(self, guild_id: int, player_id: int, generation: int) -> None:
+        with self.lock:
+            if self.current_generation == generation:
+                self.guilds.add(guild_id)
+                self.players.add((guild_id, player_id))
+
+    def invalidate(self, guild_id: int, player_ids: Optional[List[int]] = None) -> None:
+        """Drops the given players, or the guild and all its players if none are given."""
+        with self.lock:
+            if player_ids is None:
+                self.guilds.discard(guild_id)
+                self.players = {p for p in self.players if p[0] != guild_id}
+            else:
+                self.players.difference_update((guild_id, player_id) for player_id in player_ids)
+            self.current_generation += 1
+
+
 class PostgresDatabase(Database):
-    def __init__(self, start_condition: Database.StartCondition, engine: Engine):
+    def __init__(
+        self,
+        start_condition: Database.StartCondition,
+        engine: Engine,
+        id_block_size: int = 100,
+        wide_resources: bool = False,
+    ):
         super().__init__(start_condition)
         self.engine = engine
+        # keep resources in player_resources, one row per player, instead of one row per
+        # resource in resources. Players are copied over lazily, see migrate_resources
+        self.wide_resources = wide_resources
+        self.id_allocator = IdAllocator(engine, block_size=id_block_size)
+        self.config_cache = ConfigCache(start_condition.start_config)
+        self.existence_cache = ExistenceCache()
 
         metadata = MetaData()
 
@@ -81,6 +284,23 @@ class PostgresDatabase(Database):
                 ondelete="CASCADE",
             ),
             PrimaryKeyConstraint("id", "guild_id", name="pk_events"),
+            # event handler tick: everything unresolved up to now
+            Index(
+                "ix_events_unresolved",
+                "guild_id",
+                "timestamp",
+                postgresql_where=text("NOT resolved"),
+            ),
+            Index("ix_events_guild_timestamp", "guild_id", "timestamp"),
+            Index("ix_events_guild_type_timestamp", "guild_id", "event_type", "timestamp"),
+            # recharges and other per player lookups
+            Index(
+                "ix_events_guild_player_type_timestamp",
+                "guild_id",
+                "player_id",
+                "event_type",
+                "timestamp",
+            ),
         )
 
         region_table = Table(
@@ -177,6 +397,21 @@ class PostgresDatabase(Database):
             PrimaryKeyConstraint("player_id", "guild_id", "resource_type", name="pk_resources"),
         )
 
+        player_resources_table = Table(
+            "player_resources",
+            metadata,
+            Column("player_id", BigInteger, nullable=False),
+            Column("guild_id", BigInteger, nullable=False),
+            *[
+                Column(column, Integer, nullable=False, server_default="0")
+                for column in RESOURCE_COLUMNS.values()
+            ],
+            ForeignKeyConstraint(
+                ["guild_id", "player_id"], ["players.guild_id", "players.id"], ondelete="CASCADE"
+            ),
+            PrimaryKeyConstraint("player_id", "guild_id", name="pk_player_resources"),
+        )
+
         deck_table = Table(
             "deck",
             metadata,
@@ -266,8 +501,88 @@ class PostgresDatabase(Database):
             PrimaryKeyConstraint("player_id", "guild_id", "creature_id", name="pk_campaign"),
         )
 
+        # sum of campaign strength per player, kept up to date by a trigger on campaign
+        campaign_totals_table = Table(
+            "campaign_totals",
+            metadata,
+            Column("player_id", BigInteger, nullable=False),
+            Column("guild_id", BigInteger, nullable=False),
+            Column("strength", BigInteger, nullable=False),
+            ForeignKeyConstraint(
+                ["guild_id", "player_id"], ["players.guild_id", "players.id"], ondelete="CASCADE"
+            ),
+            PrimaryKeyConstraint("guild_id", "player_id", name="pk_campaign_totals"),
+        )
+
+        # no foreign key to guilds: ids are reserved before the guild row is committed
+        # and have to stay unique if a guild is removed and added again
+        id_counter_table = Table(
+            "id_counters",
+            metadata,
+            Column("guild_id", BigInteger, nullable=False),
+            Column("kind", String, nullable=False),
+            Column("next_id", BigInteger, nullable=False),
+            PrimaryKeyConstraint("guild_id", "kind", name="pk_id_counters"),
+        )
+
+        campaign_totals_existed = inspect(self.engine).has_table("campaign_totals")
+
         metadata.create_all(self.engine)
 
+        self.add_campaign_totals_trigger(backfill=not campaign_totals_existed)
+
+        # extra_data is already serialised, so it is passed through as text instead of
+        # being encoded a second time by the JSON column type
+        self.insert_events_sql = events_table.insert().values(
+            extra_data=bindparam("extra_data", type_=String)
+        )
+
+        # create_all skips tables that already exist, so indexes added later are created here
+        for index in events_table.indexes:
+            index.create(self.engine, checkfirst=True)
+
+    def add_campaign_totals_trigger(self, backfill: bool) -> None:
+        with self.engine.begin() as con:
+            con.execute(
+                text(
+                    """
+CREATE OR REPLACE FUNCTION update_campaign_totals() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE campaign_totals SET strength = strength - OLD.strength
+        WHERE guild_id = OLD.guild_id AND player_id = OLD.player_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO campaign_totals (player_id, guild_id, strength)
+        VALUES (NEW.player_id, NEW.guild_id, NEW.strength)
+        ON CONFLICT (guild_id, player_id)
+        DO UPDATE SET strength = campaign_totals.strength + EXCLUDED.strength;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER campaign_totals_trigger
+AFTER INSERT OR UPDATE OR DELETE ON campaign
+FOR EACH ROW
+EXECUTE FUNCTION update_campaign_totals();"""
+                )
+            )
+
+            if backfill:
+                # campaigns from before the table existed, the trigger covers everything after
+                con.execute(
+                    text(
+                        """
+                        INSERT INTO campaign_totals (player_id, guild_id, strength)
+                        SELECT player_id, guild_id, SUM(strength) FROM campaign
+                        GROUP BY guild_id, player_id
+                        ON CONFLICT (guild_id, player_id)
+                        DO UPDATE SET strength = EXCLUDED.strength
+                    """
+                    )
+                )
+
     class TransactionManager(Database.TransactionManager):
         def __init__(
             self,
@@ -275,6 +590,21 @@ class PostgresDatabase(Database):
             parent_manager: Optional[Database.TransactionManager],
         ):
             super().__init__(parent, parent_manager)
+            # guilds whose config this transaction changed, they bypass the config cache
+            self.dirty_configs: set[int] = set()
+
+        def config_changed(self, guild_id: int) -> None:
+            root = cast(PostgresDatabase.TransactionManager, self.get_root())
+            if guild_id in root.dirty_configs:
+                return
+
+            root.dirty_configs.add(guild_id)
+            parent = cast(PostgresDatabase, self.parent)
+            root.on_end(lambda: parent.config_cache.invalidate(guild_id))
+
+        def existence_changed(self, guild_id: int, player_ids: Optional[List[int]] = None) -> None:
+            parent = cast(PostgresDatabase, self.parent)
+            self.get_root().on_end(lambda: parent.existence_cache.invalidate(guild_id, player_ids))
 
         def start_connection(self) -> Tuple[Connection, RootTransaction]:
             parent: PostgresDatabase = cast(PostgresDatabase, self.parent)
@@ -299,6 +629,50 @@ class PostgresDatabase(Database):
     ) -> Database.TransactionManager:
         return self.TransactionManager(self, parent)
 
+    def migrate_resources(self, batch_size: int = 1000) -> int:
+        """Copies every player's resource rows into player_resources and returns how many.
+
+        Runs one short transaction per batch of players, so it can run next to a live bot in
+        wide_resources mode. Players that bot already copied on first access are skipped.
+        """
+        migrated = 0
+        after: Tuple[int, int] = (-1, -1)
+
+        while True:
+            with self.transaction() as con:
+                keys = con.execute(
+                    text(
+                        """
+                        SELECT guild_id, id FROM players
+                        WHERE (guild_id, id) > (:guild_id, :player_id)
+                        ORDER BY guild_id, id
+                        LIMIT :batch_size
+                    """
+                    ),
+                    {"guild_id": after[0], "player_id": after[1], "batch_size": batch_size},
+                ).fetchall()
+
+                if keys == []:
+                    return migrated
+
+                result = con.execute(
+                    backfill_resources_sql(
+                        """
+                        (p.guild_id, p.id) > (:guild_id, :player_id)
+                        AND (p.guild_id, p.id) <= (:last_guild_id, :last_player_id)
+                        """
+                    ),
+                    {
+                        "guild_id": after[0],
+                        "player_id": after[1],
+                        "last_guild_id": keys[-1][0],
+                        "last_player_id": keys[-1][1],
+                    },
+                )
+                migrated += result.rowcount
+
+            after = (keys[-1][0], keys[-1][1])
+
     # transaction stuff
     def start_connection(self) -> Tuple[Connection, RootTransaction]:
         con = self.engine.connect()
@@ -319,48 +693,53 @@ class PostgresDatabase(Database):
         guild: Database.Guild,
         con: Optional[Database.TransactionManager] = None,
     ) -> int:
-        with self.transaction(parent=con) as sub_con:
-            sql = text("SELECT COALESCE(MAX(id), 0) + 1 FROM events WHERE guild_id = :guild_id")
-            result = sub_con.execute(sql, {"guild_id": guild.id}).scalar() + (
-                len(con.get_root().get_events()) if con else 0
-            )
-            return cast(int, result)
+        return self.id_allocator.reserve(guild.id, "events")
 
     def add_event(
         self,
         event: Event,
         con: Optional[Database.TransactionManager] = None,
     ) -> None:
+        self.add_events([event], con=con)
+
+    def add_events(
+        self,
+        events: List[Event],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> None:
+        if events == []:
+            return
+
         with self.transaction(parent=con) as sub_con:
-            searched_dict: dict[str, Optional[int]] = defaultdict(None)
-            searched_dict["region_id"] = None
-            searched_dict["player_id"] = None
-            searched_dict["creature_id"] = None
-
-            for key, value in json.loads(event.extra_data()).items():
-                for searched_key in searched_dict.keys():
-                    if key == searched_key:
-                        searched_dict[key] = value
-
-            event_sql = text(
-                """INSERT INTO events (id, guild_id, timestamp, parent_event_id, event_type, extra_data, resolved, region_id, player_id, creature_id) 
-                VALUES (:id, :guild_id, :timestamp, :parent_event_id, :event_type, :extra_data, :resolved, :region_id, :player_id, :creature_id)"""
-            )
             sub_con.execute(
-                event_sql,
-                {
-                    "id": event.id,
-                    "guild_id": event.guild.id,
-                    "timestamp": event.timestamp,
-                    "parent_event_id": event.parent_event_id if event.parent_event_id else None,
-                    "event_type": event.event_type,
-                    "extra_data": event.extra_data(),
-                    "resolved": False,
-                    "region_id": searched_dict["region_id"],
-                    "player_id": searched_dict["player_id"],
-                    "creature_id": searched_dict["creature_id"],
-                },
+                self.insert_events_sql,
+                [
+                    {
+                        "id": event.id,
+                        "guild_id": event.guild.id,
+                        "timestamp": event.timestamp,
+                        "parent_event_id": (
+                            event.parent_event_id if event.parent_event_id else None
+                        ),
+                        "event_type": event.event_type,
+                        "extra_data": event.extra_data(),
+                        "resolved": False,
+                        "region_id": getattr(event, "region_id", None),
+                        "player_id": getattr(event, "player_id", None),
+                        "creature_id": getattr(event, "creature_id", None),
+                    }
+                    for event in events
+                ],
+            )
+
+    def decode_rows(self, guild: Database.Guild, rows: Sequence[Any]) -> List[Event]:
+        """Builds events from (id, timestamp, parent_event_id, event_type, extra_data) rows."""
+        return [
+            event_registry[event_type].from_extra_data(
+                self, event_id, timestamp, parent_event_id, guild, extra_data
             )
+            for event_id, timestamp, parent_event_id, event_type, extra_data in rows
+        ]
 
     def add_guild(
         self,
@@ -370,9 +749,10 @@ class PostgresDatabase(Database):
         guild = PostgresDatabase.Guild(self, guild_id)
 
         with self.transaction(parent=con) as sub_con:
+            cast(PostgresDatabase.TransactionManager, sub_con).existence_changed(guild_id)
             sub_con.add_event(
                 Database.Guild.GuildCreatedEvent(
-                    self, self.fresh_event_id(guild, con=sub_con), time.time(), None, guild
+                    self, self.fresh_event_id(guild, con=sub_con), self.now(), None, guild
                 )
             )
 
@@ -395,7 +775,7 @@ class PostgresDatabase(Database):
 
             sub_con.add_event(
                 Database.Guild.ConflictStartEvent(
-                    self, self.fresh_event_id(guild, con=sub_con), time.time(), None, guild
+                    self, self.fresh_event_id(guild, con=sub_con), self.now(), None, guild
                 )
             )
 
@@ -431,8 +811,65 @@ class PostgresDatabase(Database):
         with self.transaction(parent=con) as sub_con:
             sql = text("DELETE FROM guilds WHERE id = :guild_id")
             sub_con.execute(sql, {"guild_id": guild.id})
+            cast(PostgresDatabase.TransactionManager, sub_con).config_changed(guild.id)
+            cast(PostgresDatabase.TransactionManager, sub_con).existence_changed(guild.id)
             return guild
 
+    def get_next_event_timestamps(
+        self,
+        guild_ids: Optional[List[int]] = None,
+        con: Optional[Database.TransactionManager] = None,
+    ) -> dict[int, float]:
+        """Earliest unresolved event timestamp per guild, all guilds if guild_ids is None."""
+        with self.transaction(parent=con) as sub_con:
+            guild_string = "" if guild_ids is None else "AND guild_id = ANY(:guild_ids)"
+            sql = text(
+                f"""
+                SELECT guild_id, MIN(timestamp) FROM events
+                WHERE NOT resolved
+                {guild_string}
+                GROUP BY guild_id
+                """
+            )
+            results = sub_con.execute(sql, {"guild_ids": guild_ids}).fetchall()
+            return {row[0]: row[1] for row in results}
+
+    def get_event_timestamps(
+        self,
+        event_keys: List[Tuple[int, int]],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> List[Tuple[int, float]]:
+        """(guild_id, timestamp) of the unresolved events with these (guild_id, event_id) keys."""
+        with self.transaction(parent=con) as sub_con:
+            sql = text(
+                """
+                SELECT e.guild_id, e.timestamp FROM events e
+                JOIN unnest(CAST(:guild_ids AS BIGINT[]), CAST(:event_ids AS BIGINT[]))
+                    AS k(guild_id, id) ON e.guild_id = k.guild_id AND e.id = k.id
+                WHERE NOT e.resolved
+                """
+            )
+            results = sub_con.execute(sql, event_key_params(event_keys)).fetchall()
+            return [(row[0], row[1]) for row in results]
+
+    def get_event_players(
+        self,
+        event_keys: List[Tuple[int, int]],
+        con: Optional[Database.TransactionManager] = None,
+    ) -> List[Tuple[int, int]]:
+        """(guild_id, player_id) of every player concerned by the events with these keys."""
+        with self.transaction(parent=con) as sub_con:
+            sql = text(
+                """
+                SELECT DISTINCT e.guild_id, e.player_id FROM events e
+                JOIN unnest(CAST(:guild_ids AS BIGINT[]), CAST(:event_ids AS BIGINT[]))
+                    AS k(guild_id, id) ON e.guild_id = k.guild_id AND e.id = k.id
+                WHERE e.player_id IS NOT NULL
+                """
+            )
+            results = sub_con.execute(sql, event_key_params(event_keys)).fetchall()
+            return [(row[0], row[1]) for row in results]
+
     class Guild(Database.Guild):
         def __init__(self, parent: Database, guild_id: int):
             super().__init__(parent, guild_id)
@@ -446,12 +883,13 @@ class PostgresDatabase(Database):
             con: Optional[Database.TransactionManager] = None,
         ) -> list[Event]:
             with self.parent.transaction(parent=con) as sub_con:
-                resolved_string = "" if also_resolved else "AND resolved = :resolved"
+                resolved_string = "" if also_resolved else "AND NOT resolved"
+                start, end = timestamp_bounds(timestamp_start, timestamp_end)
 
                 if event_type is None:
                     sql = text(
                         f"""
-                        SELECT * FROM events
+                        SELECT id, timestamp, parent_event_id, event_type, extra_data FROM events
                         WHERE guild_id = :guild_id
                         AND timestamp BETWEEN :start AND :end
                         {resolved_string}
@@ -463,18 +901,18 @@ class PostgresDatabase(Database):
                         sql,
                         {
                             "guild_id": self.id,
-                            "start": timestamp_start,
-                            "end": timestamp_end,
+                            "start": start,
+                            "end": end,
                             "resolved": False,
                         },
                     ).fetchall()
                 else:
                     sql = text(
                         f"""
-                        SELECT * FROM events
+                        SELECT id, timestamp, parent_event_id, event_type, extra_data FROM events
                         WHERE guild_id = :guild_id
                         AND timestamp BETWEEN :start AND :end
-                        AND event_type LIKE :event_type
+                        AND event_type = :event_type
                         {resolved_string}
                         ORDER BY timestamp
                     """
@@ -484,29 +922,14 @@ class PostgresDatabase(Database):
                         sql,
                         {
                             "guild_id": self.id,
-                            "start": timestamp_start,
-                            "end": timestamp_end,
+                            "start": start,
+                            "end": end,
                             "event_type": event_type.event_type,
                             "resolved": False,
                         },
                     ).fetchall()
 
-                events = []
-                for r in results:
-                    event = None
-                    extra_data = r[5]
-
-                    for event_class in event_classes:
-                        if r[4] == event_class.event_type:
-                            event = event_class.from_extra_data(
-                                self.parent, r[0], r[2], r[3], self, extra_data
-                            )
-                            break
-
-                    assert event is not None
-                    events.append(event)
-
-                return events
+                return cast(PostgresDatabase, self.parent).decode_rows(self, results)
 
         def get_event_by_id(
             self,
@@ -516,25 +939,14 @@ class PostgresDatabase(Database):
             with self.parent.transaction(parent=con) as sub_con:
                 sql = text(
                     """
-                    SELECT * FROM events WHERE id = :event_id AND guild_id = :guild_id
+                    SELECT id, timestamp, parent_event_id, event_type, extra_data FROM events
+                    WHERE id = :event_id AND guild_id = :guild_id
                     """
                 )
 
                 r = sub_con.execute(sql, {"event_id": event_id, "guild_id": self.id}).fetchone()
 
-                event = None
-                extra_data = r[5]
-
-                for event_class in event_classes:
-                    if r[4] == event_class.event_type:
-                        event = event_class.from_extra_data(
-                            self, r[0], r[2], r[3], self, extra_data
-                        )
-                        break
-
-                assert event is not None
-
-                return event
+                return cast(PostgresDatabase, self.parent).decode_rows(self, [r])[0]
 
         def mark_event_as_resolved(
             self, event: Event, con: Optional[Database.TransactionManager] = None
@@ -578,22 +990,47 @@ class PostgresDatabase(Database):
                     sql,
                     {"guild_id": self.id, "config": json.dumps(config)},
                 )
+                cast(PostgresDatabase.TransactionManager, sub_con).config_changed(self.id)
 
-        def get_config(self, con: Optional[Database.TransactionManager] = None) -> dict[Any, Any]:
-            with self.parent.transaction(parent=con) as sub_con:
+        def load_config(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Tuple[dict[Any, Any], Database.GuildConfig]:
+            parent = cast(PostgresDatabase, self.parent)
+
+            with parent.transaction(parent=con) as sub_con:
+                root = cast(PostgresDatabase.TransactionManager, sub_con.get_root())
+                dirty = self.id in root.dirty_configs
+
+                if not dirty:
+                    cached = parent.config_cache.get(self.id)
+                    if cached is not None:
+                        return cached
+
+                generation = parent.config_cache.generation(self.id)
                 sql = text("SELECT config FROM guilds WHERE id = :guild_id")
                 result = sub_con.execute(sql, {"guild_id": self.id}).fetchone()
-                return cast(dict[Any, Any], result[0])
+                if result is None:
+                    raise GuildNotFound("No guilds with this guild_id")
+
+                config = cast(dict[Any, Any], result[0])
+                if dirty:
+                    return config, Database.GuildConfig.from_dict(
+                        config, parent.start_condition.start_config
+                    )
+                return parent.config_cache.put(self.id, generation, config)
+
+        def get_config(self, con: Optional[Database.TransactionManager] = None) -> dict[Any, Any]:
+            # callers edit the returned dict before passing it to set_config
+            return dict(self.load_config(con=con)[0])
+
+        def get_typed_config(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.GuildConfig:
+            return self.load_config(con=con)[1]
 
         def fresh_region_id(self, con: Optional[Database.TransactionManager] = None) -> int:
-            with self.parent.transaction(parent=con) as sub_con:
-                sql = text(
-                    "SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM regions WHERE guild_id = :guild_id"
-                )
-                result = sub_con.execute(sql, {"guild_id": self.id}).scalar() + (
-                    len(con.get_root().get_events()) if con else 0
-                )
-                return cast(int, result)
+            parent = cast(PostgresDatabase, self.parent)
+            return parent.id_allocator.reserve(self.id, "regions")
 
         def add_region(
             self,
@@ -616,7 +1053,7 @@ class PostgresDatabase(Database):
                 event_id = self.parent.fresh_event_id(self, con=sub_con)
                 sub_con.add_event(
                     Database.Guild.RegionAddedEvent(
-                        self.parent, event_id, time.time(), None, self, region_id
+                        self.parent, event_id, self.parent.now(), None, self, region_id
                     ),
                 )
                 return PostgresDatabase.Region(self.parent, region_id, base_region, self)
@@ -632,6 +1069,53 @@ class PostgresDatabase(Database):
                     for row in results
                 ]
 
+        def get_region_states(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.RegionState]:
+            with self.parent.transaction(parent=con) as sub_con:
+                sql = text(
+                    """
+                    SELECT r.id, r.base_region_id, c.id, c.base_creature_id, c.owner_id, o.timestamp_occupied
+                    FROM regions r
+                    LEFT JOIN occupies o ON o.guild_id = r.guild_id AND o.region_id = r.id
+                    LEFT JOIN creatures c ON c.guild_id = o.guild_id AND c.id = o.creature_id
+                    WHERE r.guild_id = :guild_id
+                    ORDER BY r.id
+                """
+                )
+                results = sub_con.execute(sql, {"guild_id": self.id}).fetchall()
+                return [
+                    Database.RegionState(
+                        PostgresDatabase.Region(self.parent, row[0], regions[row[1]], self),
+                        (
+                            None
+                            if row[2] is None
+                            else PostgresDatabase.Creature(
+                                self.parent,
+                                row[2],
+                                creatures[row[3]],
+                                self,
+                                PostgresDatabase.Player(self.parent, row[4], self),
+                            )
+                        ),
+                        row[5],
+                    )
+                    for row in results
+                ]
+
+        def get_regions_by_ids(
+            self, region_ids: List[int], con: Optional[Database.TransactionManager] = None
+        ) -> dict[int, Database.Region]:
+            with self.parent.transaction(parent=con) as sub_con:
+                sql = text(
+                    "SELECT id, base_region_id FROM regions WHERE guild_id = :guild_id AND id = ANY(:ids)"
+                )
+                results = sub_con.execute(sql, {"guild_id": self.id, "ids": region_ids}).fetchall()
+                return {
+                    row[0]: PostgresDatabase.Region(self.parent, row[0], regions[row[1]], self)
+                    for row in results
+                }
+
         def get_region(
             self,
             region_id: int,
@@ -658,7 +1142,7 @@ class PostgresDatabase(Database):
                 event_id = self.parent.fresh_event_id(self, con=sub_con)
                 sub_con.add_event(
                     Database.Guild.RegionRemovedEvent(
-                        self.parent, event_id, time.time(), None, self, region.id
+                        self.parent, event_id, self.parent.now(), None, self, region.id
                     ),
                 )
                 return region
@@ -668,84 +1152,136 @@ class PostgresDatabase(Database):
             player_id: int,
             con: Optional[Database.TransactionManager] = None,
         ) -> Database.Player:
-            player = PostgresDatabase.Player(self.parent, player_id, self)
-            guild_config = self.get_config()
+            return self.add_players([player_id], con=con)[0]
 
-            with self.parent.transaction(parent=con) as sub_con:
-                sql_player = text(
-                    "INSERT INTO players (id, guild_id) VALUES (:player_id, :guild_id)"
-                )
+        def add_players(
+            self,
+            player_ids: List[int],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> List[Database.Player]:
+            if len(player_ids) == 0:
+                return []
 
-                sub_con.execute(sql_player, {"player_id": player_id, "guild_id": self.id})
+            parent = cast(PostgresDatabase, self.parent)
+            players = [
+                PostgresDatabase.Player(self.parent, player_id, self) for player_id in player_ids
+            ]
+            start_deck = self.parent.start_condition.start_deck
 
-                for base_creature in self.parent.start_condition.start_deck:
-                    creature = self.add_creature(base_creature, player, con=sub_con)
-                    player.add_to_discard(creature, con=sub_con)
+            with self.parent.transaction(parent=con) as sub_con:
+                guild_config = self.get_typed_config(con=sub_con)
+
+                sql = text(
+                    """
+                    INSERT INTO players (id, guild_id)
+                    SELECT player_id, :guild_id FROM unnest(CAST(:player_ids AS BIGINT[])) AS player_id
+                """
+                )
+                sub_con.execute(sql, {"guild_id": self.id, "player_ids": player_ids})
+                cast(PostgresDatabase.TransactionManager, sub_con).existence_changed(
+                    self.id, player_ids
+                )
 
-                player.reshuffle_discard(con=sub_con)
+                # the whole start deck of every player goes straight into the deck, like
+                # adding it to the discard and reshuffling would
+                first_creature_id = parent.id_allocator.reserve(
+                    self.id, "creatures", len(players) * len(start_deck)
+                )
+                sql = text(
+                    """
+                    WITH new_creatures AS (
+                        INSERT INTO creatures (id, guild_id, base_creature_id, owner_id)
+                        SELECT :first_id + ordinality - 1, :guild_id, base_creature_id, owner_id
+                        FROM unnest(CAST(:base_creature_ids AS BIGINT[]), CAST(:owner_ids AS BIGINT[]))
+                            WITH ORDINALITY AS c (base_creature_id, owner_id, ordinality)
+                        RETURNING id, owner_id
+                    )
+                    INSERT INTO deck (player_id, guild_id, creature_id)
+                    SELECT owner_id, :guild_id, id FROM new_creatures
+                """
+                )
+                sub_con.execute(
+                    sql,
+                    {
+                        "first_id": first_creature_id,
+                        "guild_id": self.id,
+                        "base_creature_ids": [
+                            creature.id for _ in players for creature in start_deck
+                        ],
+                        "owner_ids": [player.id for player in players for _ in start_deck],
+                    },
+                )
 
-                for resource_type in BaseResources:
+                if parent.wide_resources:
                     sql = text(
                         """
-                        INSERT INTO Resources (player_id, guild_id, resource_type, quantity) VALUES (:player_id, :guild_id, :resource_type, :quantity)
+                        INSERT INTO player_resources (player_id, guild_id)
+                        SELECT player_id, :guild_id FROM unnest(CAST(:player_ids AS BIGINT[])) AS player_id
                     """
                     )
-                    sub_con.execute(
-                        sql,
-                        {
-                            "quantity": 0,
-                            "player_id": player.id,
-                            "guild_id": self.id,
-                            "resource_type": resource_type.value,
-                        },
+                else:
+                    sql = text(
+                        """
+                        INSERT INTO resources (player_id, guild_id, resource_type, quantity)
+                        SELECT player_id, :guild_id, resource_type, 0
+                        FROM unnest(CAST(:player_ids AS BIGINT[])) AS player_id
+                        CROSS JOIN unnest(CAST(:resource_types AS INTEGER[])) AS resource_type
+                    """
                     )
-
-                # recharge events
-                event_id = self.parent.fresh_event_id(self, con=sub_con)
-                sub_con.add_event(
-                    Database.Player.PlayerOrderRechargeEvent(
-                        self.parent,
-                        event_id,
-                        time.time() + guild_config["order_recharge"],
-                        None,
-                        self,
-                        player_id,
-                    ),
-                )
-                event_id = self.parent.fresh_event_id(self, con=sub_con)
-                sub_con.add_event(
-                    Database.Player.PlayerMagicRechargeEvent(
-                        self.parent,
-                        event_id,
-                        time.time() + guild_config["magic_recharge"],
-                        None,
-                        self,
-                        player_id,
-                    ),
-                )
-                event_id = self.parent.fresh_event_id(self, con=sub_con)
-                sub_con.add_event(
-                    Database.Player.PlayerCardRechargeEvent(
-                        self.parent,
-                        event_id,
-                        time.time() + guild_config["card_recharge"],
-                        None,
-                        self,
-                        player_id,
-                    ),
+                sub_con.execute(
+                    sql,
+                    {
+                        "guild_id": self.id,
+                        "player_ids": player_ids,
+                        "resource_types": [resource.value for resource in BaseResources],
+                    },
                 )
-                # recharge events
 
-                event_id = self.parent.fresh_event_id(self, con=sub_con)
-                sub_con.add_event(
-                    Database.Guild.PlayerAddedEvent(
-                        self.parent, event_id, time.time(), None, self, player_id
-                    ),
-                )
+                # recharge events and the added event, inserted together when the transaction ends
+                event_id = parent.id_allocator.reserve(self.id, "events", 4 * len(players))
+                now = self.parent.now()
+                for player in players:
+                    sub_con.add_event(
+                        Database.Player.PlayerOrderRechargeEvent(
+                            self.parent,
+                            event_id,
+                            now + guild_config.order_recharge,
+                            None,
+                            self,
+                            player.id,
+                        ),
+                    )
+                    sub_con.add_event(
+                        Database.Player.PlayerMagicRechargeEvent(
+                            self.parent,
+                            event_id + 1,
+                            now + guild_config.magic_recharge,
+                            None,
+                            self,
+                            player.id,
+                        ),
+                    )
+                    sub_con.add_event(
+                        Database.Player.PlayerCardRechargeEvent(
+                            self.parent,
+                            event_id + 2,
+                            now + guild_config.card_recharge,
+                            None,
+                            self,
+                            player.id,
+                        ),
+                    )
+                    sub_con.add_event(
+                        Database.Guild.PlayerAddedEvent(
+                            self.parent, event_id + 3, now, None, self, player.id
+                        ),
+                    )
+                    event_id += 4
 
-                self.parent.start_condition.join_action(player, sub_con)
+                for player in players:
+                    self.parent.start_condition.join_action(player, sub_con)
 
-            return player
+            return list(players)
 
         def get_players(
             self, con: Optional[Database.TransactionManager] = None
@@ -777,24 +1313,78 @@ class PostgresDatabase(Database):
             with self.parent.transaction(parent=con) as sub_con:
                 sql = text("DELETE FROM players WHERE guild_id = :guild_id AND id = :player_id")
                 sub_con.execute(sql, {"guild_id": self.id, "player_id": player.id})
+                cast(PostgresDatabase.TransactionManager, sub_con).existence_changed(
+                    self.id, [player.id]
+                )
 
                 event_id = self.parent.fresh_event_id(self, con=sub_con)
                 sub_con.add_event(
                     Database.Guild.PlayerRemovedEvent(
-                        self.parent, event_id, time.time(), None, self, player.id
+                        self.parent, event_id, self.parent.now(), None, self, player.id
                     ),
                 )
                 return player
 
-        def fresh_creature_id(self, con: Optional[Database.TransactionManager] = None) -> int:
+        def get_leaderboard(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.Leaderboard:
             with self.parent.transaction(parent=con) as sub_con:
+                # the one row subquery keeps the end timestamp in a guild without players
                 sql = text(
-                    "SELECT COALESCE(MAX(id), 0) + 1 FROM creatures WHERE guild_id = :guild_id"
+                    """
+                    SELECT conflict.end_timestamp, p.id, COALESCE(t.strength, 0) AS strength
+                    FROM (
+                        SELECT MIN(timestamp) AS end_timestamp FROM events
+                        WHERE guild_id = :guild_id AND event_type = :event_type
+                        AND NOT resolved AND timestamp >= :now
+                    ) conflict
+                    LEFT JOIN players p ON p.guild_id = :guild_id
+                    LEFT JOIN campaign_totals t ON t.guild_id = p.guild_id AND t.player_id = p.id
+                    ORDER BY strength DESC, p.id
+                """
                 )
-                result = sub_con.execute(sql, {"guild_id": self.id}).scalar() + (
-                    len(con.get_root().get_events()) if con else 0
+                results = sub_con.execute(
+                    sql,
+                    {
+                        "guild_id": self.id,
+                        "event_type": Database.Guild.ConflictEndEvent.event_type,
+                        # an integer, comparing the column to a float can not use its index
+                        "now": math.ceil(self.parent.now()),
+                    },
+                ).fetchall()
+                return Database.Leaderboard(
+                    results[0][0],
+                    [(row[1], int(row[2])) for row in results if row[1] is not None],
                 )
-                return cast(int, result)
+
+        def end_campaigns(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> dict[int, int]:
+            with self.parent.transaction(parent=con) as sub_con:
+                # one statement for the whole guild, the scores are summed over the deleted rows
+                sql = text(
+                    """
+                    WITH moved AS (
+                        DELETE FROM campaign WHERE guild_id = :guild_id
+                        RETURNING player_id, guild_id, creature_id, strength
+                    ), discarded AS (
+                        INSERT INTO discard (player_id, guild_id, creature_id)
+                        SELECT player_id, guild_id, creature_id FROM moved
+                    )
+                    SELECT p.id, COALESCE(SUM(moved.strength), 0)
+                    FROM players p
+                    LEFT JOIN moved ON moved.player_id = p.id
+                    WHERE p.guild_id = :guild_id
+                    GROUP BY p.id
+                    ORDER BY p.id
+                """
+                )
+                results = sub_con.execute(sql, {"guild_id": self.id}).fetchall()
+                return {row[0]: int(row[1]) for row in results}
+
+        def fresh_creature_id(self, con: Optional[Database.TransactionManager] = None) -> int:
+            parent = cast(PostgresDatabase, self.parent)
+            return parent.id_allocator.reserve(self.id, "creatures")
 
         def add_creature(
             self,
@@ -852,6 +1442,27 @@ class PostgresDatabase(Database):
                 results = sub_con.execute(sql, {"guild_id": self.id}).fetchall()
                 return [creatures[row[0]] for row in results]
 
+        def get_creatures_by_ids(
+            self, creature_ids: List[int], con: Optional[Database.TransactionManager] = None
+        ) -> dict[int, Database.Creature]:
+            with self.parent.transaction(parent=con) as sub_con:
+                sql = text(
+                    "SELECT id, base_creature_id, owner_id FROM creatures WHERE guild_id = :guild_id AND id = ANY(:ids)"
+                )
+                results = sub_con.execute(
+                    sql, {"guild_id": self.id, "ids": creature_ids}
+                ).fetchall()
+                return {
+                    row[0]: PostgresDatabase.Creature(
+                        self.parent,
+                        row[0],
+                        creatures[row[1]],
+                        self,
+                        PostgresDatabase.Player(self.parent, row[2], self),
+                    )
+                    for row in results
+                }
+
         def get_creature(
             self,
             creature_id: int,
@@ -928,9 +1539,9 @@ class PostgresDatabase(Database):
             con: Optional[Database.TransactionManager] = None,
         ) -> Database.FreeCreature:
             with self.parent.transaction(parent=con) as sub_con:
-                config = self.get_config(con=sub_con)
-                timestamp_protected = self.parent.timestamp_after(config["free_protection"])
-                timestamp_expires = self.parent.timestamp_after(config["free_expire"])
+                config = self.get_typed_config(con=sub_con)
+                timestamp_protected = self.parent.timestamp_after(config.free_protection)
+                timestamp_expires = self.parent.timestamp_after(config.free_expire)
                 sql = text(
                     """
                     INSERT INTO free_creatures (base_creature_id, guild_id, channel_id, message_id, roller_id, timestamp_protected, timestamp_expires)
@@ -979,6 +1590,38 @@ class PostgresDatabase(Database):
                     for row in results
                 ]
 
+        def get_free_creatures_by_keys(
+            self,
+            keys: List[Tuple[int, int]],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> dict[Tuple[int, int], Database.FreeCreature]:
+            with self.parent.transaction(parent=con) as sub_con:
+                sql = text(
+                    """
+                    SELECT f.base_creature_id, f.channel_id, f.message_id, f.roller_id,
+                        f.timestamp_protected, f.timestamp_expires
+                    FROM free_creatures f
+                    JOIN unnest(CAST(:channel_ids AS BIGINT[]), CAST(:message_ids AS BIGINT[]))
+                        AS k(channel_id, message_id)
+                        ON f.channel_id = k.channel_id AND f.message_id = k.message_id
+                    WHERE f.guild_id = :guild_id
+                    """
+                )
+                results = sub_con.execute(
+                    sql,
+                    {
+                        "guild_id": self.id,
+                        "channel_ids": [channel_id for channel_id, _ in keys],
+                        "message_ids": [message_id for _, message_id in keys],
+                    },
+                ).fetchall()
+                return {
+                    (row[1], row[2]): PostgresDatabase.FreeCreature(
+                        self.parent, creatures[row[0]], self, row[1], row[2], row[3], row[4], row[5]
+                    )
+                    for row in results
+                }
+
         def get_free_creature(
             self,
             channel_id: int,
@@ -1046,7 +1689,7 @@ class PostgresDatabase(Database):
                     raise Exception("Trying to occupy an occupied region")
 
                 until = self.parent.timestamp_after(
-                    self.guild.get_config(con=sub_con)["region_recharge"]
+                    self.guild.get_typed_config(con=sub_con).region_recharge
                 )
                 sql = text(
                     """
@@ -1121,10 +1764,38 @@ class PostgresDatabase(Database):
         def __init__(self, parent: Database, user_id: int, guild: Database.Guild):
             super().__init__(parent, user_id, guild)
 
+        def uses_wide_resources(self) -> bool:
+            return cast(PostgresDatabase, self.parent).wide_resources
+
+        def backfill_resources(self, con: Optional[Database.TransactionManager] = None) -> bool:
+            """Copies this player into player_resources if it is not there yet."""
+            with self.parent.transaction(parent=con) as sub_con:
+                result = sub_con.execute(
+                    backfill_resources_sql("p.guild_id = :guild_id AND p.id = :player_id"),
+                    {"player_id": self.id, "guild_id": self.guild.id},
+                )
+                return cast(bool, result.rowcount > 0)
+
         def get_resources(
             self, con: Optional[Database.TransactionManager] = None
         ) -> dict[Resource, int]:
             with self.parent.transaction(parent=con) as sub_con:
+                if self.uses_wide_resources():
+                    sql = text(
+                        f"""
+                        SELECT {", ".join(RESOURCE_COLUMNS.values())} FROM player_resources
+                        WHERE player_id = :player_id AND guild_id = :guild_id
+                    """
+                    )
+                    params = {"player_id": self.id, "guild_id": self.guild.id}
+                    row = sub_con.execute(sql, params).fetchone()
+                    if row is None and self.backfill_resources(con=sub_con):
+                        row = sub_con.execute(sql, params).fetchone()
+
+                    if row is None:
+                        return {}
+                    return {resource: row[i] for i, resource in enumerate(RESOURCE_COLUMNS)}
+
                 sql = text(
                     "SELECT resource_type, quantity FROM resources WHERE player_id = :player_id AND guild_id = :guild_id"
                 )
@@ -1133,28 +1804,135 @@ class PostgresDatabase(Database):
                 ).fetchall()
                 return {Resource(result[0]): result[1] for result in results}
 
+        def resource_values(self, values: dict[Resource, int]) -> Tuple[str, dict[str, Any]]:
+            """A VALUES list of (resource_type, value) rows and its parameters."""
+            rows = ", ".join(
+                f"(CAST(:resource_type_{i} AS INTEGER), CAST(:value_{i} AS INTEGER))"
+                for i in range(len(values))
+            )
+            params: dict[str, Any] = {"player_id": self.id, "guild_id": self.guild.id}
+            for i, (resource, value) in enumerate(values.items()):
+                params[f"resource_type_{i}"] = resource.value
+                params[f"value_{i}"] = value
+            return rows, params
+
+        def resource_columns(self, values: dict[Resource, int]) -> dict[str, Any]:
+            """Parameters for a player_resources statement, named after the columns."""
+            params: dict[str, Any] = {"player_id": self.id, "guild_id": self.guild.id}
+            for resource, value in values.items():
+                params[RESOURCE_COLUMNS[resource]] = value
+            return params
+
         def set_resources(
             self,
             resources: dict[Resource, int],
             con: Optional[Database.TransactionManager] = None,
         ) -> None:
+            if self.uses_wide_resources():
+                resources = {r: a for r, a in resources.items() if r in RESOURCE_COLUMNS}
+            if len(resources) == 0:
+                return
+
             with self.parent.transaction(parent=con) as sub_con:
-                for resource_type, quantity in resources.items():
+                if self.uses_wide_resources():
+                    assignments = ", ".join(
+                        f"{RESOURCE_COLUMNS[r]} = :{RESOURCE_COLUMNS[r]}" for r in resources
+                    )
                     sql = text(
-                        """
-                        UPDATE Resources SET quantity = :quantity 
-                        WHERE player_id = :player_id AND guild_id = :guild_id AND resource_type = :resource_type
+                        f"""
+                        UPDATE player_resources SET {assignments}
+                        WHERE player_id = :player_id AND guild_id = :guild_id
+                    """
+                    )
+                    params = self.resource_columns(resources)
+                    if sub_con.execute(sql, params).rowcount == 0 and self.backfill_resources(
+                        con=sub_con
+                    ):
+                        sub_con.execute(sql, params)
+                    return
+
+                rows, params = self.resource_values(resources)
+                sql = text(
+                    f"""
+                    UPDATE resources r SET quantity = v.value
+                    FROM (VALUES {rows}) AS v (resource_type, value)
+                    WHERE r.player_id = :player_id AND r.guild_id = :guild_id AND r.resource_type = v.resource_type
+                """
+                )
+                sub_con.execute(sql, params)
+
+        def change_resources(
+            self,
+            deltas: dict[Resource, int],
+            con: Optional[Database.TransactionManager] = None,
+        ) -> dict[Resource, int]:
+            if self.uses_wide_resources():
+                deltas = {r: a for r, a in deltas.items() if r in RESOURCE_COLUMNS}
+            if len(deltas) == 0:
+                return {}
+
+            with self.parent.transaction(parent=con) as sub_con:
+                if self.uses_wide_resources():
+                    columns = [RESOURCE_COLUMNS[r] for r in deltas]
+                    sql = text(
+                        f"""
+                        UPDATE player_resources SET {", ".join(f"{c} = {c} + :{c}" for c in columns)}
+                        WHERE player_id = :player_id AND guild_id = :guild_id
+                        AND {" AND ".join(f"{c} + :{c} >= 0" for c in columns)}
+                        RETURNING {", ".join(columns)}
                     """
                     )
+                    params = self.resource_columns(deltas)
+                    row = sub_con.execute(sql, params).fetchone()
+                    if row is None and self.backfill_resources(con=sub_con):
+                        row = sub_con.execute(sql, params).fetchone()
+                    results = (
+                        [] if row is None else [(r.value, row[i]) for i, r in enumerate(deltas)]
+                    )
+                else:
+                    rows, params = self.resource_values(deltas)
+                    # the guard below reads other rows than the one it updates, which a concurrent
+                    # payment would not make it read again, so lock the rows first in a fixed order
                     sub_con.execute(
-                        sql,
-                        {
-                            "quantity": quantity,
-                            "player_id": self.id,
-                            "guild_id": self.guild.id,
-                            "resource_type": resource_type.value,
-                        },
+                        text(
+                            f"""
+                            SELECT r.resource_type FROM resources r
+                            WHERE r.player_id = :player_id AND r.guild_id = :guild_id
+                            AND r.resource_type IN (
+                                SELECT resource_type FROM (VALUES {rows}) AS v (resource_type, value)
+                            )
+                            ORDER BY r.resource_type
+                            FOR UPDATE
+                        """
+                        ),
+                        params,
                     )
+                    # the guard looks at all rows at once, either every quantity changes or none
+                    sql = text(
+                        f"""
+                        WITH v (resource_type, value) AS (VALUES {rows})
+                        UPDATE resources r SET quantity = r.quantity + v.value
+                        FROM v
+                        WHERE r.player_id = :player_id AND r.guild_id = :guild_id AND r.resource_type = v.resource_type
+                        AND NOT EXISTS (
+                            SELECT 1 FROM resources r2 JOIN v v2 ON r2.resource_type = v2.resource_type
+                            WHERE r2.player_id = :player_id AND r2.guild_id = :guild_id
+                            AND r2.quantity + v2.value < 0
+                        )
+                        RETURNING r.resource_type, r.quantity
+                    """
+                    )
+                    results = sub_con.execute(sql, params).fetchall()
+
+                if results == [] and any(a < 0 for a in deltas.values()):
+                    resources = self.get_resources(con=sub_con)
+                    for r, a in deltas.items():
+                        if resources[r] + a < 0:
+                            raise NotEnoughResourcesException(
+                                "Player is paying {} {} but only has {}".format(-a, r, resources[r])
+                            )
+
+                return {Resource(result[0]): result[1] for result in results}
 
         def has(
             self,
@@ -1162,6 +1940,10 @@ class PostgresDatabase(Database):
             amount: int,
             con: Optional[Database.TransactionManager] = None,
         ) -> bool:
+            if self.uses_wide_resources():
+                resources = self.get_resources(con=con)
+                return resource in resources and resources[resource] >= amount
+
             with self.parent.transaction(parent=con) as sub_con:
                 sql = text(
                     "SELECT quantity FROM resources WHERE player_id = :player_id AND guild_id = :guild_id AND resource_type = :resource_type"
@@ -1188,7 +1970,7 @@ class PostgresDatabase(Database):
                     Database.Player.PlayerGainEvent(
                         self.parent,
                         event_id,
-                        time.time(),
+                        self.parent.now(),
                         None,
                         self.guild,
                         self.id,
@@ -1196,6 +1978,10 @@ class PostgresDatabase(Database):
                     ),
                 )
 
+                if self.uses_wide_resources():
+                    self.change_resources({resource: amount}, con=sub_con)
+                    return
+
                 sql = text(
                     """
                     UPDATE Resources SET quantity = quantity + :amount 
@@ -1244,6 +2030,7 @@ class PostgresDatabase(Database):
                     FROM hand h 
                     JOIN creatures c ON h.creature_id = c.id 
                     WHERE h.player_id = :player_id AND h.guild_id = :guild_id AND c.guild_id = :guild_id
+                    ORDER BY h.position
                 """
                 )
                 results = sub_con.execute(
@@ -1328,6 +2115,84 @@ class PostgresDatabase(Database):
                     for result in results
                 ]
 
+        def snapshot(
+            self, con: Optional[Database.TransactionManager] = None
+        ) -> Database.PlayerSnapshot:
+            def pile(table: str, extra: str = "", order: str = "x.creature_id") -> str:
+                return f"""
+                    (SELECT json_agg(json_build_array(x.creature_id, c.base_creature_id{extra}) ORDER BY {order})
+                    FROM {table} x JOIN creatures c ON c.id = x.creature_id AND c.guild_id = x.guild_id
+                    WHERE x.player_id = :player_id AND x.guild_id = :guild_id)
+                """
+
+            if self.uses_wide_resources():
+                pairs = ", ".join(f"'{r.value}', {c}" for r, c in RESOURCE_COLUMNS.items())
+                resources_sql = f"""
+                    (SELECT json_build_object({pairs}) FROM player_resources
+                    WHERE player_id = :player_id AND guild_id = :guild_id)
+                """
+            else:
+                resources_sql = """
+                    (SELECT json_object_agg(resource_type, quantity) FROM resources
+                    WHERE player_id = :player_id AND guild_id = :guild_id)
+                """
+
+            with self.parent.transaction(parent=con) as sub_con:
+                sql = text(
+                    f"""
+                    SELECT
+                        (SELECT config FROM guilds WHERE id = :guild_id),
+                        {resources_sql},
+                        {pile("hand", order="x.position")},
+                        {pile("deck")},
+                        {pile("discard")},
+                        {pile("played", extra=", x.timestamp_recharge")},
+                        {pile("campaign", extra=", x.strength")},
+                        (SELECT json_object_agg(event_type, timestamp) FROM (
+                            SELECT DISTINCT ON (event_type) event_type, timestamp FROM events
+                            WHERE guild_id = :guild_id AND player_id = :player_id
+                            AND event_type = ANY(:recharge_types) AND NOT resolved
+                            ORDER BY event_type, timestamp
+                        ) r)
+                """
+                )
+                row = sub_con.execute(
+                    sql,
+                    {
+                        "player_id": self.id,
+                        "guild_id": self.guild.id,
+                        "recharge_types": [
+                            Database.Player.PlayerOrderRechargeEvent.event_type,
+                            Database.Player.PlayerMagicRechargeEvent.event_type,
+                            Database.Player.PlayerCardRechargeEvent.event_type,
+                        ],
+                    },
+                ).fetchone()
+
+                if row[1] is None:
+                    # not copied to player_resources yet
+                    resources = self.get_resources(con=sub_con)
+                else:
+                    resources = {Resource(int(r)): q for r, q in row[1].items()}
+
+            def creature(entry: List[Any]) -> Database.Creature:
+                return PostgresDatabase.Creature(
+                    self.parent, entry[0], creatures[entry[1]], self.guild, self
+                )
+
+            return Database.PlayerSnapshot(
+                config=Database.GuildConfig.from_dict(
+                    row[0], self.parent.start_condition.start_config
+                ),
+                resources=MappingProxyType(resources),
+                hand=tuple(creature(entry) for entry in row[2] or []),
+                deck=tuple(creature(entry) for entry in row[3] or []),
+                discard=tuple(creature(entry) for entry in row[4] or []),
+                played=tuple((creature(entry), entry[2]) for entry in row[5] or []),
+                campaign=tuple((creature(entry), entry[2]) for entry in row[6] or []),
+                recharges=MappingProxyType(row[7] or {}),
+            )
+
         def get_events(
             self,
             timestamp_start: float,
@@ -1337,12 +2202,13 @@ class PostgresDatabase(Database):
             con: Optional[Database.TransactionManager] = None,
         ) -> list[Event]:
             with self.parent.transaction(parent=con) as sub_con:
-                resolved_string = "" if also_resolved else "AND resolved = :resolved"
+                resolved_string = "" if also_resolved else "AND NOT resolved"
+                start, end = timestamp_bounds(timestamp_start, timestamp_end)
 
                 if event_type is None:
                     sql = text(
                         f"""
-                        SELECT * FROM events
+                        SELECT id, timestamp, parent_event_id, event_type, extra_data FROM events
                         WHERE guild_id = :guild_id
                         AND timestamp BETWEEN :start AND :end
                         AND player_id = :player_id
@@ -1355,8 +2221,8 @@ class PostgresDatabase(Database):
                         sql,
                         {
                             "guild_id": self.guild.id,
-                            "start": timestamp_start,
-                            "end": timestamp_end,
+                            "start": start,
+                            "end": end,
                             "player_id": self.id,
                             "resolved": False,
                         },
@@ -1364,11 +2230,11 @@ class PostgresDatabase(Database):
                 else:
                     sql = text(
                         f"""
-                        SELECT * FROM events
+                        SELECT id, timestamp, parent_event_id, event_type, extra_data FROM events
                         WHERE guild_id = :guild_id
                         AND timestamp BETWEEN :start AND :end
                         AND player_id = :player_id
-                        AND event_type LIKE :event_type
+                        AND event_type = :event_type
                         {resolved_string}
                         ORDER BY timestamp
                     """
@@ -1378,31 +2244,15 @@ class PostgresDatabase(Database):
                         sql,
                         {
                             "guild_id": self.guild.id,
-                            "start": timestamp_start,
-                            "end": timestamp_end,
+                            "start": start,
+                            "end": end,
                             "player_id": self.id,
                             "event_type": event_type.event_type,
                             "resolved": False,
                         },
                     ).fetchall()
 
-                events = []
-                for r in results:
-                    event = None
-                    extra_data = r[5]
-                    assert extra_data["player_id"] == self.id
-
-                    for event_class in event_classes:
-                        if r[4] == event_class.event_type:
-                            event = event_class.from_extra_data(
-                                self.parent, r[0], r[2], r[3], self.guild, extra_data
-                            )
-                            break
-
-                    assert event is not None
-                    events.append(event)
-
-                return events
+                return cast(PostgresDatabase, self.parent).decode_rows(self.guild, results)
 
         def draw_card_raw(
             self, con: Optional[Database.TransactionManager] = None
@@ -1453,32 +2303,70 @@ class PostgresDatabase(Database):
 
             return drawn_card
 
-        def reshuffle_discard(self, con: Optional[Database.TransactionManager] = None) -> None:
+        def draw_cards_bulk(
+            self, N: int, con: Optional[Database.TransactionManager] = None
+        ) -> List[Database.Creature]:
+            if N <= 0:
+                return []
+
             with self.parent.transaction(parent=con) as sub_con:
-                discard = self.get_discard(con=sub_con)
-                for creature in discard:
-                    sql = text(
-                        "DELETE FROM discard WHERE player_id = :player_id AND guild_id = :guild_id AND creature_id = :creature_id"
-                    )
-                    sub_con.execute(
-                        sql,
-                        {
-                            "player_id": self.id,
-                            "guild_id": self.guild.id,
-                            "creature_id": creature.id,
-                        },
+                # every part of the statement sees the hand as it was before, so the new
+                # positions continue after the current maximum, in the order the cards were drawn
+                sql = text(
+                    """
+                    WITH picked AS (
+                        SELECT creature_id, ROW_NUMBER() OVER (ORDER BY RANDOM()) AS draw_order
+                        FROM deck
+                        WHERE player_id = :player_id AND guild_id = :guild_id
+                        ORDER BY draw_order
+                        LIMIT :amount
+                    ),
+                    removed AS (
+                        DELETE FROM deck d
+                        USING picked p
+                        WHERE d.player_id = :player_id AND d.guild_id = :guild_id AND d.creature_id = p.creature_id
+                        RETURNING d.creature_id
+                    ),
+                    inserted AS (
+                        INSERT INTO hand (player_id, guild_id, creature_id, position)
+                        SELECT :player_id, :guild_id, r.creature_id,
+                            (SELECT COALESCE(MAX(position), -1) FROM hand WHERE player_id = :player_id AND guild_id = :guild_id)
+                            + p.draw_order
+                        FROM removed r
+                        JOIN picked p ON p.creature_id = r.creature_id
+                        RETURNING creature_id, position
                     )
-                    sql = text(
-                        "INSERT INTO deck (player_id, guild_id, creature_id) VALUES (:player_id, :guild_id, :creature_id)"
+                    SELECT i.creature_id, c.base_creature_id
+                    FROM inserted i
+                    JOIN creatures c ON i.creature_id = c.id
+                    WHERE c.guild_id = :guild_id
+                    ORDER BY i.position
+                """
+                )
+                results = sub_con.execute(
+                    sql, {"player_id": self.id, "guild_id": self.guild.id, "amount": N}
+                ).fetchall()
+                return [
+                    PostgresDatabase.Creature(
+                        self.parent, result[0], creatures[result[1]], self.guild, self
                     )
-                    sub_con.execute(
-                        sql,
-                        {
-                            "player_id": self.id,
-                            "guild_id": self.guild.id,
-                            "creature_id": creature.id,
-                        },
+                    for result in results
+                ]
+
+        def reshuffle_discard(self, con: Optional[Database.TransactionManager] = None) -> None:
+            with self.parent.transaction(parent=con) as sub_con:
+                sql = text(
+                    """
+                    WITH moved AS (
+                        DELETE FROM discard
+                        WHERE player_id = :player_id AND guild_id = :guild_id
+                        RETURNING player_id, guild_id, creature_id
                     )
+                    INSERT INTO deck (player_id, guild_id, creature_id)
+                    SELECT player_id, guild_id, creature_id FROM moved
+                """
+                )
+                sub_con.execute(sql, {"player_id": self.id, "guild_id": self.guild.id})
 
         def add_creature_to_hand(
             self,
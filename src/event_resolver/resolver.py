@@ -34,11 +34,12 @@ async def listen_to_notifications(
         Callable[[str, str, str, str], Coroutine[None, None, None]],
     ],
     keep_alive: KeepAlive = KeepAlive(),
+    channel: str = "event_insert",
 ) -> None:
     url = get_db_url(db)
 
     conn = await asyncpg.connect(url)
-    await conn.add_listener("event_insert", handler)
+    await conn.add_listener(channel, handler)
     try:
         while keep_alive.keep_alive:
             await asyncio.sleep(1)
@@ -50,16 +51,54 @@ def add_notification_function(db: PostgresDatabase) -> None:
     with db.transaction(parent=None) as sub_con:
         sql = text(
             """
-CREATE FUNCTION notify_event_insert() RETURNS trigger AS $$
+CREATE OR REPLACE FUNCTION notify_event_insert() RETURNS trigger AS $$
 BEGIN
-    PERFORM pg_notify('event_insert', NEW.id::text);
+    PERFORM pg_notify('event_insert', NEW.guild_id::text || ':' || NEW.id::text);
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER event_insert_trigger
+CREATE OR REPLACE TRIGGER event_insert_trigger
 AFTER INSERT ON events
 FOR EACH ROW
 EXECUTE FUNCTION notify_event_insert();"""
         )
         sub_con.execute(sql)
+
+
+def add_config_notification_function(db: PostgresDatabase) -> None:
+    with db.transaction(parent=None) as sub_con:
+        sql = text(
+            """
+CREATE OR REPLACE FUNCTION notify_guild_config() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('guild_config', OLD.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER guild_config_trigger
+AFTER UPDATE OF config OR DELETE ON guilds
+FOR EACH ROW
+EXECUTE FUNCTION notify_guild_config();"""
+        )
+        sub_con.execute(sql)
+
+
+def add_player_notification_function(db: PostgresDatabase) -> None:
+    with db.transaction(parent=None) as sub_con:
+        sql = text(
+            """
+CREATE OR REPLACE FUNCTION notify_player_remove() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('player_remove', OLD.guild_id::text || ':' || OLD.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER player_remove_trigger
+AFTER DELETE ON players
+FOR EACH ROW
+EXECUTE FUNCTION notify_player_remove();"""
+        )
+        sub_con.execute(sql)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+from typing import List, Tuple, Optional
+import time
+import heapq
+import asyncio
+
+
+class EventScheduler:
+    """Min-heap of the next due event timestamp per guild.
+
+    schedule() only ever moves a guild's due time earlier. Entries that were superseded by an
+    earlier one stay in the heap and are skipped when they surface.
+    """
+
+    def __init__(self) -> None:
+        self.heap: List[Tuple[float, int]] = []
+        self.next_due: dict[int, float] = {}
+        self.changed = asyncio.Event()
+
+    def schedule(self, guild_id: int, timestamp: float) -> None:
+        current = self.next_due.get(guild_id)
+        if current is not None and current <= timestamp:
+            return
+
+        self.next_due[guild_id] = timestamp
+        heapq.heappush(self.heap, (timestamp, guild_id))
+        self.changed.set()
+
+    def next_timestamp(self) -> Optional[float]:
+        while self.heap:
+            timestamp, guild_id = self.heap[0]
+            if self.next_due.get(guild_id) == timestamp:
+                return timestamp
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, now: float) -> List[int]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            timestamp, guild_id = heapq.heappop(self.heap)
+            if self.next_due.get(guild_id) != timestamp:
+                continue
+
+            del self.next_due[guild_id]
+            due.append(guild_id)
+        return due
+
+    async def wait(self, max_wait: float) -> None:
+        """Sleeps until the next guild is due, an earlier one gets scheduled or max_wait passed."""
+        next_timestamp = self.next_timestamp()
+        timeout = max_wait
+        if next_timestamp is not None:
+            timeout = min(max_wait, max(0.0, next_timestamp - time.time()))
+
+        self.changed.clear()
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
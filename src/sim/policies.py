@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import random
+from typing import List, Optional, Any, TYPE_CHECKING
+
+from src.core.base_types import Resource, Price, Selected
+from src.database.database import Database
+from src.definitions.extra_data import Choice, EXTRA_DATA
+from src.definitions.creatures import SimpleCreature
+
+if TYPE_CHECKING:
+    from src.sim.simulation import Simulation
+
+
+def quest_price(creature: Database.Creature, region: Database.Region) -> Optional[List[Price]]:
+    """What playing the creature to the region costs, None if the creature can not quest.
+
+    Only the fixed prices are known up front, special abilities may still ask for more.
+    """
+    price = [Price(Resource.ORDERS, 1)]
+    if isinstance(creature.creature, SimpleCreature):
+        creature_price = creature.creature.quest_price()
+        if creature_price is None:
+            return None
+        price += creature_price
+
+    region_price: Any = getattr(region.region, "quest_price", None)
+    if region_price is not None:
+        price += region_price()
+    return price
+
+
+def campaign_price(creature: Database.Creature) -> Optional[List[Price]]:
+    """What campaigning the creature costs, None if it can not campaign."""
+    if isinstance(creature.creature, SimpleCreature):
+        return creature.creature.campaign_price()
+    return []
+
+
+class Policy:
+    """Decides what a bot player does in a simulation step."""
+
+    def act(self, sim: Simulation, player_db: Database.Player) -> None:
+        pass
+
+    def choose(
+        self,
+        sim: Simulation,
+        player_db: Database.Player,
+        choice: Choice,
+        options: List[Selected],
+        taken: List[int],
+    ) -> Selected:
+        free = [o for o in options if o.value() not in taken]
+        return random.choice(free if free != [] else options)
+
+
+class RandomPolicy(Policy):
+    """Does one legal thing it can afford, picked at random, or nothing every so often."""
+
+    def __init__(self, idle: float = 0.2):
+        self.idle = idle
+
+    def act(self, sim: Simulation, player_db: Database.Player) -> None:
+        if random.random() < self.idle:
+            return
+
+        actions = [self.play, self.campaign, self.claim, self.roll]
+        random.shuffle(actions)
+        for action in actions:
+            if action(sim, player_db):
+                return
+
+    def play(self, sim: Simulation, player_db: Database.Player) -> bool:
+        if not player_db.has(Resource.ORDERS, 1):
+            return False
+
+        free = [s.region for s in sim.guild_db.get_region_states() if s.occupant is None]
+        moves = [
+            (creature, region)
+            for creature in player_db.get_hand()
+            for region in free
+            if region.region.category in creature.creature.quest_region_categories
+            and self.affords(player_db, quest_price(creature, region))
+        ]
+        if moves == []:
+            return False
+
+        creature, region = random.choice(moves)
+        return sim.perform(
+            "play",
+            player_db,
+            self,
+            lambda con, extra_data: player_db.play_creature_to_region(
+                creature, region, con=con, extra_data=extra_data
+            ),
+            in_use=[creature.id],
+        )
+
+    def campaign(self, sim: Simulation, player_db: Database.Player) -> bool:
+        hand = [c for c in player_db.get_hand() if self.affords(player_db, campaign_price(c))]
+        if hand == []:
+            return False
+
+        creature = random.choice(hand)
+        return sim.perform(
+            "campaign",
+            player_db,
+            self,
+            lambda con, extra_data: player_db.play_creature_to_campaign(
+                creature, con=con, extra_data=extra_data
+            ),
+            in_use=[creature.id],
+        )
+
+    def affords(self, player_db: Database.Player, price: Optional[List[Price]]) -> bool:
+        return price is not None and player_db.fulfills_price(price)
+
+    def claim(self, sim: Simulation, player_db: Database.Player) -> bool:
+        now = sim.clock.time()
+        claimable = [
+            f
+            for f in sim.guild_db.get_free_creatures()
+            if (f.channel_id, f.message_id) not in sim.claimed
+            and not f.is_expired(now)
+            and (f.roller_id == player_db.id or not f.is_protected(now))
+            and player_db.has(Resource.RALLY, f.creature.claim_cost)
+        ]
+        if claimable == []:
+            return False
+
+        free_creature = random.choice(claimable)
+        claimed = sim.perform(
+            "claim",
+            player_db,
+            self,
+            lambda con, extra_data: free_creature.claim(now, player_db, con=con),
+        )
+        if claimed:
+            sim.claimed.add((free_creature.channel_id, free_creature.message_id))
+        return claimed
+
+    def roll(self, sim: Simulation, player_db: Database.Player) -> bool:
+        if not player_db.has(Resource.MAGIC, 1):
+            return False
+
+        def roll(con: Database.TransactionManager, extra_data: EXTRA_DATA) -> None:
+            creature = sim.guild_db.roll_creature(con=con)
+            player_db.pay_price([Price(Resource.MAGIC, 1)], con=con)
+            free_creature = sim.guild_db.add_free_creature(
+                creature, 0, sim.next_message_id(), player_db, con=con
+            )
+            free_creature.create_events(con=con)
+
+        return sim.perform("roll", player_db, self, roll)
+
+
+class CampaignPolicy(RandomPolicy):
+    """Only ever campaigns, the cheapest way to keep a player busy."""
+
+    def act(self, sim: Simulation, player_db: Database.Player) -> None:
+        self.campaign(sim, player_db)
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import copy
+import time
+import random
+import itertools
+from collections import defaultdict
+from typing import List, Tuple, Optional, Any, Callable, NamedTuple, TYPE_CHECKING
+
+from discord.ext import commands
+from sqlalchemy import event
+
+from src.database.database import Database
+from src.database.postgres import PostgresDatabase
+from src.definitions.extra_data import EXTRA_DATA, MissingExtraData
+
+if TYPE_CHECKING:
+    from src.sim.policies import Policy
+
+# how often a single action may ask for another choice before the player gives up
+MAX_CHOICES = 5
+
+
+class VirtualClock:
+    """Game time of a simulation, it only moves when the simulation advances it."""
+
+    def __init__(self, start: float):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class QueryCounter:
+    """Counts the statements a postgres backend sends, including the id allocator's."""
+
+    def __init__(self, db: PostgresDatabase):
+        self.engine = db.engine
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self.before_cursor_execute)
+
+    def before_cursor_execute(self, *args: Any) -> None:
+        self.count += 1
+
+    def close(self) -> None:
+        event.remove(self.engine, "before_cursor_execute", self.before_cursor_execute)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class OperationReport(NamedTuple):
+    operation: str
+    calls: int
+    # calls the game refused, like playing without orders
+    refused: int
+    # calls that raised anything else, the bot would only log those
+    errors: int
+    p50_ms: float
+    p99_ms: float
+    # None if the backend does not send queries
+    queries_per_call: Optional[float]
+
+    def succeeded(self) -> int:
+        return self.calls - self.refused - self.errors
+
+
+class Report(NamedTuple):
+    backend: str
+    players: int
+    steps: int
+    # actions that went through, only these count towards the throughput
+    actions: int
+    # actions the game refused or that raised
+    failed_actions: int
+    # events whose resolve raised
+    event_errors: int
+    seconds: float
+    queries_per_action: Optional[float]
+    operations: List[OperationReport]
+
+    def actions_per_second(self) -> float:
+        return self.actions / self.seconds if self.seconds > 0 else 0.0
+
+    def text(self) -> str:
+        queries = "-" if self.queries_per_action is None else f"{self.queries_per_action:.1f}"
+        lines = [
+            f"{self.backend}: {self.players} players, {self.steps} steps, {self.actions} actions"
+            f" ({self.failed_actions} failed) in {self.seconds:.2f}s,"
+            f" {self.actions_per_second():.0f} actions/s, {queries} queries/action,"
+            f" {self.event_errors} events failed to resolve",
+            f"{'operation':>20} {'calls':>8} {'refused':>8} {'errors':>8} {'p50':>10} {'p99':>10}"
+            f" {'queries':>8}",
+        ]
+        for o in self.operations:
+            queries = "-" if o.queries_per_call is None else f"{o.queries_per_call:.1f}"
+            lines.append(
+                f"{o.operation:>20} {o.calls:>8} {o.refused:>8} {o.errors:>8} {o.p50_ms:>8.2f}ms"
+                f" {o.p99_ms:>8.2f}ms {queries:>8}"
+            )
+        return "\n".join(lines)
+
+
+class Simulation:
+    """Plays one guild with bot players on any Database backend, without discord.
+
+    Every step moves the virtual clock forward, resolves the events that are due through
+    their own resolve methods like the event handler does, then lets every player act once.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        policies: List[Policy],
+        guild_id: int = 1,
+        step: float = 600.0,
+        seed: Optional[int] = None,
+    ):
+        self.db = db
+        self.policies = policies
+        self.guild_id = guild_id
+        self.step = step
+
+        # drawing and rolling use the module level random, so a seed reseeds it for the whole
+        # process until close puts the previous state back
+        self.random_state = random.getstate() if seed is not None else None
+        if seed is not None:
+            random.seed(seed)
+
+        self.clock = VirtualClock(time.time())
+        self.real_clock = db.clock
+        db.clock = self.clock.time
+        self.queries = QueryCounter(db) if isinstance(db, PostgresDatabase) else None
+
+        self.message_ids = itertools.count(1)
+        # claimed free creatures stay in the guild, the bot takes away their claim button
+        self.claimed: set[Tuple[int, int]] = set()
+        self.steps = 0
+        self.seconds = 0.0
+        # operation -> (wall time in seconds, queries, outcome) of every call
+        self.samples: dict[str, List[Tuple[float, int, str]]] = defaultdict(list)
+        self.actions: set[str] = set()
+        self.event_errors = 0
+
+        self.guild_db = cast_guild(self.timed("add_guild", lambda: db.add_guild(guild_id)))
+        players = self.timed(
+            "add_players",
+            lambda: self.guild_db.add_players(list(range(1, len(policies) + 1))),
+        )
+        self.players: List[Tuple[Database.Player, Policy]] = list(zip(players, policies))
+
+    def query_count(self) -> int:
+        return self.queries.count if self.queries is not None else 0
+
+    def timed(self, operation: str, f: Callable[[], Any]) -> Any:
+        """Runs f and records how long it took and how it ended, errors are raised again."""
+        queries = self.query_count()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = f()
+            outcome = "ok"
+            return result
+        except commands.UserInputError:
+            outcome = "refused"
+            raise
+        finally:
+            self.samples[operation].append(
+                (time.perf_counter() - start, self.query_count() - queries, outcome)
+            )
+
+    def perform(
+        self,
+        operation: str,
+        player_db: Database.Player,
+        policy: Policy,
+        f: Callable[[Database.TransactionManager, EXTRA_DATA], Any],
+        in_use: List[int] = [],
+    ) -> bool:
+        """One player action in its own transaction, returns whether it went through.
+
+        Choices the action asks for are answered by the policy and the action is retried,
+        like a player answering /choose. The policy is told which values are already taken,
+        in_use and whatever it picked before, like the creature that is being played. Like the
+        bot's command errors any exception only fails the action, the report counts them.
+        """
+        self.actions.add(operation)
+
+        def attempt() -> None:
+            extra_data: EXTRA_DATA = []
+            for i in range(MAX_CHOICES + 1):
+                try:
+                    with self.db.transaction() as con:
+                        f(con, [copy.copy(x) for x in extra_data])
+                    return
+                except MissingExtraData as e:
+                    options = e.choice.get_options(player_db, None)
+                    if options == [] or i == MAX_CHOICES:
+                        raise
+                    taken = in_use + [x.value() for x in extra_data]
+                    selected = policy.choose(self, player_db, e.choice, options, taken)
+                    extra_data.append(
+                        e.choice.select_option(player_db, e.choice, selected.value(), None)
+                    )
+
+        try:
+            self.timed(operation, attempt)
+            return True
+        except Exception:
+            return False
+
+    def resolve_due(self) -> None:
+        """Resolves every due event of the guild in one transaction, in the order of their ids.
+
+        An event that fails to resolve stays unresolved, the same as in the event handler.
+        """
+        with self.db.transaction() as con:
+            events = sorted(
+                self.guild_db.get_events(0, self.clock.time(), also_resolved=False, con=con),
+                key=lambda x: x.id,
+            )
+            for e in events:
+                try:
+                    e.resolve(con=con)
+                    self.guild_db.mark_event_as_resolved(e, con=con)
+                except Exception:
+                    self.event_errors += 1
+
+    def run(self, steps: int) -> Report:
+        start = time.perf_counter()
+        for _ in range(steps):
+            self.clock.advance(self.step)
+            self.timed("resolve", self.resolve_due)
+            for player_db, policy in self.players:
+                policy.act(self, player_db)
+            self.steps += 1
+        self.seconds += time.perf_counter() - start
+        return self.report()
+
+    def close(self) -> None:
+        """Gives the database its own clock back, the guild is left as it is."""
+        self.db.clock = self.real_clock
+        if self.random_state is not None:
+            random.setstate(self.random_state)
+        if self.queries is not None:
+            self.queries.close()
+
+    def next_message_id(self) -> int:
+        """Free creatures are keyed by message, every roll gets a message of its own."""
+        return next(self.message_ids)
+
+    def report(self) -> Report:
+        operations = [
+            OperationReport(
+                operation,
+                len(samples),
+                sum(1 for _, _, outcome in samples if outcome == "refused"),
+                sum(1 for _, _, outcome in samples if outcome == "error"),
+                percentile([s for s, _, _ in samples], 0.5) * 1000,
+                percentile([s for s, _, _ in samples], 0.99) * 1000,
+                (None if self.queries is None else sum(q for _, q, _ in samples) / len(samples)),
+            )
+            for operation, samples in sorted(self.samples.items())
+        ]
+        calls = [s for operation in self.actions for s in self.samples[operation]]
+        actions = [s for s in calls if s[2] == "ok"]
+        return Report(
+            type(self.db).__name__,
+            len(self.players),
+            self.steps,
+            len(actions),
+            len(calls) - len(actions),
+            self.event_errors,
+            self.seconds,
+            (
+                None
+                if self.queries is None or actions == []
+                else sum(q for _, q, _ in actions) / len(actions)
+            ),
+            operations,
+        )
+
+
+def cast_guild(guild_db: Any) -> Database.Guild:
+    assert isinstance(guild_db, Database.Guild)
+    return guild_db
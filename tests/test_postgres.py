@@ -14,6 +14,7 @@ from typing import (
     Any,
 )
 
+import pytest
 import sqlalchemy
 from testcontainers.postgres import PostgresContainer  # type: ignore
 
@@ -33,6 +34,9 @@ from src.core.exceptions import (
 from src.definitions.start_condition import start_condition
 from src.database.database import Database
 from src.database.postgres import PostgresDatabase
+from src.database.memory import InMemoryDatabase
+from src.sim.simulation import Simulation
+from src.sim.policies import RandomPolicy, CampaignPolicy
 from src.definitions.creatures import *
 from src.definitions.regions import *
 
@@ -84,9 +88,14 @@ engine = sqlalchemy.create_engine(postgres.get_connection_url())
 start_condition = copy.deepcopy(start_condition)
 start_condition.start_deck = [Spy() for i in range(10)]
 test_db = PostgresDatabase(start_condition, engine)
+memory_db = InMemoryDatabase(start_condition)
 
+# tests that only go through the Database api run against every backend
+backends = pytest.mark.parametrize("test_db", [test_db, memory_db], ids=["postgres", "memory"])
 
-def test_guild_creation() -> None:
+
+@backends
+def test_guild_creation(test_db: Database) -> None:
     guild_db: Database.Guild = test_db.add_guild(1)
 
     try:
@@ -108,7 +117,8 @@ def test_guild_creation() -> None:
         assert test_db.get_guilds() == []
 
 
-def test_guild_config() -> None:
+@backends
+def test_guild_config(test_db: Database) -> None:
     guild_db: Database.Guild = test_db.add_guild(1)
 
     try:
@@ -135,7 +145,8 @@ def test_guild_config() -> None:
         assert test_db.get_guilds() == []
 
 
-def test_player_creation() -> None:
+@backends
+def test_player_creation(test_db: Database) -> None:
     guild_db: Database.Guild = test_db.add_guild(1)
 
     try:
@@ -609,7 +620,8 @@ def test_claim() -> None:
         assert test_db.get_guilds() == []
 
 
-def test_recharge() -> None:
+@backends
+def test_recharge(test_db: Database) -> None:
     guild_db: Database.Guild = test_db.add_guild(1)
 
     try:
@@ -700,7 +712,80 @@ def test_recharge() -> None:
         assert test_db.get_guilds() == []
 
 
-def test_rollback() -> None:
+def test_fresh_ids() -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        # a second database object behaves like another bot process on the same tables
+        other_db = PostgresDatabase(start_condition, engine, id_block_size=3)
+        other_guild_db = other_db.get_guild(guild_db.id)
+
+        ids = [test_db.fresh_event_id(guild_db) for _ in range(10)]
+        ids += [other_db.fresh_event_id(other_guild_db) for _ in range(10)]
+        ids += [test_db.fresh_event_id(guild_db) for _ in range(200)]
+        assert len(set(ids)) == len(ids)
+
+        existing = [e.id for e in guild_db.get_events(0, time.time() * 2)]
+        assert set(ids).isdisjoint(existing)
+
+        creature_ids = [guild_db.fresh_creature_id() for _ in range(5)]
+        creature_ids += [other_guild_db.fresh_creature_id() for _ in range(5)]
+        assert len(set(creature_ids)) == len(creature_ids)
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_transaction_events(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db = guild_db.add_player(1)
+
+        def gain_event(con: Database.TransactionManager) -> Event:
+            return Database.Player.PlayerGainEvent(
+                test_db,
+                test_db.fresh_event_id(guild_db),
+                time.time(),
+                None,
+                guild_db,
+                player_db.id,
+                [],
+            )
+
+        with test_db.transaction() as con:
+            first = gain_event(con)
+            con.add_event(first)
+
+            with test_db.transaction(parent=con) as child:
+                with test_db.transaction(parent=child) as grandchild:
+                    second = gain_event(grandchild)
+                    grandchild.add_event(second)
+
+                    assert second.parent_event_id == first.id
+                    assert grandchild.get_events() == [first, second]
+                    assert grandchild.event_count() == 2
+
+                third = gain_event(child)
+                child.add_event(third)
+
+            assert third.parent_event_id == first.id
+            assert con.get_events() == [first, second, third]
+            assert con.event_count() == 3
+
+        stored = events_by_type(guild_db, Database.Player.PlayerGainEvent)
+        assert is_subset([first, second, third], cast(List[Event], stored))
+        assert [e.parent_event_id for e in stored if e in [second, third]] == [first.id] * 2
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_rollback(test_db: Database) -> None:
     guild_db1: Database.Guild = test_db.add_guild(1)
     guild_db2: Database.Guild = test_db.add_guild(2)
 
@@ -736,7 +821,9 @@ def event_handler_factory(
 ) -> Callable[[Any, Any, Any, str], None]:
     def event_handler(connection: Any, pid: Any, channel: Any, payload: str) -> None:
         with guild_db.parent.transaction() as con:
-            event = guild_db.get_event_by_id(int(payload), con=con)
+            guild_id, event_id = (int(i) for i in payload.split(":"))
+            assert guild_id == guild_db.id
+            event = guild_db.get_event_by_id(event_id, con=con)
             events.append(event)
             guild_db.mark_event_as_resolved(event, con=con)
 
@@ -807,3 +894,851 @@ def test_event_resolver() -> None:
     finally:
         test_db.remove_guild(guild_db)
         assert test_db.get_guilds() == []
+
+
+from src.database.async_postgres import AsyncPostgresDatabase
+from src.event_resolver.resolver import get_db_url
+
+
+async def async_reads_test(guild_db: Database.Guild, player_db: Database.Player) -> None:
+    async_db = await AsyncPostgresDatabase.connect(test_db, get_db_url(test_db))
+
+    try:
+        assert await async_db.get_guilds() == [AsyncPostgresDatabase.Guild(async_db, guild_db.id)]
+
+        try:
+            await async_db.get_guild(guild_db.id + 1)
+            assert False
+        except GuildNotFound:
+            pass
+
+        async with async_db.transaction() as con:
+            async_guild_db = await async_db.get_guild(guild_db.id, con=con)
+            assert await async_guild_db.get_config(con=con) == guild_db.get_config()
+
+            regions = await async_guild_db.get_regions(con=con)
+            assert [r.sync() for r in regions] == guild_db.get_regions()
+            assert [await r.occupied(con=con) for r in regions] == [
+                r.occupied() for r in guild_db.get_regions()
+            ]
+            assert await async_guild_db.get_region_states(con=con) == guild_db.get_region_states()
+
+            async_player_db = await async_guild_db.get_player(player_db.id, con=con)
+            assert async_player_db.sync() == player_db
+            assert await async_player_db.get_resources(con=con) == player_db.get_resources()
+            assert await async_player_db.get_hand(con=con) == player_db.get_hand()
+            assert await async_player_db.get_deck(con=con) == player_db.get_deck()
+
+            assert are_subsets(
+                await async_guild_db.get_events(0, time.time() * 2, con=con),
+                guild_db.get_events(0, time.time() * 2),
+            )
+            recharges = await async_player_db.get_recharges(con=con)
+            assert recharges == player_db.get_recharges()
+
+            try:
+                await async_guild_db.get_player(player_db.id + 1, con=con)
+                assert False
+            except PlayerNotFound:
+                pass
+
+    finally:
+        await async_db.close()
+
+
+def test_async_reads() -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db = guild_db.add_player(1)
+        asyncio.run(async_reads_test(guild_db, player_db))
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+from src.database.offload import OffloadDatabase
+
+
+async def offload_test(offload: OffloadDatabase, guild_db: Database.Guild) -> None:
+    players = await asyncio.gather(*[offload.run(guild_db.add_player, i) for i in range(1, 9)])
+    assert are_subsets(guild_db.get_players(), list(players))
+
+    def remove_and_fail(con: Database.TransactionManager) -> None:
+        guild_db.remove_player(players[0], con=con)
+        guild_db.get_player(-1, con=con)
+
+    try:
+        await offload.transact(remove_and_fail)
+        assert False
+    except PlayerNotFound:
+        pass
+
+    assert guild_db.get_player(players[0].id) == players[0]
+
+
+def test_offload() -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+    offload = OffloadDatabase(test_db, workers=2)
+
+    try:
+        asyncio.run(offload_test(offload, guild_db))
+
+        stats = offload.stats()
+        assert stats.workers == 2
+        assert stats.queued == 0 and stats.running == 0
+        assert stats.completed == 9
+        assert stats.max_queued > 2
+        assert stats.max_wait >= stats.mean_wait > 0
+
+    finally:
+        offload.shutdown()
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+from src.event_resolver.resolver import (
+    add_config_notification_function,
+    add_player_notification_function,
+)
+
+
+async def config_notification_test(
+    guild_db: Database.Guild, other_guild_db: Database.Guild
+) -> None:
+    keep_alive = KeepAlive()
+
+    def invalidate(connection: Any, pid: Any, channel: Any, payload: str) -> None:
+        test_db.config_cache.invalidate(int(payload))
+
+    listener_task = asyncio.create_task(
+        listen_to_notifications(test_db, invalidate, keep_alive=keep_alive, channel="guild_config")
+    )
+    await asyncio.sleep(1)
+
+    config = other_guild_db.get_config()
+    config["max_orders"] = 7
+    other_guild_db.set_config(config)
+
+    await asyncio.sleep(1)
+    keep_alive.stop()
+    await listener_task
+
+
+def test_config_cache() -> None:
+    add_config_notification_function(test_db)
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        config = guild_db.get_typed_config()
+        assert config == Database.GuildConfig.from_dict(start_condition.start_config)
+        assert guild_db.get_typed_config() is config
+
+        # changes are visible inside the writing transaction and dropped on rollback
+        try:
+            with test_db.transaction() as con:
+                raw_config = guild_db.get_config(con=con)
+                raw_config["max_orders"] = 10
+                guild_db.set_config(raw_config, con=con)
+                assert guild_db.get_typed_config(con=con).max_orders == 10
+                test_db.get_guild(-1, con=con)
+        except GuildNotFound:
+            pass
+
+        assert guild_db.get_typed_config().max_orders == config.max_orders
+
+        raw_config = guild_db.get_config()
+        raw_config["max_orders"] = 10
+        guild_db.set_config(raw_config)
+        assert guild_db.get_typed_config().max_orders == 10
+
+        # a second database object behaves like another bot process
+        other_db = PostgresDatabase(start_condition, engine)
+        asyncio.run(config_notification_test(guild_db, other_db.get_guild(guild_db.id)))
+        assert guild_db.get_typed_config().max_orders == 7
+        assert guild_db.get_config()["max_orders"] == 7
+
+        # a config stored before a field existed gets the start value for it
+        raw_config = guild_db.get_config()
+        del raw_config["conflict_duration"]
+        guild_db.set_config(raw_config)
+        duration = start_condition.start_config["conflict_duration"]
+        assert guild_db.get_typed_config().conflict_duration == duration
+        assert guild_db.add_player(1).snapshot().config.conflict_duration == duration
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+async def player_notification_test(other_guild_db: Database.Guild, player_id: int) -> None:
+    keep_alive = KeepAlive()
+
+    def invalidate(connection: Any, pid: Any, channel: Any, payload: str) -> None:
+        guild_id, player_id = (int(i) for i in payload.split(":"))
+        test_db.existence_cache.invalidate(guild_id, [player_id])
+
+    listener_task = asyncio.create_task(
+        listen_to_notifications(test_db, invalidate, keep_alive=keep_alive, channel="player_remove")
+    )
+    await asyncio.sleep(1)
+
+    other_guild_db.remove_player(other_guild_db.get_player(player_id))
+
+    await asyncio.sleep(1)
+    keep_alive.stop()
+    await listener_task
+
+
+def test_existence_cache() -> None:
+    add_player_notification_function(test_db)
+    cache = test_db.existence_cache
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db1, player_db2 = guild_db.add_players([1, 2])
+
+        generation = cache.generation()
+        cache.put_guild(guild_db.id, generation)
+        cache.put_player(guild_db.id, player_db1.id, generation)
+        cache.put_player(guild_db.id, player_db2.id, generation)
+        assert cache.has_guild(guild_db.id) and cache.has_player(guild_db.id, player_db1.id)
+
+        guild_db.remove_player(player_db1)
+        assert not cache.has_player(guild_db.id, player_db1.id)
+        assert cache.has_guild(guild_db.id) and cache.has_player(guild_db.id, player_db2.id)
+
+        # a lookup that started before the removal does not bring the player back
+        cache.put_player(guild_db.id, player_db1.id, generation)
+        assert not cache.has_player(guild_db.id, player_db1.id)
+
+        # a second database object behaves like another bot process
+        cache.put_player(guild_db.id, player_db2.id, cache.generation())
+        other_db = PostgresDatabase(start_condition, engine)
+        asyncio.run(player_notification_test(other_db.get_guild(guild_db.id), player_db2.id))
+        assert not cache.has_player(guild_db.id, player_db2.id)
+        assert cache.has_guild(guild_db.id)
+
+        test_db.remove_guild(guild_db)
+        assert not cache.has_guild(guild_db.id)
+        assert not cache.has_player(guild_db.id, player_db2.id)
+
+    finally:
+        if test_db.get_guilds() != []:
+            test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+from src.event_resolver.scheduler import EventScheduler
+
+
+@backends
+def test_event_schedule(test_db: Database) -> None:
+    guild_db1: Database.Guild = test_db.add_guild(1)
+    guild_db2: Database.Guild = test_db.add_guild(2)
+
+    try:
+        guild_db1.add_player(1)
+        guild_db2.add_player(1)
+
+        unresolved = guild_db1.get_events(0, time.time() * 2, also_resolved=False)
+        next_timestamps = test_db.get_next_event_timestamps()
+        assert next_timestamps[guild_db1.id] == min(e.timestamp for e in unresolved)
+        assert test_db.get_next_event_timestamps([guild_db2.id]).keys() == {guild_db2.id}
+
+        for e in unresolved:
+            guild_db1.mark_event_as_resolved(e)
+        assert guild_db1.id not in test_db.get_next_event_timestamps()
+
+        unresolved = guild_db2.get_events(0, time.time() * 2, also_resolved=False)
+        keys = [(guild_db2.id, e.id) for e in unresolved]
+        assert (guild_db2.id, unresolved[0].timestamp) in test_db.get_event_timestamps(keys)
+        # ids are only unique within a guild, the other guild must not show up
+        assert {g for g, _ in test_db.get_event_timestamps(keys)} == {guild_db2.id}
+        assert test_db.get_event_players(keys) == [(guild_db2.id, 1)]
+
+        scheduler = EventScheduler()
+        for guild_id, timestamp in next_timestamps.items():
+            scheduler.schedule(guild_id, timestamp)
+        scheduler.schedule(guild_db2.id, next_timestamps[guild_db2.id] + 100)
+
+        first = min(next_timestamps.values())
+        assert scheduler.next_timestamp() == first
+        assert scheduler.pop_due(first - 1) == []
+        assert sorted(scheduler.pop_due(max(next_timestamps.values()))) == [1, 2]
+        assert scheduler.next_timestamp() is None
+
+        scheduler.schedule(guild_db1.id, 20)
+        scheduler.schedule(guild_db1.id, 10)
+        assert scheduler.pop_due(15) == [guild_db1.id]
+        assert scheduler.pop_due(30) == []
+
+    finally:
+        test_db.remove_guild(guild_db1)
+        test_db.remove_guild(guild_db2)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_reshuffle_discard(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db: Database.Player = guild_db.add_player(1)
+        deck = player_db.get_deck()
+
+        for creature in deck:
+            player_db.remove_creature_from_deck(creature)
+            player_db.add_to_discard(creature)
+        assert player_db.get_deck() == []
+
+        player_db.reshuffle_discard()
+        assert player_db.get_discard() == []
+        assert sorted(c.id for c in player_db.get_deck()) == sorted(c.id for c in deck)
+
+        # an empty discard leaves the deck alone
+        player_db.reshuffle_discard()
+        assert len(player_db.get_deck()) == len(deck)
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+def test_draw_cards_bulk() -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db: Database.Player = guild_db.add_player(1)
+        deck = player_db.get_deck()
+        hand = player_db.get_hand()
+
+        drawn = player_db.draw_cards_bulk(2)
+        assert len(drawn) == 2
+        assert len(player_db.get_deck()) == len(deck) - 2
+        assert sorted(c.id for c in player_db.get_hand()) == sorted(c.id for c in hand + drawn)
+
+        rest = player_db.draw_cards_bulk(len(deck))
+        assert sorted(c.id for c in drawn + rest) == sorted(c.id for c in deck)
+        assert player_db.get_deck() == []
+        assert player_db.draw_cards_bulk(1) == []
+
+        # drawn cards are appended to the hand in order
+        with test_db.engine.begin() as con:
+            positions = con.execute(
+                sqlalchemy.text(
+                    "SELECT creature_id FROM hand WHERE player_id = :player_id AND guild_id = :guild_id ORDER BY position"
+                ),
+                {"player_id": player_db.id, "guild_id": guild_db.id},
+            ).fetchall()
+        assert [p[0] for p in positions][len(hand) :] == [c.id for c in drawn + rest]
+
+        # the hand keeps the order the cards were drawn in, not the order of their ids
+        for _ in range(30):
+            player_db.add_to_discard(guild_db.add_creature(Servant(), player_db))
+        player_db.reshuffle_discard()
+        shuffled = [c.id for c in player_db.draw_cards_bulk(30)]
+        assert len(shuffled) == 30 and shuffled != sorted(shuffled)
+        assert [c.id for c in player_db.get_hand()][-30:] == shuffled
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_change_resources(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db: Database.Player = guild_db.add_player(1)
+
+        player_db.set_resources(dict.fromkeys(BaseResources, 3))
+        resources = player_db.get_resources()
+        assert all(resources[res] == 3 for res in BaseResources)
+
+        assert player_db.change_resources({Resource.GOLD: 2, Resource.MAGIC: -3}) == {
+            Resource.GOLD: 5,
+            Resource.MAGIC: 0,
+        }
+
+        # one missing resource fails the whole change
+        try:
+            player_db.change_resources({Resource.GOLD: -1, Resource.MAGIC: -1})
+            assert False
+        except NotEnoughResourcesException:
+            pass
+        assert player_db.get_resources()[Resource.GOLD] == 5
+
+        player_db.pay_price([Price(Resource.GOLD, 2), Price(Resource.GOLD, 3)])
+        assert player_db.get_resources()[Resource.GOLD] == 0
+        player_db.gain([Gain(Resource.INTEL, 4), Gain(Resource.RALLY, 1)])
+        assert player_db.get_resources()[Resource.INTEL] == 7
+        assert player_db.get_resources()[Resource.RALLY] == 4
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+def test_wide_resources() -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        players = [guild_db.add_player(i) for i in range(1, 4)]
+        for i, player in enumerate(players):
+            player.set_resources(dict.fromkeys(BaseResources, i + 1))
+
+        wide_db = PostgresDatabase(start_condition, engine, wide_resources=True)
+        wide_guild_db = wide_db.get_guild(guild_db.id)
+        wide_player1 = wide_guild_db.get_player(1)
+
+        # the first access copies the player over
+        assert wide_player1.get_resources() == players[0].get_resources()
+        wide_player1.give(Resource.GOLD, 4)
+        assert wide_player1.has(Resource.GOLD, 5) and not wide_player1.has(Resource.GOLD, 6)
+
+        try:
+            wide_player1.pay_price([Price(Resource.GOLD, 1), Price(Resource.MAGIC, 2)])
+            assert False
+        except NotEnoughResourcesException:
+            pass
+        assert wide_player1.get_resources()[Resource.GOLD] == 5
+
+        assert wide_db.migrate_resources(batch_size=1) == 2
+        assert wide_db.migrate_resources() == 0
+        assert wide_guild_db.get_player(3).get_resources() == dict.fromkeys(BaseResources, 3)
+
+        # new players start with the same purse in both layouts
+        wide_player4 = wide_guild_db.add_player(4)
+        assert wide_player4.get_resources() == guild_db.add_player(5).get_resources()
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_add_players(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        single = guild_db.add_player(1)
+        players = guild_db.add_players([2, 3, 4])
+        assert [p.id for p in guild_db.get_players()] == [1, 2, 3, 4]
+
+        for player in players:
+            assert sorted(
+                [c.creature for c in player.get_deck() + player.get_hand()], key=str
+            ) == sorted(start_condition.start_deck, key=str)
+            assert player.get_resources() == single.get_resources()
+            assert len(player.get_hand()) == len(single.get_hand())
+            assert sorted(player.get_recharges().keys()) == sorted(single.get_recharges().keys())
+
+        added = events_by_type(guild_db, Database.Guild.PlayerAddedEvent)
+        assert sorted(e.player_id for e in added) == [1, 2, 3, 4]
+
+        creature_ids = [c.id for c in guild_db.get_creatures()]
+        assert len(set(creature_ids)) == len(creature_ids) == 4 * len(start_condition.start_deck)
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_region_states(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db = guild_db.add_player(1)
+        regions = sorted(guild_db.get_regions(), key=lambda x: x.id)
+        creature = player_db.get_deck()[0]
+        regions[0].occupy(creature)
+
+        states = guild_db.get_region_states()
+        assert [state.region for state in states] == regions
+        assert states[0].occupant == creature and states[0].timestamp is not None
+        assert all(state.occupant is None and state.timestamp is None for state in states[1:])
+
+        # the single query agrees with asking every region on its own
+        assert states == Database.Guild.get_region_states(guild_db)
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_lookup_by_ids(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db = guild_db.add_player(1)
+        creatures = player_db.get_deck()
+        regions = guild_db.get_regions()
+        missing = max(c.id for c in creatures) + max(r.id for r in regions) + 1000
+
+        creature_ids = [c.id for c in creatures[:3]] + [missing]
+        found_creatures = guild_db.get_creatures_by_ids(creature_ids)
+        assert found_creatures == {c.id: c for c in creatures[:3]}
+        assert found_creatures == Database.Guild.get_creatures_by_ids(guild_db, creature_ids)
+
+        region_ids = [r.id for r in regions[:2]] + [missing]
+        found_regions = guild_db.get_regions_by_ids(region_ids)
+        assert found_regions == {r.id: r for r in regions[:2]}
+        assert found_regions == Database.Guild.get_regions_by_ids(guild_db, region_ids)
+
+        free_creatures = [
+            guild_db.add_free_creature(Commoner(), 0, message_id, player_db)
+            for message_id in range(1, 4)
+        ]
+        keys = [(0, 1), (0, 3), (0, missing)]
+        found_free_creatures = guild_db.get_free_creatures_by_keys(keys)
+        assert found_free_creatures == {(0, 1): free_creatures[0], (0, 3): free_creatures[2]}
+        assert found_free_creatures == Database.Guild.get_free_creatures_by_keys(guild_db, keys)
+
+        assert guild_db.get_creatures_by_ids([]) == {}
+        assert guild_db.get_free_creatures_by_keys([]) == {}
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_end_campaigns(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db1, player_db2, player_db3 = guild_db.add_players([1, 2, 3])
+        campaigned = []
+        for player_db, strengths in [(player_db1, [3, 4]), (player_db2, [5])]:
+            deck = player_db.get_deck()
+            for c, strength in zip(deck, strengths):
+                player_db.remove_creature_from_deck(c)
+                player_db.add_creature_to_campaign(c, strength)
+                campaigned.append(c)
+
+        discard_before = {p.id: len(p.get_discard()) for p in [player_db1, player_db2]}
+
+        assert guild_db.end_campaigns() == {1: 7, 2: 5, 3: 0}
+        assert all(p.get_campaign() == [] for p in [player_db1, player_db2, player_db3])
+        assert len(player_db1.get_discard()) == discard_before[1] + 2
+        assert len(player_db2.get_discard()) == discard_before[2] + 1
+        assert all(c in c.owner.get_discard() for c in campaigned)
+
+        assert guild_db.end_campaigns() == {1: 0, 2: 0, 3: 0}
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_leaderboard(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db1, player_db2, player_db3 = guild_db.add_players([1, 2, 3])
+        deck = player_db2.get_deck()
+        for c, strength in zip(deck, [3, 4]):
+            player_db2.remove_creature_from_deck(c)
+            player_db2.add_creature_to_campaign(c, strength)
+        c = player_db1.get_deck()[0]
+        player_db1.remove_creature_from_deck(c)
+        player_db1.add_creature_to_campaign(c, 2)
+
+        leaderboard = guild_db.get_leaderboard()
+        assert leaderboard.scores == [(2, 7), (1, 2), (3, 0)]
+        assert leaderboard.end_timestamp is None
+        assert leaderboard == Database.Guild.get_leaderboard(guild_db)
+
+        # the earliest end still to come, one that is already due does not count
+        end = int(time.time()) + 100
+        with test_db.transaction() as con:
+            for timestamp in [end - 200, end + 50, end]:
+                con.add_event(
+                    Database.Guild.ConflictEndEvent(
+                        test_db,
+                        test_db.fresh_event_id(guild_db, con=con),
+                        timestamp,
+                        None,
+                        guild_db,
+                    )
+                )
+        leaderboard = guild_db.get_leaderboard()
+        assert leaderboard.end_timestamp == end
+        assert leaderboard == Database.Guild.get_leaderboard(guild_db)
+
+        deck[0].change_strength(10)
+        player_db2.remove_creature_from_campaign(deck[1])
+        assert guild_db.get_leaderboard().scores == [(2, 10), (1, 2), (3, 0)]
+
+        guild_db.remove_player(player_db2)
+        guild_db.end_campaigns()
+        leaderboard = guild_db.get_leaderboard()
+        assert leaderboard.scores == [(1, 0), (3, 0)]
+        assert leaderboard == Database.Guild.get_leaderboard(guild_db)
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_player_snapshot(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db = guild_db.add_player(1)
+        deck = player_db.get_deck()
+        player_db.remove_creature_from_deck(deck[0])
+        player_db.add_creature_to_played(deck[0], time.time() + 100)
+        player_db.remove_creature_from_deck(deck[1])
+        player_db.add_creature_to_campaign(deck[1], 3)
+
+        snapshot = player_db.snapshot()
+        # the piles may come in another order, everything else has to match field by field
+        expected = Database.Player.snapshot(player_db)
+
+        assert snapshot.config == expected.config
+        assert snapshot.resources == expected.resources
+        assert snapshot.recharges == expected.recharges
+        for pile in ["hand", "deck", "discard", "played", "campaign"]:
+            assert sorted(getattr(snapshot, pile), key=str) == sorted(
+                getattr(expected, pile), key=str
+            )
+
+        assert [c.id for c in snapshot.hand] == [c.id for c in player_db.get_hand()]
+        assert snapshot.campaign == ((deck[1], 3),)
+        assert [c for c, _ in snapshot.played] == [deck[0]]
+
+        try:
+            snapshot.resources[Resource.GOLD] = 100  # type: ignore
+            assert False
+        except TypeError:
+            pass
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_rollback_piles(test_db: Database) -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db = guild_db.add_player(1)
+        player_db.set_resources(dict.fromkeys(BaseResources, 2))
+        deck = player_db.get_deck()
+        hand = player_db.get_hand()
+        events = guild_db.get_events(0, time.time() * 2)
+
+        try:
+            with test_db.transaction() as con:
+                player_db.draw_cards_bulk(3, con=con)
+                player_db.remove_creature_from_deck(deck[-1], con=con)
+                player_db.add_creature_to_campaign(deck[-1], 5, con=con)
+                player_db.pay_price([Price(Resource.GOLD, 2)], con=con)
+                guild_db.remove_player(player_db, con=con)
+                guild_db.get_player(player_db.id, con=con)
+        except PlayerNotFound:
+            pass
+
+        assert guild_db.get_player(player_db.id) == player_db
+        assert sorted(c.id for c in player_db.get_deck()) == sorted(c.id for c in deck)
+        assert player_db.get_hand() == hand
+        assert player_db.get_campaign() == []
+        assert player_db.get_resources() == dict.fromkeys(BaseResources, 2)
+        assert guild_db.get_events(0, time.time() * 2) == events
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+@backends
+def test_simulation(test_db: Database) -> None:
+    sim = Simulation(
+        test_db, [RandomPolicy(), RandomPolicy(), RandomPolicy(), CampaignPolicy()], seed=1
+    )
+
+    try:
+        start = sim.clock.time()
+        report = sim.run(60)
+
+        assert sim.clock.time() == start + 60 * sim.step
+        assert report.steps == 60
+        assert report.actions > 0
+        assert report.event_errors == 0
+        operations = {o.operation: o for o in report.operations}
+        assert operations["campaign"].succeeded() > 0 and operations["play"].succeeded() > 0
+        assert report.actions == sum(operations[o].succeeded() for o in sim.actions)
+        assert (report.queries_per_action is None) == isinstance(test_db, InMemoryDatabase)
+
+        # only what the players did in the last step is still waiting to be resolved
+        assert sim.guild_db.get_events(0, sim.clock.time() - 1, also_resolved=False) == []
+
+    finally:
+        sim.close()
+        test_db.remove_guild(sim.guild_db)
+        assert test_db.get_guilds() == []
+
+
+import threading
+
+
+def test_concurrent_payments() -> None:
+    guild_db: Database.Guild = test_db.add_guild(1)
+
+    try:
+        player_db = guild_db.add_player(1)
+        player_db.set_resources(dict.fromkeys(BaseResources, 1))
+        price = [Price(Resource.GOLD, 1), Price(Resource.ORDERS, 1)]
+        errors: List[Exception] = []
+
+        def pay() -> None:
+            try:
+                player_db.pay_price(price)
+            except NotEnoughResourcesException as e:
+                errors.append(e)
+
+        with test_db.transaction() as con:
+            player_db.pay_price(price, con=con)
+            other = threading.Thread(target=pay)
+            other.start()
+            # let the other payment block on the purse before this one commits
+            time.sleep(0.5)
+
+        other.join()
+
+        assert len(errors) == 1
+        resources = player_db.get_resources()
+        assert resources[Resource.GOLD] == 0 and resources[Resource.ORDERS] == 0
+
+    finally:
+        test_db.remove_guild(guild_db)
+        assert test_db.get_guilds() == []
+
+
+import logging
+from types import SimpleNamespace
+
+from src.bot.event_handler import GuildResolution, deliver_resolutions
+
+
+async def delivery_test() -> List[int]:
+    deliveries: asyncio.Queue[Tuple[Any, GuildResolution]] = asyncio.Queue()
+    delivered: List[int] = []
+
+    async def deliver(guild: Any, resolution: GuildResolution) -> None:
+        if guild.id == 1:
+            # like a free creature whose row is already gone
+            raise TypeError("free creature vanished")
+        delivered.append(guild.id)
+
+    for guild_id in [1, 2]:
+        deliveries.put_nowait((SimpleNamespace(id=guild_id), GuildResolution(guild_id, 0, [], [])))
+
+    task = asyncio.create_task(deliver_resolutions(deliveries, deliver, logging.getLogger("test")))
+    await asyncio.wait_for(deliveries.join(), 1)
+    task.cancel()
+    return delivered
+
+
+def test_failing_delivery() -> None:
+    assert asyncio.run(delivery_test()) == [2]
+
+
+import discord
+
+from src.bot.delivery import TokenBucket, MessageQueue, MAX_EMBEDS_PER_MESSAGE
+
+
+def test_token_bucket() -> None:
+    # the clock is whatever the test passes in
+    bucket = TokenBucket(5, 5.0, now=0.0)
+    for _ in range(5):
+        assert bucket.wait_time(0.0) == 0.0
+        bucket.take(0.0)
+
+    assert bucket.wait_time(0.0) == 1.0
+    assert bucket.wait_time(0.5) == 0.5
+    assert bucket.wait_time(1.0) == 0.0
+
+    # refilling stops at the capacity
+    assert bucket.wait_time(100.0) == 0.0
+    assert bucket.tokens == 5.0
+
+    # discord's retry after wins over our own count
+    bucket.block(100.0, 3.0)
+    assert bucket.wait_time(100.0) == 3.0
+    assert bucket.wait_time(103.0) == 0.0
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int) -> None:
+        self.id = channel_id
+        self.sent: List[List[discord.Embed]] = []
+        self.open = asyncio.Event()
+        self.open.set()
+
+    async def send(self, embeds: List[discord.Embed]) -> None:
+        await self.open.wait()
+        self.sent.append(embeds)
+
+
+async def coalescing_test() -> Tuple[List[int], List[int]]:
+    messages = MessageQueue(logging.getLogger("test"))
+    channel = FakeChannel(1)
+    other_channel = FakeChannel(2)
+
+    # nothing yields in between, so all of them wait in the queue together
+    for _ in range(MAX_EMBEDS_PER_MESSAGE + 2):
+        await messages.send(cast(Any, channel), discord.Embed(description="x"))
+    for _ in range(3):
+        await messages.send(cast(Any, other_channel), discord.Embed(description="x" * 2500))
+    assert messages.queued() == MAX_EMBEDS_PER_MESSAGE + 5
+
+    while messages.queued() > 0:
+        await asyncio.sleep(0)
+    await messages.close()
+    return [len(m) for m in channel.sent], [len(m) for m in other_channel.sent]
+
+
+def test_message_coalescing() -> None:
+    by_count, by_characters = asyncio.run(coalescing_test())
+    # at most ten embeds in a message
+    assert by_count == [MAX_EMBEDS_PER_MESSAGE, 2]
+    # and at most 6000 characters
+    assert by_characters == [2, 1]
+
+
+async def backpressure_test() -> None:
+    messages = MessageQueue(logging.getLogger("test"), max_pending=2)
+    channel = FakeChannel(1)
+    channel.open.clear()
+
+    await messages.send(cast(Any, channel), discord.Embed(description="a"))
+    await messages.send(cast(Any, channel), discord.Embed(description="b"))
+
+    # a full queue blocks the sender instead of dropping the embed
+    blocked = asyncio.create_task(messages.send(cast(Any, channel), discord.Embed(description="c")))
+    await asyncio.sleep(0.1)
+    assert not blocked.done()
+
+    channel.open.set()
+    await asyncio.wait_for(blocked, 1)
+    while messages.queued() > 0:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    await messages.close()
+
+    assert [e.description for m in channel.sent for e in m] == ["a", "b", "c"]
+
+
+def test_message_backpressure() -> None:
+    asyncio.run(backpressure_test())